@@ -0,0 +1,235 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import argparse
+import sys
+
+
+# Each model is a function that takes a size parameter, and returns a Petri
+# net as a list of places, with their initial number of tokens, and a list
+# of transitions, with the number of tokens they consume from (pre) and
+# produce in (post) each place. Places are listed in the order they should
+# appear in the PNML file, which is the variable order of the benchmarks,
+# so the places of a component are kept close to each other.
+#
+# The dining philosophers, the token ring and the shared memory models are
+# 1-safe, so they can be used with both Petri net benchmarks, while the
+# Kanban and FMS models put several tokens in their places for sizes
+# greater than 1, so they can only be used with `benchmarks/petrinet`.
+
+
+class Net(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.places = []
+        self.transitions = []
+
+    def place(self, id_, tokens=0):
+        self.places.append((id_, tokens))
+
+    def transition(self, id_, pre, post):
+        # `pre` and `post` are either lists of places, which are consumed or
+        # produced one token, or dictionaries that map places to a number of
+        # tokens.
+        if not isinstance(pre, dict):
+            pre = {place: 1 for place in pre}
+        if not isinstance(post, dict):
+            post = {place: 1 for place in post}
+        self.transitions.append((id_, pre, post))
+
+
+def philosophers(n):
+    """Return the dining philosophers with `n` philosophers, who take their
+    left fork, then their right one.
+    """
+    net = Net('philosophers%i' % n)
+    for i in range(n):
+        net.place('think%i' % i, 1)
+        net.place('fork%i' % i, 1)
+        net.place('eat%i' % i)
+        net.place('left%i' % i)
+
+    for i in range(n):
+        right = 'fork%i' % ((i + 1) % n)
+        net.transition('takeleft%i' % i, ['think%i' % i, 'fork%i' % i], ['left%i' % i])
+        net.transition('takeright%i' % i, ['left%i' % i, right], ['eat%i' % i])
+        net.transition('release%i' % i, ['eat%i' % i], ['think%i' % i, 'fork%i' % i, right])
+    return net
+
+
+def ring(n):
+    """Return a token ring of `n` processes, that enter their critical
+    section only when they hold the token, which is passed around the ring.
+    """
+    net = Net('ring%i' % n)
+    for i in range(n):
+        net.place('idle%i' % i, 1)
+        net.place('wait%i' % i)
+        net.place('critical%i' % i)
+        net.place('token%i' % i, int(i == 0))
+
+    for i in range(n):
+        net.transition('request%i' % i, ['idle%i' % i], ['wait%i' % i])
+        net.transition('enter%i' % i, ['wait%i' % i, 'token%i' % i], ['critical%i' % i])
+        net.transition('leave%i' % i, ['critical%i' % i], ['idle%i' % i, 'token%i' % i])
+        net.transition('pass%i' % i, ['token%i' % i], ['token%i' % ((i + 1) % n)])
+    return net
+
+
+def shared_memory(n):
+    """Return the shared memory model with `n` processors, each owning a
+    memory, that either access their own memory or, through a shared bus,
+    the memory of another processor.
+    """
+    net = Net('shared_memory%i' % n)
+    net.place('bus', 1)
+    for i in range(n):
+        net.place('active%i' % i, 1)
+        net.place('memory%i' % i, 1)
+        net.place('own%i' % i)
+        net.place('queue%i' % i)
+        for j in range(n):
+            if j != i:
+                net.place('external%i_%i' % (i, j))
+
+    for i in range(n):
+        net.transition('begin_own%i' % i, ['active%i' % i, 'memory%i' % i], ['own%i' % i])
+        net.transition('end_own%i' % i, ['own%i' % i], ['active%i' % i, 'memory%i' % i])
+        net.transition('request%i' % i, ['active%i' % i], ['queue%i' % i])
+        for j in range(n):
+            if j != i:
+                net.transition(
+                    'begin_external%i_%i' % (i, j),
+                    ['queue%i' % i, 'bus', 'memory%i' % j],
+                    ['external%i_%i' % (i, j)])
+                net.transition(
+                    'end_external%i_%i' % (i, j),
+                    ['external%i_%i' % (i, j)],
+                    ['active%i' % i, 'bus', 'memory%i' % j])
+    return net
+
+
+def kanban(n):
+    """Return the Kanban system with 4 cells of `n` kanbans each."""
+    net = Net('kanban%i' % n)
+    for i in range(1, 5):
+        net.place('P%i' % i, n)
+        net.place('Pm%i' % i)
+        net.place('Pback%i' % i)
+        net.place('Pout%i' % i)
+
+    net.transition('tin1', ['P1'], ['Pm1'])
+    for i in range(1, 5):
+        net.transition('tredo%i' % i, ['Pm%i' % i], ['Pback%i' % i])
+        net.transition('tback%i' % i, ['Pback%i' % i], ['Pm%i' % i])
+        net.transition('tok%i' % i, ['Pm%i' % i], ['Pout%i' % i])
+    net.transition('tsynch1_23', ['Pout1', 'P2', 'P3'], ['P1', 'Pm2', 'Pm3'])
+    net.transition('tsynch4_23', ['Pout2', 'Pout3', 'P4'], ['P2', 'P3', 'Pm4'])
+    net.transition('tout4', ['Pout4'], ['P4'])
+    return net
+
+
+def fms(n):
+    """Return the flexible manufacturing system with `n` parts of each of
+    its 3 kinds.
+    """
+    net = Net('fms%i' % n)
+    for id_, tokens in (
+            ('P1', n), ('P1wM1', 0), ('P1M1', 0), ('M1', 3), ('P1d', 0), ('P1s', 0),
+            ('P1wP2', 0), ('P12', 0), ('P12wM3', 0), ('P12M3', 0), ('M3', 2), ('P12s', 0),
+            ('P2', n), ('P2wM2', 0), ('P2M2', 0), ('M2', 1), ('P2d', 0), ('P2s', 0),
+            ('P2wP1', 0), ('P3', n), ('P3M2', 0), ('P3s', 0)):
+        net.place(id_, tokens)
+
+    net.transition('tP1', ['P1'], ['P1wM1'])
+    net.transition('tM1', ['P1wM1', 'M1'], ['P1M1'])
+    net.transition('tP1M1', ['P1M1'], ['M1', 'P1d'])
+    net.transition('tP1e', ['P1d'], ['P1s'])
+    net.transition('tP1j', ['P1d'], ['P1wP2'])
+    net.transition('tP1s', ['P1s'], ['P1'])
+    net.transition('tP2', ['P2'], ['P2wM2'])
+    net.transition('tM2', ['P2wM2', 'M2'], ['P2M2'])
+    net.transition('tP2M2', ['P2M2'], ['M2', 'P2d'])
+    net.transition('tP2e', ['P2d'], ['P2s'])
+    net.transition('tP2j', ['P2d'], ['P2wP1'])
+    net.transition('tP2s', ['P2s'], ['P2'])
+    net.transition('tx', ['P1wP2', 'P2wP1'], ['P12'])
+    net.transition('tP12', ['P12'], ['P12wM3'])
+    net.transition('tM3', ['P12wM3', 'M3'], ['P12M3'])
+    net.transition('tP12M3', ['P12M3'], ['M3', 'P12s'])
+    net.transition('tP12s', ['P12s'], ['P1', 'P2'])
+    net.transition('tP3', ['P3', 'M2'], ['P3M2'])
+    net.transition('tP3M2', ['P3M2'], ['M2', 'P3s'])
+    net.transition('tP3s', ['P3s'], ['P3'])
+    return net
+
+
+MODELS = {
+    'philosophers': philosophers,
+    'ring': ring,
+    'shared_memory': shared_memory,
+    'kanban': kanban,
+    'fms': fms,
+}
+
+
+def to_pnml(nets):
+    """Return the PNML document of the given nets, as a string."""
+    def text(tag, value):
+        return '<%s><text>%s</text></%s>' % (tag, value, tag)
+
+    lines = [
+        '<?xml version="1.0"?>',
+        '<pnml xmlns="http://www.pnml.org/version-2009/grammar/pnml">',
+    ]
+    for net in nets:
+        lines.append(
+            '<net id="%s" type="http://www.pnml.org/version-2009/grammar/ptnet">'
+            '<page id="page">' % net.name)
+        for id_, tokens in net.places:
+            marking = text('initialMarking', tokens) if tokens else ''
+            lines.append('<place id="%s">%s%s</place>' % (id_, text('name', id_), marking))
+        for id_, _, _ in net.transitions:
+            lines.append('<transition id="%s">%s</transition>' % (id_, text('name', id_)))
+
+        arcs = []
+        for id_, pre, post in net.transitions:
+            arcs.extend((place, id_, tokens) for place, tokens in pre.items())
+            arcs.extend((id_, place, tokens) for place, tokens in post.items())
+        for i, (source, target, tokens) in enumerate(arcs):
+            inscription = text('inscription', tokens) if tokens != 1 else ''
+            lines.append('<arc id="arc%i" source="%s" target="%s">%s</arc>' % (
+                i, source, target, inscription))
+
+        lines.append('</page></net>')
+    lines.append('</pnml>')
+    return '\n'.join(lines) + '\n'
+
+
+def generate(model, sizes, file):
+    """Write the PNML document of the given model, for each of the given
+    sizes, to a text file.
+    """
+    file.write(to_pnml([MODELS[model](size) for size in sizes]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('model', choices=sorted(MODELS), help='The model to generate.')
+    parser.add_argument(
+        'sizes', metavar='size', type=int, nargs='+',
+        help=(
+            "The size of the model (e.g. its number of philosophers), which "
+            "can be given several times to put several nets in the file."))
+    parser.add_argument(
+        '-o', '--output', dest='output',
+        help='The file where to write the PNML document (default: stdout).')
+
+    args = parser.parse_args()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            generate(args.model, args.sizes, f)
+    else:
+        generate(args.model, args.sizes, sys.stdout)
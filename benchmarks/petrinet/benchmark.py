@@ -18,10 +18,10 @@ def load_class(class_path):
     return getattr(module, class_name)
 
 
-def benchmark(pnml, engine, place_class, recursion_limit=None):
+def benchmark(pnml, engine, place_class, recursion_limit=None, strategies=('bfs',)):
     # Set the recursion limit.
     if recursion_limit:
-        previous_recursion_limit = sys.getrecurstionlimit
+        previous_recursion_limit = sys.getrecursionlimit()
         sys.setrecursionlimit(recursion_limit)
 
     # Parse the pnml file to generate.
@@ -30,11 +30,12 @@ def benchmark(pnml, engine, place_class, recursion_limit=None):
 
     # Benchmark tests.
     for id_, pn in pns.items():
-        print('Generate the state space for "%s".' % id_)
-        start = time.time()
-        state_space = pn.state_space()
-        elapsed = time.time() - start
-        print('\t%i state(s), computed in %f[s]' % (len(state_space), elapsed))
+        for strategy in strategies:
+            print('Generate the state space for "%s" (%s).' % (id_, strategy))
+            start = time.perf_counter()
+            state_space = pn.state_space(strategy=strategy)
+            elapsed = time.perf_counter() - start
+            print('\t%i state(s), computed in %f[s]' % (len(state_space), elapsed))
 
     # Reset the recursion limit.
     if recursion_limit:
@@ -47,6 +48,12 @@ if __name__ == '__main__':
     parser.add_argument(
         '-r', '--recursion-limit', dest='recursion', metavar='N', type=int,
         help="Override Python's default recursion limit.")
+    parser.add_argument(
+        '-s', '--strategy', dest='strategies', action='append',
+        choices=('bfs', 'frontier', 'chaining', 'saturation'),
+        help=(
+            "The strategy used to generate the state spaces, which can be "
+            "given several times to compare them (default: bfs)."))
     parser.add_argument(
         '--engine', dest='engine', default='ydd.engines.default.DefaultEngine',
         help=(
@@ -66,4 +73,4 @@ if __name__ == '__main__':
 
     engine = engine_class()
 
-    benchmark(args.pnml, engine, place_class, args.recursion)
+    benchmark(args.pnml, engine, place_class, args.recursion, args.strategies or ('bfs',))
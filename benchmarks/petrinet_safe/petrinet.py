@@ -3,40 +3,21 @@
 
 import xml.etree.ElementTree as ET
 
-from functools import wraps
+from ydd.homomorphisms import Homomorphism, Identity, fixpoint, union
 
 
-class PetriNet(object):
+class FilterMarkings(Homomorphism):
+    """Keeps the markings that enable a transition of pre-conditions `pre`."""
 
-    def __init__(self, engine, pre, post, m0, place_names=None):
-        self.engine = engine
+    def __init__(self, pre, place_id=0):
+        super().__init__(pre, place_id)
         self.pre = pre
-        self.post = post
-        self.m0 = m0
-
-        self.place_names = place_names
-
-        self._cache = {
-            'filter_markings': {},
-            'fire': {}
-        }
-
-    def cached(fn):
-        @wraps(fn)
-        def decorated(self, *args, **kwargs):
-            cache = self._cache[fn.__name__]
-            try:
-                return cache[args]
-            except KeyError:
-                rv = fn(self, *args, **kwargs)
-            cache[args] = rv
-            return rv
-        return decorated
+        self.place_id = place_id
 
-    def filter_markings(self, markings, trans, place_id=0):
-        # If `markings` is the zero terminal, or if we checked all the places,
-        # we can return the markings unmodified.
-        if markings.is_zero() or (place_id >= len(self.pre[trans])):
+    def image(self, engine, markings):
+        # If we checked all the places, we can return the markings
+        # unmodified.
+        if self.place_id >= len(self.pre):
             return markings
 
         # If a token is required in the place identified by `place_id`, we've
@@ -45,31 +26,44 @@ class PetriNet(object):
         # doesn't. If it has the same key, then we can reject all paths from
         # its `else` child. If it as a lower key, we should continue on both
         # its children.
-        if self.pre[trans][place_id]:
+        place_id = self.place_id
+        if self.pre[place_id]:
             if markings.is_one() or (markings.key > place_id):
-                return self.engine.make_terminal(False)
+                return engine.make_terminal(False)
             if markings.key == place_id:
-                return self.engine.make_node(
+                return engine.make_node(
                     place_id,
-                    self.filter_markings(markings.then_, trans, place_id + 1),
-                    self.engine.make_terminal(False))
+                    engine.apply(FilterMarkings(self.pre, place_id + 1), markings.then_),
+                    engine.make_terminal(False))
             if markings.key < place_id:
-                return self.engine.make_node(
+                return engine.make_node(
                     markings.key,
-                    self.filter_markings(markings.then_, trans, place_id),
-                    self.filter_markings(markings.else_, trans, place_id))
+                    engine.apply(self, markings.then_),
+                    engine.apply(self, markings.else_))
 
         # If no token is required in the place identified by `place_id`, we've
         # to continue with the next place ID.
-        return self.filter_markings(markings, trans, place_id + 1)
+        return engine.apply(FilterMarkings(self.pre, place_id + 1), markings)
 
-    def fire(self, markings, trans, place_id=0):
-        # If `markings` is the zero terminal, or if we checked all the places,
-        # we can return the markings unmodified.
-        if (markings.is_zero()) or (place_id >= len(self.pre[trans])):
+
+class Fire(Homomorphism):
+    """Fires a transition of pre- and post-conditions `pre` and `post`."""
+
+    def __init__(self, pre, post, place_id=0):
+        super().__init__(pre, post, place_id)
+        self.pre = pre
+        self.post = post
+        self.place_id = place_id
+
+    def image(self, engine, markings):
+        # If we checked all the places, we can return the markings
+        # unmodified.
+        if self.place_id >= len(self.pre):
             return markings
 
-        delta = self.post[trans][place_id] - self.pre[trans][place_id]
+        place_id = self.place_id
+        delta = self.post[place_id] - self.pre[place_id]
+        next_place = Fire(self.pre, self.post, place_id + 1)
 
         # If we have to produce a token in the place identified by `place_id`,
         # then we insert it "in-place" if `markings` is terminal or starts
@@ -77,15 +71,15 @@ class PetriNet(object):
         # children. Other cases shouldn't occur.
         if delta > 0:
             if markings.is_one() or (markings.key > place_id):
-                return self.engine.make_node(
+                return engine.make_node(
                     place_id,
-                    self.fire(markings, trans, place_id + 1),
-                    self.engine.make_terminal(False))
+                    engine.apply(next_place, markings),
+                    engine.make_terminal(False))
             if markings.key < place_id:
-                return self.engine.make_node(
+                return engine.make_node(
                     markings.key,
-                    self.fire(markings.then_, trans, place_id),
-                    self.fire(markings.else_, trans, place_id))
+                    engine.apply(self, markings.then_),
+                    engine.apply(self, markings.else_))
 
             raise ValueError('Invalid set of markings')
 
@@ -95,32 +89,140 @@ class PetriNet(object):
         # children. Other cases shouldn't occur.
         elif delta < 0:
             if markings.key == place_id:
-                return self.fire(markings.then_, trans, place_id + 1)
+                return engine.apply(next_place, markings.then_)
             if markings.key < place_id:
-                return self.engine.make_node(
+                return engine.make_node(
                     markings.key,
-                    self.fire(markings.then_, trans, place_id),
-                    self.fire(markings.else_, trans, place_id))
+                    engine.apply(self, markings.then_),
+                    engine.apply(self, markings.else_))
 
             raise ValueError('Invalid set of markings')
 
         # If no token is either produced or consumed for the place identified
         # by `place_id`, we've to continue with the next place ID.
-        return self.fire(markings, trans, place_id + 1)
+        return engine.apply(next_place, markings)
 
-    def step(self, markings):
-        rv = self.engine.make_terminal(False)
+
+class Saturate(Homomorphism):
+    """Fires the transitions whose lowest place is `place_id` or greater,
+    until no new marking can be found.
+
+    `relations[i]` is the homomorphism that fires the transitions whose
+    lowest place is `i`, or None if there isn't any. Places past the end of
+    `relations` aren't the lowest place of any transition.
+    """
+
+    def __init__(self, relations, place_id=0):
+        super().__init__(relations, place_id)
+        self.relations = relations
+        self.place_id = place_id
+
+    def image(self, engine, markings):
+        # There's no transition to fire past the last relation.
+        if self.place_id >= len(self.relations):
+            return markings
+
+        # Saturate the markings of the greater places first, then fire the
+        # transitions of this level until they don't produce new markings,
+        # saturating the greater places of the new markings as we go.
+        saturate_children = SaturateChildren(self.relations, self.place_id)
+        rv = engine.apply(saturate_children, markings)
+        if self.relations[self.place_id] is None:
+            return rv
+        return engine.fixpoint(rv, saturate_children * self.relations[self.place_id])
+
+
+class SaturateChildren(Homomorphism):
+    """Saturates the markings of the places greater than `place_id`."""
+
+    def __init__(self, relations, place_id):
+        super().__init__(relations, place_id)
+        self.relations = relations
+        self.place_id = place_id
+
+    def image(self, engine, markings):
+        next_level = Saturate(self.relations, self.place_id + 1)
+        if (not markings.is_one()) and (markings.key == self.place_id):
+            return engine.make_node(
+                self.place_id,
+                engine.apply(next_level, markings.then_),
+                engine.apply(next_level, markings.else_))
+        return engine.apply(next_level, markings)
+
+
+class PetriNet(object):
+
+    def __init__(self, engine, pre, post, m0, place_names=None):
+        self.engine = engine
+        self.pre = pre
+        self.post = post
+        self.m0 = m0
+
+        self.place_names = place_names
+
+        # The transition relation, as the union of the homomorphisms that
+        # fire each transition on the markings that enable it.
+        self.transition_relation = union(*(
+            self._fire(trans) * self._filter_markings(trans) for trans in self.pre))
+
+    def _filter_markings(self, trans, place_id=0):
+        return FilterMarkings(tuple(self.pre[trans]), place_id)
+
+    def _fire(self, trans, place_id=0):
+        return Fire(tuple(self.pre[trans]), tuple(self.post[trans]), place_id)
+
+    def _relations(self):
+        # Group the transitions by the lowest place they touch, since they
+        # can be fired on the markings of the greater places only.
+        nb_of_places = max((len(pre) for pre in self.pre.values()), default=0)
+        levels = [[] for _ in range(nb_of_places)]
         for trans in self.pre:
-            rv = rv | self.fire(self.filter_markings(markings, trans), trans)
-        return rv
-
-    def state_space(self):
-        x = self.m0
-        y = x | self.step(x)
-        while x != y:
-            x = y
-            y = x | self.step(x)
-        return y
+            touched = [
+                place_id for place_id in range(len(self.pre[trans]))
+                if self.pre[trans][place_id] or self.post[trans][place_id]
+            ]
+            if touched:
+                levels[touched[0]].append(
+                    self._fire(trans, touched[0]) * self._filter_markings(trans, touched[0]))
+
+        # Drop the trailing places, as there's no transition to fire there.
+        while levels and not levels[-1]:
+            levels.pop()
+        return tuple(union(*level) if level else None for level in levels)
+
+    def filter_markings(self, markings, trans):
+        return self.engine.apply(self._filter_markings(trans), markings)
+
+    def fire(self, markings, trans):
+        return self.engine.apply(self._fire(trans), markings)
+
+    def step(self, markings):
+        return self.engine.apply(self.transition_relation, markings)
+
+    def state_space(self, strategy='bfs'):
+        """Compute the markings reachable from the initial one.
+
+        The `bfs` strategy fires all transitions on all the markings found
+        so far, until no new marking is found. The `frontier` strategy only
+        fires them on the markings found by the previous iteration, and the
+        `chaining` strategy also fires each transition on the markings found
+        by the previous ones in the same iteration. The `saturation`
+        strategy fires the transitions bottom-up, by groups of transitions
+        sharing the same lowest place, which keeps the intermediate results
+        small.
+        """
+        if strategy == 'bfs':
+            return self.engine.apply(fixpoint(Identity() | self.transition_relation), self.m0)
+        elif strategy == 'frontier':
+            return self.engine.fixpoint(self.m0, self.transition_relation)
+        elif strategy == 'chaining':
+            return self.engine.fixpoint(
+                self.m0,
+                [self._fire(trans) * self._filter_markings(trans) for trans in self.pre],
+                chaining=True)
+        elif strategy == 'saturation':
+            return self.engine.apply(Saturate(self._relations()), self.m0)
+        raise ValueError('unknown strategy: %r' % strategy)
 
     @classmethod
     def from_pnml(cls, engine, filename):
@@ -0,0 +1,293 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import argparse
+import gc
+import importlib
+import json
+import operator
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from generate_pnml import generate
+
+
+# The number of distinct elements in the random families, and the maximum
+# number of elements of their members.
+NB_ELEMENTS = 64
+MAX_MEMBER_SIZE = 16
+
+DEFAULT_ENGINES = ('ydd.engines.default.DefaultEngine',)
+DEFAULT_SIZES = (100, 1000)
+
+
+def load_class(class_path):
+    class_data = class_path.split(".")
+    module_path = ".".join(class_data[:-1])
+    class_name = class_data[-1]
+
+    module = importlib.import_module(module_path)
+    return getattr(module, class_name)
+
+
+def random_members(size, seed):
+    rng = random.Random(seed)
+    return [
+        rng.sample(range(NB_ELEMENTS), rng.randint(0, MAX_MEMBER_SIZE))
+        for _ in range(size)
+    ]
+
+
+# Each benchmark is a function that takes a fresh engine and a parameter
+# (the number of members of the families, or a PNML file and a strategy),
+# prepares its operands, and returns the function to measure. Operands are
+# generated from a fixed seed, so that the results of different runs (and
+# of different engines) can be compared.
+
+def bench_construction(engine, size):
+    members = random_members(size, seed=0)
+    return lambda: engine.make(*members)
+
+
+def binary_operation(operation):
+    def bench(engine, size):
+        left = engine.make(*random_members(size, seed=0))
+        right = engine.make(*random_members(size, seed=1))
+        return lambda: operation(left, right)
+    return bench
+
+
+def bench_iteration(engine, size):
+    family = engine.make(*random_members(size, seed=0))
+    return lambda: sum(1 for _ in family)
+
+
+def bench_count(engine, size):
+    family = engine.make(*random_members(size, seed=0))
+    return lambda: engine.count(family)
+
+
+def bench_membership(engine, size):
+    members = random_members(size, seed=0)
+    family = engine.make(*members)
+
+    # Half of the candidates are members of the family.
+    candidates = members[::2] + random_members(size // 2, seed=1)
+    return lambda: sum(1 for candidate in candidates if candidate in family)
+
+
+def bench_state_space(engine, parameter):
+    pnml, strategy = parameter
+
+    # The Petri net model of the benchmarks isn't a package.
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'petrinet_safe')
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    from petrinet import PetriNet
+
+    nets = list(PetriNet.from_pnml(engine, pnml).values())
+    return lambda: [net.state_space(strategy=strategy) for net in nets]
+
+
+BENCHMARKS = {
+    'construction': bench_construction,
+    'union': binary_operation(operator.or_),
+    'intersection': binary_operation(operator.and_),
+    'difference': binary_operation(operator.sub),
+    'symmetric_difference': binary_operation(operator.xor),
+    'iteration': bench_iteration,
+    'count': bench_count,
+    'membership': bench_membership,
+    'state_space': bench_state_space,
+}
+
+
+def measure(engine_class, benchmark, parameter, warmup=1, repeat=5, memory=True):
+    """Return the times (in seconds) of the given benchmark, and the peak
+    memory it allocated (in bytes), or None if `memory` is False.
+
+    Each run uses a fresh engine, so that the computed tables of the
+    previous ones don't hide the cost of the operations. The peak memory is
+    measured with `tracemalloc`, in a separate run, since tracing slows
+    the allocations down; it doesn't account for the memory allocated by
+    the C++ engines.
+    """
+    def run(trace=False):
+        # The roots of the C++ engines can't outlive them, so the function
+        # to measure (that holds the operands) is released first.
+        engine = engine_class()
+        function = BENCHMARKS[benchmark](engine, parameter)
+
+        gc.collect()
+        if trace:
+            tracemalloc.start()
+            start = tracemalloc.get_traced_memory()[0]
+            function()
+            rv = tracemalloc.get_traced_memory()[1] - start
+            tracemalloc.stop()
+        else:
+            start = time.perf_counter()
+            function()
+            rv = time.perf_counter() - start
+
+        del function
+        del engine
+        return rv
+
+    for _ in range(warmup):
+        run()
+    times = [run() for _ in range(repeat)]
+    peak_memory = run(trace=True) if memory else None
+    return times, peak_memory
+
+
+def run_benchmarks(engines, benchmarks, sizes, pnmls=(), strategies=('bfs',), **kwargs):
+    results = []
+    for benchmark in benchmarks:
+        if benchmark == 'state_space':
+            parameters = [(pnml, strategy) for pnml in pnmls for strategy in strategies]
+        else:
+            parameters = sizes
+
+        for engine_path in engines:
+            engine_class = load_class(engine_path)
+            for parameter in parameters:
+                times, peak_memory = measure(engine_class, benchmark, parameter, **kwargs)
+                result = {
+                    'benchmark': benchmark,
+                    'engine': engine_path,
+                    'parameter': (
+                        '%s:%s' % (os.path.basename(parameter[0]), parameter[1])
+                        if isinstance(parameter, tuple) else parameter),
+                    'times': times,
+                    'min': min(times),
+                    'median': statistics.median(times),
+                    'mean': statistics.mean(times),
+                    'peak_memory': peak_memory,
+                }
+                results.append(result)
+                print('{:<22} {:<40} {:<24} {:>12.6f}[s] {:>12}'.format(
+                    benchmark, engine_path, str(result['parameter']), result['min'],
+                    '-' if peak_memory is None else '%i[B]' % peak_memory))
+
+    return results
+
+
+def compare(results, baseline, threshold=0.1):
+    """Return the results whose best time exceeds the one of the matching
+    result in the baseline by more than `threshold` (a ratio), with the
+    ratio of their times.
+    """
+    reference = {
+        (result['benchmark'], result['engine'], result['parameter']): result
+        for result in baseline['results']
+    }
+
+    regressions = []
+    for result in results:
+        try:
+            previous = reference[(result['benchmark'], result['engine'], result['parameter'])]
+        except KeyError:
+            continue
+        ratio = result['min'] / previous['min'] if previous['min'] else float('inf')
+        if ratio > 1 + threshold:
+            regressions.append((result, ratio))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-b', '--benchmark', dest='benchmarks', action='append', choices=sorted(BENCHMARKS),
+        help=(
+            "The benchmark to run, which can be given several times "
+            "(default: all of them, state_space only if a PNML file or a model is given)."))
+    parser.add_argument(
+        '-e', '--engine', dest='engines', action='append',
+        help=(
+            "The path of an engine class to benchmark, which can be given "
+            "several times (default: ydd.engines.default.DefaultEngine)."))
+    parser.add_argument(
+        '-n', '--size', dest='sizes', action='append', type=int,
+        help=(
+            "The number of members of the random families, which can be "
+            "given several times (default: 100 and 1000)."))
+    parser.add_argument(
+        '--pnml', dest='pnmls', action='append', default=[],
+        help="A PNML file of 1-safe Petri nets, for the state_space benchmark.")
+    parser.add_argument(
+        '-m', '--model', dest='models', action='append', default=[],
+        help=(
+            "A 1-safe model of benchmarks/generate_pnml.py and its size "
+            "(e.g. philosophers:10), for the state_space benchmark."))
+    parser.add_argument(
+        '-s', '--strategy', dest='strategies', action='append',
+        choices=('bfs', 'frontier', 'chaining', 'saturation'),
+        help="The strategy used to generate the state spaces (default: bfs).")
+    parser.add_argument(
+        '-w', '--warmup', dest='warmup', type=int, default=1,
+        help="The number of runs before the measured ones (default: 1).")
+    parser.add_argument(
+        '-r', '--repeat', dest='repeat', type=int, default=5,
+        help="The number of measured runs (default: 5).")
+    parser.add_argument(
+        '--no-memory', dest='memory', action='store_false',
+        help="Don't measure the peak memory of the benchmarks.")
+    parser.add_argument(
+        '-o', '--output', dest='output',
+        help="The file where to write the results, in JSON.")
+    parser.add_argument(
+        '-c', '--compare', dest='baseline',
+        help=(
+            "A file of results written with --output, to compare the "
+            "results with. Exits with status 1 if there are regressions."))
+    parser.add_argument(
+        '-t', '--threshold', dest='threshold', type=float, default=0.1,
+        help="The slowdown ratio reported as a regression (default: 0.1).")
+
+    args = parser.parse_args()
+
+    # Generate the PNML files of the models.
+    directory = tempfile.mkdtemp()
+    for spec in args.models:
+        model, size = spec.split(':')
+        path = os.path.join(directory, '%s%s.pnml' % (model, size))
+        with open(path, 'w') as f:
+            generate(model, [int(size)], f)
+        args.pnmls.append(path)
+
+    benchmarks = args.benchmarks or [
+        benchmark for benchmark in BENCHMARKS
+        if (benchmark != 'state_space') or args.pnmls
+    ]
+    results = run_benchmarks(
+        args.engines or DEFAULT_ENGINES, benchmarks, args.sizes or DEFAULT_SIZES,
+        args.pnmls, args.strategies or ('bfs',),
+        warmup=args.warmup, repeat=args.repeat, memory=args.memory)
+    shutil.rmtree(directory)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'warmup': args.warmup,
+                'repeat': args.repeat,
+                'results': results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for result, ratio in regressions:
+            print('Regression: %s on %s (%s) is %.2f times slower.' % (
+                result['benchmark'], result['engine'], result['parameter'], ratio))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,90 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import argparse
+import operator
+import threading
+import time
+
+from run import load_class, random_members
+
+
+DEFAULT_ENGINE = 'ydd.engines.concurrent.ConcurrentEngine'
+DEFAULT_THREADS = (1, 2, 4, 8)
+
+OPERATIONS = (operator.or_, operator.and_, operator.xor)
+
+
+def measure(engine_class, nb_threads, size, rounds):
+    """Return the number of operations per second computed by `nb_threads`
+    threads sharing a fresh engine.
+
+    Each thread computes the union, intersection and symmetric difference of
+    `rounds` pairs of families of `size` members of its own, so the threads
+    don't find the results of the others in the computed tables. Operands
+    are built before the threads are started.
+    """
+    engine = engine_class()
+    operands = [
+        [
+            (engine.make(*random_members(size, seed=2 * (thread * rounds + i))),
+             engine.make(*random_members(size, seed=2 * (thread * rounds + i) + 1)))
+            for i in range(rounds)
+        ]
+        for thread in range(nb_threads)
+    ]
+
+    barrier = threading.Barrier(nb_threads + 1)
+
+    def work(pairs):
+        barrier.wait()
+        for left, right in pairs:
+            for operation in OPERATIONS:
+                operation(left, right)
+
+    threads = [threading.Thread(target=work, args=(pairs,)) for pairs in operands]
+    for thread in threads:
+        thread.start()
+
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    # The roots of the C++ engines can't outlive them.
+    del operands
+    del engine
+    return nb_threads * rounds * len(OPERATIONS) / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-e', '--engine', dest='engines', action='append',
+        help=(
+            "The path of an engine class to benchmark, which can be given "
+            "several times (default: %s)." % DEFAULT_ENGINE))
+    parser.add_argument(
+        '-t', '--threads', dest='threads', action='append', type=int,
+        help=(
+            "A number of threads, which can be given several times "
+            "(default: 1, 2, 4 and 8)."))
+    parser.add_argument(
+        '-n', '--size', dest='size', type=int, default=1000,
+        help="The number of members of the families (default: 1000).")
+    parser.add_argument(
+        '-r', '--rounds', dest='rounds', type=int, default=10,
+        help="The number of pairs of families of each thread (default: 10).")
+
+    args = parser.parse_args()
+
+    for engine_path in args.engines or (DEFAULT_ENGINE,):
+        engine_class = load_class(engine_path)
+        baseline = None
+        for nb_threads in args.threads or DEFAULT_THREADS:
+            throughput = measure(engine_class, nb_threads, args.size, args.rounds)
+            if baseline is None:
+                baseline = throughput / nb_threads
+            print('{:<40} {:>3} threads {:>12.1f}[op/s] {:>8.2f}x'.format(
+                engine_path, nb_threads, throughput, throughput / baseline))
@@ -6,9 +6,6 @@ import random
 import sys
 import time
 
-from functools import reduce
-from operator import or_
-
 from ydd.engines.default import DefaultEngine as Engine
 # from ydd.engines.cpp import IntEngine as Engine
 
@@ -22,18 +19,18 @@ def benchmark(nb_singletons=50, nb_elements=100):
     singletons = [[random.randint(0, m // 2) for _ in range(m)] for _ in range(n)]
 
     # Benchmark tests.
-    benchmark_start = time.time()
-    singleton_start = time.time()
+    benchmark_start = time.perf_counter()
+    singleton_start = time.perf_counter()
 
     diagrams = [engine.make_from_container(singleton) for singleton in singletons]
 
-    singleton_time = time.time() - singleton_start
-    union_start = time.time()
+    singleton_time = time.perf_counter() - singleton_start
+    union_start = time.perf_counter()
 
-    reduce(or_, diagrams)
+    engine.union_all(diagrams)
 
-    union_time = time.time() - union_start
-    benchmark_time = time.time() - benchmark_start
+    union_time = time.perf_counter() - union_start
+    benchmark_time = time.perf_counter() - benchmark_start
 
     # Print results.
     print('{:<20} {}'.format('Total time:', benchmark_time))
@@ -1,21 +1,158 @@
 // Copyright (c) 2015, Dimitri Racordon.
 // Licensed under the Apache License, Version 2.0.
 
+#include <chrono>
+#include <memory>
+#include <stdexcept>
+
 #include <boost/python.hpp>
 
 #include "types.hpp"
 #include "ydd.hpp"
 
 
+// The number of members of a family, for `len()`. Sizes are saturated in
+// the engine, so we raise rather than returning a wrong value.
+template <typename Root>
+std::size_t root_len(const Root& root) {
+    if (root.size_overflows()) {
+        throw std::overflow_error("family is too large for len(), use engine.count() instead");
+    }
+    return root.size();
+}
+
+
+// Boost.Python would translate overflow errors as `RuntimeError`.
+void translate_overflow_error(const std::overflow_error& e) {
+    PyErr_SetString(PyExc_OverflowError, e.what());
+}
+
+
+// The operations of the roots whose calls from Python are counted and
+// timed by their engine.
+enum Operation {
+    union_op, intersection_op, difference_op, symmetric_difference_op, issubset_op,
+    isdisjoint_op, operation_count
+};
+
+const char* operation_names[] = {
+    "union", "intersection", "difference", "symmetric_difference", "issubset", "isdisjoint"
+};
+
+
+struct OperationStats {
+    OperationStats() : calls(0), time(0) {}
+
+    std::size_t calls;
+    double time;
+};
+
+
+// Engines exposed to Python, which are owned by their Python instance and
+// by the roots exposed to Python (see `PyRoot`).
+template <typename Engine>
+struct PyEngine : public Engine, public std::enable_shared_from_this<PyEngine<Engine>> {
+    using Engine::Engine;
+
+    void reset_stats() {
+        Engine::reset_stats();
+        for (auto& stats : this->operation_stats) {
+            stats = OperationStats();
+        }
+    }
+
+    OperationStats operation_stats[operation_count];
+};
+
+
+// Roots exposed to Python, which keep their engine alive, since the nodes
+// they refer to belong to its unique table. An engine is thus destroyed
+// once its Python instance and all its roots are, in any order.
+template <typename Engine>
+struct PyRoot : public Engine::Root {
+    using Root = typename Engine::Root;
+
+    PyRoot(PyObject*) {
+    }
+
+    PyRoot(PyObject*, const Root& root)
+    : Root(root) {
+        if (root.engine() != nullptr) {
+            this->owner = static_cast<PyEngine<Engine>*>(root.engine())->shared_from_this();
+        }
+    }
+
+    ~PyRoot() {
+        // The node is released before the engine.
+        Root::operator=(Root());
+    }
+
+    std::shared_ptr<PyEngine<Engine>> owner;
+};
+
+
+// Calls an operation on two roots, and records the call and its duration in
+// the statistics of their engine. Operations on two zero terminals, which
+// don't have an engine, aren't recorded.
+template <
+    typename Engine, typename Result,
+    Result (Engine::Root::*method)(const typename Engine::Root&) const, Operation operation>
+Result recorded(const typename Engine::Root& left, const typename Engine::Root& right) {
+    auto engine = static_cast<PyEngine<Engine>*>(left.engine() ? left.engine() : right.engine());
+    if (engine == nullptr) {
+        return (left.*method)(right);
+    }
+
+    auto start = std::chrono::steady_clock::now();
+    Result rv = (left.*method)(right);
+    std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - start;
+
+    engine->operation_stats[operation].calls++;
+    engine->operation_stats[operation].time += elapsed.count();
+    return rv;
+}
+
+
+// Returns the statistics of an engine, as a tuple of the number of nodes,
+// its peak, the calls and time of each operation, and the hits, misses,
+// evictions, size and number of used records of each computed table.
+template <typename Engine>
+boost::python::tuple engine_stats(const PyEngine<Engine>& engine) {
+    using namespace boost::python;
+
+    dict calls;
+    dict time;
+    for (int operation = 0; operation < operation_count; ++operation) {
+        const auto& stats = engine.operation_stats[operation];
+        if (stats.calls > 0) {
+            calls[operation_names[operation]] = stats.calls;
+            time[operation_names[operation]] = stats.time;
+        }
+    }
+
+    dict caches;
+    for (const auto& item : engine.cache_stats()) {
+        const auto& stats = item.second;
+        caches[item.first] = make_tuple(
+            stats.hits, stats.misses, stats.evictions, stats.size, stats.used);
+    }
+
+    return make_tuple(engine.node_count(), engine.peak_node_count(), calls, time, caches);
+}
+
+
 BOOST_PYTHON_MODULE(_cpp) {
     using namespace boost::python;
 
+    register_exception_translator<std::overflow_error>(&translate_overflow_error);
+
     using szt = std::size_t;
 
     using IntEngine = ydd::Engine<int>;
     using IntRoot = IntEngine::Root;
+    using PyIntEngine = PyEngine<IntEngine>;
 
-    class_<IntRoot>("IntRoot", init<>())
+    class_<IntRoot, PyRoot<IntEngine>>("IntRoot", init<>())
         // When the keys are defined with a primitive type (int, float, ...),
         // using the return policy `return_internal_reference` seems to make
         // Boost complain about a missing function to call `assertion_failed`.
@@ -30,33 +167,46 @@ BOOST_PYTHON_MODULE(_cpp) {
         .add_property("else_", make_function(
             &IntRoot::else_, return_internal_reference<>()))
 
-        .def(self < self)
-        .def(self <= self)
+        .def("__lt__", &recorded<IntEngine, bool, &IntRoot::operator<, issubset_op>)
+        .def("__le__", &recorded<IntEngine, bool, &IntRoot::operator<=, issubset_op>)
         .def(self == self)
         .def(self != self)
-        .def(self | self)
-        .def(self & self)
-        .def(self - self)
-        .def(self ^ self)
+        .def("__or__", &recorded<IntEngine, IntRoot, &IntRoot::operator|, union_op>)
+        .def("__and__", &recorded<IntEngine, IntRoot, &IntRoot::operator&, intersection_op>)
+        .def("__sub__", &recorded<IntEngine, IntRoot, &IntRoot::operator-, difference_op>)
+        .def("__xor__", &recorded<IntEngine, IntRoot, &IntRoot::operator^, symmetric_difference_op>)
 
+        .def("isdisjoint", &recorded<IntEngine, bool, &IntRoot::isdisjoint, isdisjoint_op>)
         .def("is_one", &IntRoot::is_one)
         .def("is_zero", &IntRoot::is_zero)
-        .def("__len__", &IntRoot::size)
+        .def("__len__", &root_len<IntRoot>)
         .def("__hash__", &IntRoot::hash);
 
-    class_<IntEngine, boost::noncopyable>(
-        "IntEngine", init<optional<szt, szt, szt, szt>>((
+    class_<PyIntEngine, std::shared_ptr<PyIntEngine>, boost::noncopyable>(
+        "IntEngine", init<optional<szt, szt, szt, szt, szt, szt>>((
             arg("union_cache_size"),
             arg("intersection_cache_size"),
             arg("difference_cache_size"),
-            arg("symmetric_difference_cache_size"))))
+            arg("symmetric_difference_cache_size"),
+            arg("inclusion_cache_size"),
+            arg("disjointness_cache_size"))))
 
-        .def("make_terminal", &IntEngine::make_terminal)
-        .def("make_node", &IntEngine::make_node);
+        // Boost.Python deduces the class of `self` from the type of member
+        // pointers, so those of the base engine have to be cast.
+        .def("make_terminal", static_cast<IntRoot (PyIntEngine::*)(bool)>(
+            &IntEngine::make_terminal))
+        .def("make_node", static_cast<
+            IntRoot (PyIntEngine::*)(int, const IntRoot&, const IntRoot&)>(
+                &IntEngine::make_node))
+        .def("node_count", static_cast<std::size_t (PyIntEngine::*)() const>(
+            &IntEngine::node_count))
+        .def("_stats", &engine_stats<IntEngine>)
+        .def("reset_stats", &PyIntEngine::reset_stats);
 
 
     using PNEngine = ydd::Engine<ydd::PNPlace>;
     using PNRoot = PNEngine::Root;
+    using PyPNEngine = PyEngine<PNEngine>;
 
     class_<ydd::PNPlace>(
         "PNPlace", init<szt, optional<szt>>((arg("id_"), arg("tokens"))))
@@ -67,7 +217,7 @@ BOOST_PYTHON_MODULE(_cpp) {
         .def(self > self)
         .def("__hash__", &ydd::PNPlace::hash);
 
-    class_<PNRoot>("PNRoot", init<>())
+    class_<PNRoot, PyRoot<PNEngine>>("PNRoot", init<>())
         .add_property("key", make_function(
             &PNRoot::key, return_internal_reference<>()))
         .add_property("then_", make_function(
@@ -75,28 +225,38 @@ BOOST_PYTHON_MODULE(_cpp) {
         .add_property("else_", make_function(
             &PNRoot::else_, return_internal_reference<>()))
 
-        .def(self < self)
-        .def(self <= self)
+        .def("__lt__", &recorded<PNEngine, bool, &PNRoot::operator<, issubset_op>)
+        .def("__le__", &recorded<PNEngine, bool, &PNRoot::operator<=, issubset_op>)
         .def(self == self)
         .def(self != self)
-        .def(self | self)
-        .def(self & self)
-        .def(self - self)
-        .def(self ^ self)
+        .def("__or__", &recorded<PNEngine, PNRoot, &PNRoot::operator|, union_op>)
+        .def("__and__", &recorded<PNEngine, PNRoot, &PNRoot::operator&, intersection_op>)
+        .def("__sub__", &recorded<PNEngine, PNRoot, &PNRoot::operator-, difference_op>)
+        .def("__xor__", &recorded<PNEngine, PNRoot, &PNRoot::operator^, symmetric_difference_op>)
 
+        .def("isdisjoint", &recorded<PNEngine, bool, &PNRoot::isdisjoint, isdisjoint_op>)
         .def("is_one", &PNRoot::is_one)
         .def("is_zero", &PNRoot::is_zero)
-        .def("__len__", &PNRoot::size)
+        .def("__len__", &root_len<PNRoot>)
         .def("__hash__", &PNRoot::hash);
 
-    class_<PNEngine, boost::noncopyable>(
-        "PNEngine", init<optional<szt, szt, szt, szt>>((
+    class_<PyPNEngine, std::shared_ptr<PyPNEngine>, boost::noncopyable>(
+        "PNEngine", init<optional<szt, szt, szt, szt, szt, szt>>((
             arg("union_cache_size"),
             arg("intersection_cache_size"),
             arg("difference_cache_size"),
-            arg("symmetric_difference_cache_size"))))
+            arg("symmetric_difference_cache_size"),
+            arg("inclusion_cache_size"),
+            arg("disjointness_cache_size"))))
 
-        .def("make_terminal", &PNEngine::make_terminal)
-        .def("make_node", &PNEngine::make_node);
+        .def("make_terminal", static_cast<PNRoot (PyPNEngine::*)(bool)>(
+            &PNEngine::make_terminal))
+        .def("make_node", static_cast<
+            PNRoot (PyPNEngine::*)(ydd::PNPlace, const PNRoot&, const PNRoot&)>(
+                &PNEngine::make_node))
+        .def("node_count", static_cast<std::size_t (PyPNEngine::*)() const>(
+            &PNEngine::node_count))
+        .def("_stats", &engine_stats<PNEngine>)
+        .def("reset_stats", &PyPNEngine::reset_stats);
 
 }
@@ -4,9 +4,15 @@
 #ifndef __cppydd_ydd__
 #define __cppydd_ydd__
 
+#include <atomic>
 #include <functional>
+#include <limits>
+#include <mutex>
 #include <stdexcept>
+#include <string>
 #include <unordered_set>
+#include <utility>
+#include <vector>
 
 #include <boost/functional/hash.hpp>
 
@@ -31,90 +37,107 @@ namespace ydd {
             Root(const Root& other)
             : _engine(other._engine), node(other.node) {
                 if (this->node != nullptr) {
-                    this->node->ref_count++;
+                    this->node->retain();
                 }
             }
 
             Root(Engine& engine, const Node* node)
             : _engine(&engine), node(node) {
-                this->node->ref_count++;
+                this->node->retain();
             }
 
             ~Root() {
                 if (this->node != nullptr) {
-                    this->node->ref_count--;
-                    if (this->node->ref_count == 0) {
-                        this->_engine->_unique_table.destroy_node(this->node);
-                        this->node = nullptr;
-                    }
+                    this->_engine->_unique_table.release_node(this->node);
+                    this->node = nullptr;
                 }
             }
 
             Root& operator= (const Root& other) {
                 if (this->node != nullptr) {
-                    this->node->ref_count--;
-                    if (this->node->ref_count == 0) {
-                        this->_engine->_unique_table.destroy_node(this->node);
-                        this->node = nullptr;
-                    }
+                    this->_engine->_unique_table.release_node(this->node);
+                    this->node = nullptr;
                 }
 
                 this->node = other.node;
                 this->_engine = other._engine;
 
                 if (this->node != nullptr) {
-                    this->node->ref_count++;
+                    this->node->retain();
                 }
                 return *this;
             }
 
             bool operator< (const Root& other) const {
-                if (this->is_zero()) {
-                    return !other.is_zero();
+                return (*this != other) and (*this <= other);
+            }
+
+            bool operator<= (const Root& other) const {
+                if (this->is_zero() or (*this == other)) {
+                    return true;
                 }
 
                 if (other.is_zero() or other.is_one()) {
                     return false;
                 }
 
-                if (this->is_one()) {
-                    return *this <= other.else_();
+                if ((!this->is_one()) and (other.key() > this->key())) {
+                    return false;
                 }
 
-                if (other.key() > this->key()) {
-                    return false;
-                } else if (other.key() == this->key()) {
-                    return
-                        (*this != other)
-                        and (this->then_() <= other.then_())
-                        and (this->else_() <= other.else_());
+                // Try to get the result from the cache.
+                auto& cache = this->_engine->_inclusion_cache;
+                bool rv;
+                if (cache.lookup(*this, other, rv)) {
+                    return rv;
+                }
+
+                // Compute the result.
+                if (this->is_one() or (other.key() < this->key())) {
+                    rv = *this <= other.else_();
                 } else {
-                    return *this < other.else_();
+                    rv = (this->then_() <= other.then_()) and (this->else_() <= other.else_());
                 }
+
+                cache.store(*this, other, rv);
+                return rv;
             }
 
-            bool operator<= (const Root& other) const {
-                if (this->is_zero()) {
+            bool isdisjoint(const Root& other) const {
+                if (this->is_zero() or other.is_zero()) {
                     return true;
+                } else if (*this == other) {
+                    return false;
                 }
 
-                if (other.is_zero() or other.is_one()) {
-                    return *this == other;
+                // Disjointness is symmetric, so we order the operands to
+                // share the cache records of both orders.
+                if (std::less<const Node*>()(other.node, this->node)) {
+                    return other.isdisjoint(*this);
                 }
 
-                if (this->is_one()) {
-                    return *this <= other.else_();
+                // Try to get the result from the cache.
+                auto& cache = this->_engine->_disjointness_cache;
+                bool rv;
+                if (cache.lookup(*this, other, rv)) {
+                    return rv;
                 }
 
-                if (other.key() > this->key()) {
-                    return false;
-                } else if (other.key() == this->key()) {
-                    return
-                        (*this == other)
-                        or ((this->then_() <= other.then_()) and (this->else_() <= other.else_()));
-                } else {
-                    return *this <= other.else_();
+                // Compute the result, without creating any node.
+                if (this->is_one() or ((!other.is_one()) and (other.key() < this->key()))) {
+                    rv = this->isdisjoint(other.else_());
                 }
+
+                else if (other.is_one() or (this->key() < other.key())) {
+                    rv = this->else_().isdisjoint(other);
+                }
+
+                else {
+                    rv = this->then_().isdisjoint(other.then_()) and this->else_().isdisjoint(other.else_());
+                }
+
+                cache.store(*this, other, rv);
+                return rv;
             }
 
             bool operator== (const Root& other) const {
@@ -133,14 +156,13 @@ namespace ydd {
                 }
 
                 // Try to get the result from the cache.
-                auto& cache_record = this->_engine->_union_cache(*this, other);
-                if ((cache_record.left == *this) and (cache_record.right == other)) {
-                    return cache_record.result;
+                auto& cache = this->_engine->_union_cache;
+                Root rv;
+                if (cache.lookup(*this, other, rv)) {
+                    return rv;
                 }
 
                 // Compute the result.
-                Root rv;
-
                 if (this->is_one()) {
                     rv = this->_engine->make_node(
                         other.key(), other.then_(), other.else_() | *this);
@@ -166,9 +188,7 @@ namespace ydd {
                         other.key(), other.then_(), other.else_() | *this);
                 }
 
-                cache_record.left = *this;
-                cache_record.right = other;
-                cache_record.result = rv;
+                cache.store(*this, other, rv);
                 return rv;
             }
 
@@ -180,14 +200,13 @@ namespace ydd {
                 }
 
                 // Try to get the result from the cache.
-                auto& cache_record = this->_engine->_intersection_cache(*this, other);
-                if ((cache_record.left == *this) and (cache_record.right == other)) {
-                    return cache_record.result;
+                auto& cache = this->_engine->_intersection_cache;
+                Root rv;
+                if (cache.lookup(*this, other, rv)) {
+                    return rv;
                 }
 
                 // Compute the result.
-                Root rv;
-
                 if (this->is_one()) {
                     const Root* else_most = &other;
                     while (!(else_most->is_zero() or else_most->is_one())) {
@@ -217,9 +236,7 @@ namespace ydd {
                     rv = *this & other.else_();
                 }
 
-                cache_record.left = *this;
-                cache_record.right = other;
-                cache_record.result = rv;
+                cache.store(*this, other, rv);
                 return rv;
             }
 
@@ -231,14 +248,13 @@ namespace ydd {
                 }
 
                 // Try to get the result from the cache.
-                auto& cache_record = this->_engine->_difference_cache(*this, other);
-                if ((cache_record.left == *this) and (cache_record.right == other)) {
-                    return cache_record.result;
+                auto& cache = this->_engine->_difference_cache;
+                Root rv;
+                if (cache.lookup(*this, other, rv)) {
+                    return rv;
                 }
 
                 // Compute the result.
-                Root rv;
-
                 if (this->is_one()) {
                     const Root* else_most = &other;
                     while (!(else_most->is_zero() or else_most->is_one())) {
@@ -271,9 +287,7 @@ namespace ydd {
                     rv = *this - other.else_();
                 }
 
-                cache_record.left = *this;
-                cache_record.right = other;
-                cache_record.result = rv;
+                cache.store(*this, other, rv);
                 return rv;
             }
 
@@ -287,14 +301,13 @@ namespace ydd {
                 }
 
                 // Try to get the result from the cache.
-                auto& cache_record = this->_engine->_symmetric_difference_cache(*this, other);
-                if ((cache_record.left == *this) and (cache_record.right == other)) {
-                    return cache_record.result;
+                auto& cache = this->_engine->_symmetric_difference_cache;
+                Root rv;
+                if (cache.lookup(*this, other, rv)) {
+                    return rv;
                 }
 
                 // Compute the result.
-                Root rv;
-
                 if (this->is_one()) {
                     if (other.is_one()) {
                         rv = this->_engine->make_terminal(false);
@@ -328,9 +341,7 @@ namespace ydd {
                         other.key(), other.then_(), *this ^ other.else_());
                 }
 
-                cache_record.left = *this;
-                cache_record.right = other;
-                cache_record.result = rv;
+                cache.store(*this, other, rv);
                 return rv;
             }
 
@@ -362,11 +373,20 @@ namespace ydd {
                 }
             }
 
+            bool size_overflows() const {
+                return this->size() == std::numeric_limits<std::size_t>::max();
+            }
+
             std::size_t hash() const {
                 std::hash<const Node*> node_hasher;
                 return node_hasher(this->node);
             }
 
+            // The engine of the root, or null for the zero terminal.
+            Engine* engine() const {
+                return this->_engine;
+            }
+
             // Key key;
             const Node* node;
         };
@@ -375,13 +395,17 @@ namespace ydd {
             std::size_t union_cache_size=512,
             std::size_t intersection_cache_size=512,
             std::size_t difference_cache_size=512,
-            std::size_t symmetric_difference_cache_size=512
+            std::size_t symmetric_difference_cache_size=512,
+            std::size_t inclusion_cache_size=512,
+            std::size_t disjointness_cache_size=512
         ) :
             _unique_table(),
             _union_cache(union_cache_size),
             _intersection_cache(intersection_cache_size),
             _difference_cache(difference_cache_size),
-            _symmetric_difference_cache(symmetric_difference_cache_size)
+            _symmetric_difference_cache(symmetric_difference_cache_size),
+            _inclusion_cache(inclusion_cache_size),
+            _disjointness_cache(disjointness_cache_size)
         {
             // fixme: Throw an exception if the user tries to set a cache size
             // lower than 1.
@@ -409,6 +433,45 @@ namespace ydd {
             }
         }
 
+        // Statistics of a computed table, since its creation or the last
+        // reset of the statistics of the engine.
+        struct CacheStats {
+            std::size_t hits;
+            std::size_t misses;
+            std::size_t evictions;
+            std::size_t size;
+            std::size_t used;
+        };
+
+        std::size_t node_count() const {
+            return this->_unique_table.size();
+        }
+
+        std::size_t peak_node_count() const {
+            return this->_unique_table.peak_size();
+        }
+
+        std::vector<std::pair<std::string, CacheStats>> cache_stats() const {
+            return {
+                {"union", this->_union_cache.stats()},
+                {"intersection", this->_intersection_cache.stats()},
+                {"difference", this->_difference_cache.stats()},
+                {"symmetric_difference", this->_symmetric_difference_cache.stats()},
+                {"issubset", this->_inclusion_cache.stats()},
+                {"isdisjoint", this->_disjointness_cache.stats()}
+            };
+        }
+
+        void reset_stats() {
+            this->_unique_table.reset_peak_size();
+            this->_union_cache.reset_stats();
+            this->_intersection_cache.reset_stats();
+            this->_difference_cache.reset_stats();
+            this->_symmetric_difference_cache.reset_stats();
+            this->_inclusion_cache.reset_stats();
+            this->_disjointness_cache.reset_stats();
+        }
+
     private:
         friend class Root;
 
@@ -425,7 +488,7 @@ namespace ydd {
             }
 
             Node(const Key& key, const Root& then_, const Root& else_)
-            : ref_count(0), size(then_.size() + else_.size()), terminal(false),
+            : ref_count(0), size(saturating_add(then_.size(), else_.size())), terminal(false),
               key(key), then_(then_), else_(else_) {
             }
 
@@ -433,6 +496,13 @@ namespace ydd {
             : ref_count(0), size(terminal ? 1 : 0), terminal(terminal), key() {
             }
 
+            // Atomic counters can't be copied, and copies of a node (i.e.
+            // the ones inserted in the unique table) aren't referenced yet.
+            Node(const Node& other)
+            : ref_count(0), size(other.size), terminal(other.terminal),
+              key(other.key), then_(other.then_), else_(other.else_) {
+            }
+
             bool operator== (const Node& other) const {
                 return
                     (this->terminal == other.terminal)
@@ -441,6 +511,15 @@ namespace ydd {
                     and (this->else_ == other.else_);
             }
 
+            // Sizes saturate rather than overflow, so that a size equal to
+            // the maximum value of `std::size_t` means "too large to count".
+            static std::size_t saturating_add(std::size_t a, std::size_t b) {
+                if (a > std::numeric_limits<std::size_t>::max() - b) {
+                    return std::numeric_limits<std::size_t>::max();
+                }
+                return a + b;
+            }
+
             std::size_t hash() const {
                 std::hash<bool> bool_hasher;
                 std::hash<Key> key_hasher;
@@ -454,7 +533,11 @@ namespace ydd {
                 return rv;
             }
 
-            mutable std::size_t ref_count;
+            void retain() const {
+                this->ref_count.fetch_add(1, std::memory_order_relaxed);
+            }
+
+            mutable std::atomic<std::size_t> ref_count;
             mutable std::size_t size;
 
             bool terminal;
@@ -465,64 +548,212 @@ namespace ydd {
             // Key else_key;
         };
 
+        // The unique table is split into shards, each protected by its own
+        // lock, so that threads creating different nodes rarely wait for
+        // each other. Reference counts are atomic, and only the release of
+        // the last reference to a node locks its shard, so that no other
+        // thread can find the node while it's being removed.
         class UniqueTable {
         public:
-            void destroy_node(const Node* node) {
-                this->_nodes.erase(*node);
+            static const std::size_t shard_count = 64;
+
+            UniqueTable()
+            : _destroying(false), _size(0), _peak_size(0) {
+            }
+
+            ~UniqueTable() {
+                // The nodes that are still referenced when the table is
+                // destroyed release their children, which may have been
+                // destroyed already, so reference counts are ignored from
+                // then on.
+                this->_destroying = true;
+                for (auto& shard: this->_shards) {
+                    shard.nodes.clear();
+                }
+            }
+
+            void release_node(const Node* node) {
+                if (this->_destroying) {
+                    return;
+                }
+
+                std::size_t count = node->ref_count.load(std::memory_order_relaxed);
+                while (count > 1) {
+                    if (node->ref_count.compare_exchange_weak(
+                            count, count - 1, std::memory_order_release, std::memory_order_relaxed))
+                    {
+                        return;
+                    }
+                }
+
+                // The children of the node are kept alive until its shard is
+                // unlocked, so that releasing them doesn't lock it again.
+                Root then_;
+                Root else_;
+
+                Shard& shard = this->shard(*node);
+                std::lock_guard<std::mutex> lock(shard.mutex);
+                if (node->ref_count.fetch_sub(1, std::memory_order_acq_rel) == 1) {
+                    then_ = node->then_;
+                    else_ = node->else_;
+                    shard.nodes.erase(*node);
+                    this->_size.fetch_sub(1, std::memory_order_relaxed);
+                }
             }
 
             Root operator[] (const Node& node) {
+                Shard& shard = this->shard(node);
+                std::lock_guard<std::mutex> lock(shard.mutex);
+
                 // Look for a node that matches the input in the table.
-                auto it = this->_nodes.find(node);
-                if (it != this->_nodes.end()) {
+                auto it = shard.nodes.find(node);
+                if (it != shard.nodes.end()) {
                     return Root(*this->_engine, &(*it));
                 }
 
                 // Insert the new node in the table.
-                auto res = this->_nodes.insert(node);
+                auto res = shard.nodes.insert(node);
+                std::size_t size = this->_size.fetch_add(1, std::memory_order_relaxed) + 1;
+                std::size_t peak_size = this->_peak_size.load(std::memory_order_relaxed);
+                while ((size > peak_size) and !this->_peak_size.compare_exchange_weak(
+                    peak_size, size, std::memory_order_relaxed));
                 return Root(*this->_engine, &(*res.first));
             }
 
+            std::size_t size() const {
+                return this->_size.load(std::memory_order_relaxed);
+            }
+
+            std::size_t peak_size() const {
+                return this->_peak_size.load(std::memory_order_relaxed);
+            }
+
+            void reset_peak_size() {
+                this->_peak_size.store(this->size(), std::memory_order_relaxed);
+            }
+
             Engine* _engine;
 
         private:
-            std::unordered_set<Node, NodeHasher> _nodes;
+            struct Shard {
+                std::mutex mutex;
+                std::unordered_set<Node, NodeHasher> nodes;
+            };
+
+            Shard& shard(const Node& node) {
+                // The low bits of the hash pick the bucket of the node in
+                // its shard, so the shard is picked with the high ones.
+                return this->_shards[(node.hash() >> 16) % shard_count];
+            }
+
+            bool _destroying;
+            std::atomic<std::size_t> _size;
+            std::atomic<std::size_t> _peak_size;
+            Shard _shards[shard_count];
         };
 
+        // Computed tables are direct-mapped: each pair of operands has a
+        // single record, which is overwritten by the next pair that maps to
+        // it. Records are protected by striped locks, so that several threads
+        // can share the table.
+        template <typename Result>
         class Cache {
         public:
+            static const std::size_t lock_count = 64;
+
             struct CacheRecord {
-                CacheRecord() {}
+                CacheRecord() : result() {}
 
                 Root left;
                 Root right;
-                Root result;
+                Result result;
             };
 
             Cache(const std::size_t size)
-            : _store(new CacheRecord[size]), _store_size(size) {
+            : _store(new CacheRecord[size]), _store_size(size),
+              _hits(0), _misses(0), _evictions(0), _used(0) {
             }
 
             ~Cache() {
                 delete[] this->_store;
             }
 
-            CacheRecord& operator() (const Root& left, const Root& right) {
+            // Returns whether the table holds the result for the given
+            // operands, in which case it's copied to `result`.
+            bool lookup(const Root& left, const Root& right, Result& result) {
+                std::size_t i = this->index(left, right);
+                std::lock_guard<std::mutex> lock(this->_locks[i % lock_count]);
+
+                const CacheRecord& record = this->_store[i];
+                if ((record.left == left) and (record.right == right)) {
+                    result = record.result;
+                    this->_hits.fetch_add(1, std::memory_order_relaxed);
+                    return true;
+                }
+                this->_misses.fetch_add(1, std::memory_order_relaxed);
+                return false;
+            }
+
+            // Stores the result for the given operands in their record. Left
+            // operands are never the zero terminal, so a record whose left
+            // operand is the zero terminal is empty.
+            void store(const Root& left, const Root& right, const Result& result) {
+                std::size_t i = this->index(left, right);
+
+                // The previous content of the record is released once the
+                // record is unlocked.
+                CacheRecord previous;
+
+                std::lock_guard<std::mutex> lock(this->_locks[i % lock_count]);
+                CacheRecord& record = this->_store[i];
+                if (record.left.is_zero()) {
+                    this->_used.fetch_add(1, std::memory_order_relaxed);
+                } else if ((record.left != left) or (record.right != right)) {
+                    this->_evictions.fetch_add(1, std::memory_order_relaxed);
+                }
+
+                previous = record;
+                record.left = left;
+                record.right = right;
+                record.result = result;
+            }
+
+            CacheStats stats() const {
+                return {
+                    this->_hits.load(), this->_misses.load(), this->_evictions.load(),
+                    this->_store_size, this->_used.load()
+                };
+            }
+
+            void reset_stats() {
+                this->_hits = 0;
+                this->_misses = 0;
+                this->_evictions = 0;
+            }
+
+        private:
+            std::size_t index(const Root& left, const Root& right) const {
                 std::size_t h = left.hash();
                 boost::hash_combine(h, right.hash());
-                return this->_store[h % this->_store_size];
+                return h % this->_store_size;
             }
 
-        private:
             CacheRecord* _store;
             const std::size_t _store_size;
+            std::mutex _locks[lock_count];
+            std::atomic<std::size_t> _hits;
+            std::atomic<std::size_t> _misses;
+            std::atomic<std::size_t> _evictions;
+            std::atomic<std::size_t> _used;
         };
 
         UniqueTable _unique_table;
-        Cache _union_cache;
-        Cache _intersection_cache;
-        Cache _difference_cache;
-        Cache _symmetric_difference_cache;
+        Cache<Root> _union_cache;
+        Cache<Root> _intersection_cache;
+        Cache<Root> _difference_cache;
+        Cache<Root> _symmetric_difference_cache;
+        Cache<bool> _inclusion_cache;
+        Cache<bool> _disjointness_cache;
     };
 
 }
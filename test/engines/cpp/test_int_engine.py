@@ -1,6 +1,8 @@
 # Copyright (c) 2015, Dimitri Racordon.
 # Licensed under the Apache License, Version 2.0.
 
+import io
+import random
 import unittest
 
 from ydd.engines.cpp import IntEngine
@@ -42,6 +44,33 @@ class TestIntEngine(unittest.TestCase):
         self.assertEqual(list(self.engine.make_from_container({-1, 1, 2})), [{-1, 1, 2}])
         self.assertEqual(list(self.engine.make_from_container([-1, 1, 2])), [{-1, 1, 2}])
 
+    def test_make_from_sorted(self):
+        self.assertTrue(self.engine.make_from_sorted([]).is_zero())
+        self.assertTrue(self.engine.make_from_sorted([[]]).is_one())
+
+        containers = [{4, 6, 9}, [4], set(), (5, 4, 5), {4, 6, 9}, {1}]
+        family = self.engine.make_from_sorted(containers)
+        self.assertEqual(
+            set(frozenset(el) for el in family),
+            set(frozenset(el) for el in containers)
+        )
+        self.assertEqual(family, self.engine.make(*containers))
+        self.assertEqual(
+            family,
+            self.engine.union_all(self.engine.make_from_container(el) for el in containers))
+
+    def test_make_from_stream(self):
+        containers = [set(), {1}, {1, 2}, {1, 2, 4}, {1, 3}, {2}, {2}, {3, 4}]
+        family = self.engine.make(*containers)
+
+        self.assertEqual(
+            self.engine.make_from_stream(reversed(containers), chunk_size=3), family)
+        self.assertEqual(
+            self.engine.make_from_stream(iter(containers), presorted=True), family)
+
+        with self.assertRaises(ValueError):
+            self.engine.make_from_stream(reversed(containers), presorted=True)
+
     def test_make(self):
         zero = self.engine.make_terminal(False)
         one = self.engine.make_terminal(True)
@@ -105,6 +134,10 @@ class TestIntEngine(unittest.TestCase):
         self.assertFalse({1} in family)
         self.assertFalse({1, 5} in family)
 
+        family = self.engine.make({5}, set())
+        self.assertFalse({0} in family)
+        self.assertFalse({0, 5} in family)
+
     def test_iter(self):
         family = self.engine.make_terminal(False)
         self.assertEqual(list(family), [])
@@ -130,6 +163,111 @@ class TestIntEngine(unittest.TestCase):
         self.assertEqual(len(self.engine.make({1, 2})), 1)
         self.assertEqual(len(self.engine.make({4}, {4, 5}, {4, 6, 9})), 3)
 
+    def test_count(self):
+        self.assertEqual(self.engine.count(self.engine.make_terminal(False)), 0)
+        self.assertEqual(self.engine.count(self.engine.make_terminal(True)), 1)
+        self.assertEqual(self.engine.count(self.engine.make({4}, {4, 5}, {4, 6, 9})), 3)
+
+        # Build the power set of range(70), whose size exceeds sys.maxsize.
+        family = self.engine.make_terminal(True)
+        for key in reversed(range(70)):
+            family = self.engine.make_node(key, family, family)
+        self.assertEqual(self.engine.count(family), 2 ** 70)
+        with self.assertRaises(OverflowError):
+            len(family)
+
+    def test_size_distribution(self):
+        zero = self.engine.make_terminal(False)
+        one = self.engine.make_terminal(True)
+
+        self.assertEqual(self.engine.size_distribution(zero), [])
+        self.assertEqual(self.engine.size_distribution(one), [1])
+        with self.assertRaises(ValueError):
+            self.engine.size_bounds(zero)
+        self.assertEqual(self.engine.size_bounds(one), (0, 0))
+
+        family = self.engine.make({4}, {4, 5}, {4, 6, 9}, {1, 2}, {7})
+        self.assertEqual(self.engine.size_distribution(family), [0, 2, 2, 1])
+        self.assertEqual(self.engine.size_bounds(family), (1, 3))
+
+        family = self.engine.make_terminal(True)
+        for key in reversed(range(5)):
+            family = self.engine.make_node(key, family, family)
+        self.assertEqual(self.engine.size_distribution(family), [1, 5, 10, 10, 5, 1])
+        self.assertEqual(self.engine.size_bounds(family), (0, 5))
+
+    def test_getitem(self):
+        zero = self.engine.make_terminal(False)
+        one = self.engine.make_terminal(True)
+
+        with self.assertRaises(IndexError):
+            zero[0]
+        self.assertEqual(one[0], frozenset())
+        self.assertEqual(one[-1], frozenset())
+
+        family = self.engine.make({4}, {4, 5}, {4, 6, 9}, {1, 2}, {7})
+        members = list(family)
+        self.assertEqual([family[i] for i in range(len(family))], members)
+        self.assertEqual(family[-1], members[-1])
+        self.assertEqual(family[1:4], members[1:4])
+        self.assertEqual(family[::-2], members[::-2])
+        with self.assertRaises(IndexError):
+            family[5]
+        with self.assertRaises(IndexError):
+            family[-6]
+
+        # Random accesses should work on families too large for len().
+        family = self.engine.make_terminal(True)
+        for key in reversed(range(100)):
+            family = self.engine.make_node(key, family, family)
+        self.assertEqual(family[0], frozenset())
+        self.assertEqual(family[-1], frozenset(range(100)))
+        self.assertEqual(family[2 ** 99], frozenset([0]))
+        self.assertEqual(family[2 ** 99 - 1:2 ** 99 + 1], [frozenset(range(1, 100)), frozenset([0])])
+
+    def test_index(self):
+        one = self.engine.make_terminal(True)
+        self.assertEqual(one.index(set()), 0)
+        with self.assertRaises(ValueError):
+            one.index({1})
+
+        family = self.engine.make({4}, {4, 5}, {4, 6, 9}, {1, 2}, {7})
+        for i, member in enumerate(family):
+            self.assertEqual(family.index(member), i)
+        for member in (set(), {4, 6}, {1, 2, 3}, {0, 4}, {8}):
+            with self.assertRaises(ValueError):
+                family.index(member)
+
+        family = self.engine.make_terminal(True)
+        for key in reversed(range(100)):
+            family = self.engine.make_node(key, family, family)
+        self.assertEqual(family.index(range(100)), 2 ** 100 - 1)
+        self.assertEqual(family.index({0}), 2 ** 99)
+
+    def test_sample(self):
+        rng = random.Random(42)
+        zero = self.engine.make_terminal(False)
+        self.assertEqual(self.engine.sample(zero, 0, rng), [])
+        with self.assertRaises(ValueError):
+            self.engine.sample(zero, 1, rng)
+
+        family = self.engine.make({4}, {4, 5}, {4, 6, 9}, {1, 2}, {7})
+        members = set(family)
+        for k in range(6):
+            sample = self.engine.sample(family, k, rng)
+            self.assertEqual(len(sample), k)
+            self.assertEqual(len(set(sample)), k)
+            self.assertLessEqual(set(sample), members)
+        with self.assertRaises(ValueError):
+            self.engine.sample(family, 6, rng)
+
+        family = self.engine.make_terminal(True)
+        for key in reversed(range(100)):
+            family = self.engine.make_node(key, family, family)
+        sample = self.engine.sample(family, 10, rng)
+        self.assertEqual(len(set(sample)), 10)
+        self.assertTrue(all(member in family for member in sample))
+
     def test_lt(self):
         zero = self.engine.make_terminal(False)
         one = self.engine.make_terminal(True)
@@ -194,6 +332,24 @@ class TestIntEngine(unittest.TestCase):
         self.assertTrue(family <= self.engine.make([4, 5], [4, 6, 9]))
         self.assertTrue(family <= self.engine.make([4], [4, 5], [4, 6, 9]))
 
+    def test_isdisjoint(self):
+        zero = self.engine.make_terminal(False)
+        one = self.engine.make_terminal(True)
+
+        self.assertTrue(zero.isdisjoint(zero))
+        self.assertTrue(zero.isdisjoint(one))
+        self.assertFalse(one.isdisjoint(one))
+        self.assertFalse(one.isdisjoint(self.engine.make([], [1, 2])))
+        self.assertTrue(one.isdisjoint(self.engine.make([1, 2])))
+
+        family = self.engine.make([4, 5], [4, 6, 9])
+        self.assertTrue(family.isdisjoint(zero))
+        self.assertTrue(family.isdisjoint(one))
+        self.assertFalse(family.isdisjoint(family))
+        self.assertTrue(family.isdisjoint(self.engine.make([4], [4, 6], [5], [1, 4, 5])))
+        self.assertFalse(family.isdisjoint(self.engine.make([4], [4, 6, 9])))
+        self.assertFalse(self.engine.make([4], [4, 6, 9]).isdisjoint(family))
+
     def test_union(self):
         # Test the union of families of empty set.
         eue = self.engine.make([]) | self.engine.make([])
@@ -263,6 +419,88 @@ class TestIntEngine(unittest.TestCase):
             self.assertEqual(list(aib), [])
             self.assertEqual(aib, bia)
 
+    def test_union_all(self):
+        self.assertEqual(self.engine.union_all([]), self.engine.make_terminal(False))
+
+        families = [[{1, 3, 9}, {0, 2, 4}], [{1, 3, 9}, {5, 6, 7}], [set()], [{4}]]
+        rv = self.engine.union_all(self.engine.make(*family) for family in families)
+        self.assertEqual(
+            set(frozenset(el) for el in rv),
+            set(frozenset(el) for family in families for el in family)
+        )
+
+        family = self.engine.make({1, 3, 8})
+        self.assertEqual(self.engine.union_all([family]), family)
+        self.assertEqual(self.engine.union_all([family, family, family]), family)
+
+        # Families too large for len() should be supported too.
+        power_set = self.engine.make_terminal(True)
+        for key in reversed(range(70)):
+            power_set = self.engine.make_node(key, power_set, power_set)
+        self.assertEqual(self.engine.union_all([power_set, family, power_set]), power_set)
+
+    def test_intersection_all(self):
+        with self.assertRaises(ValueError):
+            self.engine.intersection_all([])
+
+        families = [
+            [{1, 3, 9}, {0, 2, 4}, set()],
+            [{1, 3, 9}, {5, 6, 7}, set()],
+            [{1, 3, 9}, {0, 2, 4}, {5, 6, 7}, set()]
+        ]
+        rv = self.engine.intersection_all(self.engine.make(*family) for family in families)
+        self.assertEqual(
+            set(frozenset(el) for el in rv),
+            set(frozenset(el) for el in ({1, 3, 9}, set()))
+        )
+
+        families.append([{4}])
+        rv = self.engine.intersection_all(self.engine.make(*family) for family in families)
+        self.assertTrue(rv.is_zero())
+
+        power_set = self.engine.make_terminal(True)
+        for key in reversed(range(70)):
+            power_set = self.engine.make_node(key, power_set, power_set)
+        family = self.engine.make({1, 3, 8}, {71})
+        self.assertEqual(
+            self.engine.intersection_all([power_set, family, power_set]),
+            self.engine.make({1, 3, 8}))
+
+    def test_fixpoint(self):
+        def successors(parity):
+            # Returns a step that maps {i} to {i + 1}, for all i < 9 of the
+            # given parity (or all of them, if None).
+            def step(family):
+                return self.engine.make(*[
+                    {i + 1} for (i,) in family
+                    if (i < 9) and ((parity is None) or (i % 2 == parity))
+                ])
+            return step
+
+        expected = {frozenset([i]) for i in range(10)}
+        initial = self.engine.make({0})
+
+        infos = []
+        rv = self.engine.fixpoint(initial, successors(None), callback=infos.append)
+        self.assertEqual(set(rv), expected)
+        self.assertEqual([info.frontier_size for info in infos], [1] * 9 + [0])
+        self.assertEqual(infos[-1].visited_size, 10)
+        self.assertEqual(infos[-1].frontier_nodes, 1)
+
+        infos = []
+        rv = self.engine.fixpoint(
+            initial, [successors(0), successors(1)], callback=infos.append)
+        self.assertEqual(set(rv), expected)
+        self.assertEqual(len(infos), 10)
+
+        # Chaining should let each step expand the members discovered by the
+        # previous ones during the same iteration.
+        infos = []
+        rv = self.engine.fixpoint(
+            initial, [successors(0), successors(1)], chaining=True, callback=infos.append)
+        self.assertEqual(set(rv), expected)
+        self.assertEqual(len(infos), 6)
+
     def test_difference(self):
         # Test the difference between 2 families of empty set.
         ede = self.engine.make([]) - self.engine.make([])
@@ -309,3 +547,56 @@ class TestIntEngine(unittest.TestCase):
             set(frozenset(el) for el in (a ^ b)),
             set(frozenset(el) for el in [{1, 3, 9}, {0, 2, 4}, {1, 3, 0}, {5, 6, 7}])
         )
+
+    def test_dump(self):
+        a = self.engine.make({1, 2}, {1, 3}, {2}, {-1})
+        b = self.engine.make({1, 3}, {4, 500}, {})
+        buffer = io.BytesIO()
+        self.engine.dump([a, b, a & b], buffer)
+
+        # Loading the families in the engine that wrote them should give
+        # back the same nodes.
+        buffer.seek(0)
+        self.assertEqual(self.engine.load(buffer), [a, b, a & b])
+
+        with self.assertRaises(ValueError):
+            self.engine.load(io.BytesIO(b'not a family file'))
+        with self.assertRaises(ValueError):
+            self.engine.load(io.BytesIO(buffer.getvalue()[:-2]))
+
+    def test_stats(self):
+        a = self.engine.make({1, 2}, {1, 3})
+        b = self.engine.make({1, 2}, {4})
+        nb_nodes = self.engine.node_count()
+        self.assertEqual(len(a | b), 3)
+        self.assertEqual(len(a | b), 3)
+        self.assertTrue(a - b <= a)
+
+        stats = self.engine.stats()
+        self.assertEqual(stats.node_count, self.engine.node_count())
+        self.assertGreater(stats.node_count, nb_nodes)
+        self.assertGreaterEqual(stats.peak_node_count, stats.node_count)
+        self.assertEqual(stats.calls['union'], 2)
+        self.assertEqual(stats.calls['difference'], 1)
+        self.assertEqual(stats.calls['issubset'], 1)
+        self.assertGreaterEqual(stats.time['union'], 0)
+        self.assertGreater(stats.caches['union'].hits, 0)
+        self.assertGreater(stats.caches['union'].misses, 0)
+
+        self.engine.reset_stats()
+        stats = self.engine.stats()
+        self.assertEqual(stats.calls, {})
+        self.assertEqual(stats.time, {})
+        self.assertEqual(stats.peak_node_count, stats.node_count)
+        self.assertEqual(stats.caches['union'].hits, 0)
+        self.assertEqual(stats.caches['union'].misses, 0)
+
+    def test_roots_outlive_engine(self):
+        # The roots keep their engine alive, so the nodes they refer to
+        # remain valid after the engine is released.
+        for i in range(100):
+            engine = IntEngine()
+            a = engine.make({1, 2}, {3}, {i})
+            del engine
+            b = a | a.then_
+            self.assertEqual(len(b), len(a | b))
@@ -0,0 +1,76 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import unittest
+
+from ydd.engines.cache import (
+    Cache, DirectMappedCache, GenerationalCache, LRUCache, make_cache)
+
+
+class TestCache(unittest.TestCase):
+
+    def test_make_cache(self):
+        self.assertIsInstance(make_cache(), Cache)
+        self.assertIsInstance(make_cache('direct', 8), DirectMappedCache)
+        self.assertIsInstance(make_cache('lru', 8), LRUCache)
+        self.assertIsInstance(make_cache('generational', 8), GenerationalCache)
+
+        with self.assertRaises(ValueError):
+            make_cache('fifo', 8)
+        with self.assertRaises(ValueError):
+            make_cache('lru', 0)
+
+    def test_unbounded(self):
+        cache = Cache()
+        for i in range(100):
+            cache[i] = i
+        self.assertEqual(len(cache), 100)
+        self.assertEqual(cache.get(0), 0)
+        self.assertIsNone(cache.get(100))
+        self.assertEqual(cache.info(), (1, 1, 0, None, 100))
+
+    def test_direct_mapped(self):
+        cache = DirectMappedCache(4)
+        cache[0] = 'a'
+        cache[1] = 'b'
+        self.assertEqual(cache.get(0), 'a')
+        self.assertEqual(cache.get(1), 'b')
+
+        # Keys that hash to the same slot should evict each other.
+        cache[4] = 'c'
+        self.assertIsNone(cache.get(0))
+        self.assertEqual(cache.get(4), 'c')
+        self.assertEqual(cache.info(), (3, 1, 1, 4, 2))
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get(4))
+
+    def test_lru(self):
+        cache = LRUCache(2)
+        cache[0] = 'a'
+        cache[1] = 'b'
+        self.assertEqual(cache.get(0), 'a')
+
+        # The least recently used entry should be evicted first.
+        cache[2] = 'c'
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.get(0), 'a')
+        self.assertEqual(cache.get(2), 'c')
+        self.assertEqual(cache.info(), (3, 1, 1, 2, 2))
+
+    def test_generational(self):
+        cache = GenerationalCache(4)
+        for i in range(4):
+            cache[i] = i
+        self.assertEqual(len(cache), 4)
+
+        # Entries of the old generation should be promoted on hits, while
+        # the others should be dropped with their generation.
+        self.assertEqual(cache.get(2), 2)
+        cache[4] = 4
+        self.assertEqual(cache.get(2), 2)
+        self.assertIsNone(cache.get(0))
+        self.assertIsNone(cache.get(1))
+        self.assertLessEqual(len(cache), 4)
+        self.assertEqual(cache.evictions, 2)
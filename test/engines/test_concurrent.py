@@ -0,0 +1,116 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import random
+import threading
+import unittest
+
+from ydd.engines.concurrent import ConcurrentEngine
+from ydd.homomorphisms import Homomorphism
+
+
+class Reorder(Homomorphism):
+
+    cached = False
+
+    def image(self, engine, family):
+        engine.reorder()
+        return family
+
+
+class TestConcurrentEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = ConcurrentEngine()
+
+    def run_threads(self, target, count=8):
+        errors = []
+
+        def run(i):
+            try:
+                target(i)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def members(self, seed):
+        rng = random.Random(seed)
+        return [rng.sample(range(24), rng.randint(0, 8)) for _ in range(64)]
+
+    def test_operations(self):
+        families = [self.engine.make(*self.members(seed)) for seed in range(4)]
+        results = [{} for _ in range(8)]
+
+        def compute(i):
+            for _ in range(4):
+                for j, a in enumerate(families):
+                    for k, b in enumerate(families):
+                        results[i][j, k] = (a | b, a & b, a - b, a ^ b, a <= b)
+
+        self.run_threads(compute)
+
+        # Nodes are unique, so all the threads should get the same results.
+        for j, a in enumerate(families):
+            for k, b in enumerate(families):
+                expected = (a | b, a & b, a - b, a ^ b, a <= b)
+                for i in range(8):
+                    for result, other in zip(results[i][j, k], expected):
+                        self.assertIs(result, other)
+
+        stats = self.engine.stats()
+        self.assertEqual(stats.calls['union'], 8 * 4 * 16 + 16)
+        self.assertGreater(stats.caches['union'].misses, 0)
+
+    def test_make(self):
+        families = [None] * 8
+
+        def make(i):
+            families[i] = self.engine.make(*self.members(0))
+
+        self.run_threads(make)
+        for family in families:
+            self.assertIs(family, families[0])
+        self.assertEqual(len(families[0]), len({frozenset(m) for m in self.members(0)}))
+
+    def test_collect(self):
+        engine = ConcurrentEngine(gc_threshold=64)
+        families = [engine.make(*self.members(seed)) for seed in range(4)]
+        expected = [{frozenset(m) for m in self.members(seed)} for seed in range(4)]
+
+        def compute(i):
+            for _ in range(8):
+                a = families[i % 4]
+                b = families[(i + 1) % 4]
+                self.assertEqual(set(a | b), expected[i % 4] | expected[(i + 1) % 4])
+                self.assertEqual(set(a & b), expected[i % 4] & expected[(i + 1) % 4])
+
+        self.run_threads(compute)
+        self.assertGreater(engine.gc_info().collections, 0)
+        for family, members in zip(families, expected):
+            self.assertEqual(set(family), members)
+
+    def test_reorder(self):
+        families = [self.engine.make(*self.members(seed)) for seed in range(4)]
+        expected = [{frozenset(m) for m in self.members(seed)} for seed in range(4)]
+
+        def compute(i):
+            for _ in range(4):
+                a = families[i % 4]
+                b = families[(i + 1) % 4]
+                if i == 0:
+                    self.engine.reorder()
+                self.assertEqual(len(a | b), len(expected[i % 4] | expected[(i + 1) % 4]))
+
+        self.run_threads(compute)
+        for family, members in zip(families, expected):
+            self.assertEqual(set(family), members)
+
+        with self.assertRaises(RuntimeError):
+            self.engine.apply(Reorder(), families[0])
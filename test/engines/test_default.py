@@ -1,6 +1,8 @@
 # Copyright (c) 2015, Dimitri Racordon.
 # Licensed under the Apache License, Version 2.0.
 
+import io
+import random
 import unittest
 
 from ydd.engines.default import DefaultEngine
@@ -42,6 +44,33 @@ class TestDefaultEngine(unittest.TestCase):
         self.assertEqual(list(self.engine.make_from_container({-1, 1, 2})), [{-1, 1, 2}])
         self.assertEqual(list(self.engine.make_from_container([-1, 1, 2])), [{-1, 1, 2}])
 
+    def test_make_from_sorted(self):
+        self.assertTrue(self.engine.make_from_sorted([]).is_zero())
+        self.assertTrue(self.engine.make_from_sorted([[]]).is_one())
+
+        containers = [{4, 6, 9}, [4], set(), (5, 4, 5), {4, 6, 9}, {1}]
+        family = self.engine.make_from_sorted(containers)
+        self.assertEqual(
+            set(frozenset(el) for el in family),
+            set(frozenset(el) for el in containers)
+        )
+        self.assertEqual(family, self.engine.make(*containers))
+        self.assertEqual(
+            family,
+            self.engine.union_all(self.engine.make_from_container(el) for el in containers))
+
+    def test_make_from_stream(self):
+        containers = [set(), {1}, {1, 2}, {1, 2, 4}, {1, 3}, {2}, {2}, {3, 4}]
+        family = self.engine.make(*containers)
+
+        self.assertEqual(
+            self.engine.make_from_stream(reversed(containers), chunk_size=3), family)
+        self.assertEqual(
+            self.engine.make_from_stream(iter(containers), presorted=True), family)
+
+        with self.assertRaises(ValueError):
+            self.engine.make_from_stream(reversed(containers), presorted=True)
+
     def test_make(self):
         zero = self.engine.make_terminal(False)
         one = self.engine.make_terminal(True)
@@ -105,6 +134,10 @@ class TestDefaultEngine(unittest.TestCase):
         self.assertFalse({1} in family)
         self.assertFalse({1, 5} in family)
 
+        family = self.engine.make({5}, set())
+        self.assertFalse({0} in family)
+        self.assertFalse({0, 5} in family)
+
     def test_iter(self):
         family = self.engine.make_terminal(False)
         self.assertEqual(list(family), [])
@@ -130,6 +163,110 @@ class TestDefaultEngine(unittest.TestCase):
         self.assertEqual(len(self.engine.make({1, 2})), 1)
         self.assertEqual(len(self.engine.make({4}, {4, 5}, {4, 6, 9})), 3)
 
+    def test_count(self):
+        self.assertEqual(self.engine.count(self.engine.make_terminal(False)), 0)
+        self.assertEqual(self.engine.count(self.engine.make_terminal(True)), 1)
+        self.assertEqual(self.engine.count(self.engine.make({4}, {4, 5}, {4, 6, 9})), 3)
+
+        # Build the power set of range(70), whose size exceeds sys.maxsize.
+        family = self.engine.make_terminal(True)
+        for key in reversed(range(70)):
+            family = self.engine.make_node(key, family, family)
+        self.assertEqual(self.engine.count(family), 2 ** 70)
+        with self.assertRaises(OverflowError):
+            len(family)
+
+    def test_size_distribution(self):
+        zero = self.engine.make_terminal(False)
+        one = self.engine.make_terminal(True)
+
+        self.assertEqual(self.engine.size_distribution(zero), [])
+        self.assertEqual(self.engine.size_distribution(one), [1])
+        with self.assertRaises(ValueError):
+            self.engine.size_bounds(zero)
+        self.assertEqual(self.engine.size_bounds(one), (0, 0))
+
+        family = self.engine.make({4}, {4, 5}, {4, 6, 9}, {1, 2}, {7})
+        self.assertEqual(self.engine.size_distribution(family), [0, 2, 2, 1])
+        self.assertEqual(self.engine.size_bounds(family), (1, 3))
+
+        family = self.engine.make_terminal(True)
+        for key in reversed(range(5)):
+            family = self.engine.make_node(key, family, family)
+        self.assertEqual(self.engine.size_distribution(family), [1, 5, 10, 10, 5, 1])
+        self.assertEqual(self.engine.size_bounds(family), (0, 5))
+
+    def test_getitem(self):
+        zero = self.engine.make_terminal(False)
+        one = self.engine.make_terminal(True)
+
+        with self.assertRaises(IndexError):
+            zero[0]
+        self.assertEqual(one[0], frozenset())
+        self.assertEqual(one[-1], frozenset())
+
+        family = self.engine.make({4}, {4, 5}, {4, 6, 9}, {1, 2}, {7})
+        members = list(family)
+        self.assertEqual([family[i] for i in range(len(family))], members)
+        self.assertEqual(family[-1], members[-1])
+        self.assertEqual(family[1:4], members[1:4])
+        self.assertEqual(family[::-2], members[::-2])
+        with self.assertRaises(IndexError):
+            family[5]
+        with self.assertRaises(IndexError):
+            family[-6]
+
+        # Random accesses should work on families too large for len().
+        family = self.engine.make_terminal(True)
+        for key in reversed(range(100)):
+            family = self.engine.make_node(key, family, family)
+        self.assertEqual(family[0], frozenset())
+        self.assertEqual(family[-1], frozenset(range(100)))
+        self.assertEqual(family[2 ** 99], frozenset([0]))
+
+    def test_index(self):
+        one = self.engine.make_terminal(True)
+        self.assertEqual(one.index(set()), 0)
+        with self.assertRaises(ValueError):
+            one.index({1})
+
+        family = self.engine.make({4}, {4, 5}, {4, 6, 9}, {1, 2}, {7})
+        for i, member in enumerate(family):
+            self.assertEqual(family.index(member), i)
+        for member in (set(), {4, 6}, {1, 2, 3}, {0, 4}, {8}):
+            with self.assertRaises(ValueError):
+                family.index(member)
+
+        family = self.engine.make_terminal(True)
+        for key in reversed(range(100)):
+            family = self.engine.make_node(key, family, family)
+        self.assertEqual(family.index(range(100)), 2 ** 100 - 1)
+        self.assertEqual(family.index({0}), 2 ** 99)
+
+    def test_sample(self):
+        rng = random.Random(42)
+        zero = self.engine.make_terminal(False)
+        self.assertEqual(self.engine.sample(zero, 0, rng), [])
+        with self.assertRaises(ValueError):
+            self.engine.sample(zero, 1, rng)
+
+        family = self.engine.make({4}, {4, 5}, {4, 6, 9}, {1, 2}, {7})
+        members = set(family)
+        for k in range(6):
+            sample = self.engine.sample(family, k, rng)
+            self.assertEqual(len(sample), k)
+            self.assertEqual(len(set(sample)), k)
+            self.assertLessEqual(set(sample), members)
+        with self.assertRaises(ValueError):
+            self.engine.sample(family, 6, rng)
+
+        family = self.engine.make_terminal(True)
+        for key in reversed(range(100)):
+            family = self.engine.make_node(key, family, family)
+        sample = self.engine.sample(family, 10, rng)
+        self.assertEqual(len(set(sample)), 10)
+        self.assertTrue(all(member in family for member in sample))
+
     def test_lt(self):
         zero = self.engine.make_terminal(False)
         one = self.engine.make_terminal(True)
@@ -194,6 +331,24 @@ class TestDefaultEngine(unittest.TestCase):
         self.assertTrue(family <= self.engine.make([4, 5], [4, 6, 9]))
         self.assertTrue(family <= self.engine.make([4], [4, 5], [4, 6, 9]))
 
+    def test_isdisjoint(self):
+        zero = self.engine.make_terminal(False)
+        one = self.engine.make_terminal(True)
+
+        self.assertTrue(zero.isdisjoint(zero))
+        self.assertTrue(zero.isdisjoint(one))
+        self.assertFalse(one.isdisjoint(one))
+        self.assertFalse(one.isdisjoint(self.engine.make([], [1, 2])))
+        self.assertTrue(one.isdisjoint(self.engine.make([1, 2])))
+
+        family = self.engine.make([4, 5], [4, 6, 9])
+        self.assertTrue(family.isdisjoint(zero))
+        self.assertTrue(family.isdisjoint(one))
+        self.assertFalse(family.isdisjoint(family))
+        self.assertTrue(family.isdisjoint(self.engine.make([4], [4, 6], [5], [1, 4, 5])))
+        self.assertFalse(family.isdisjoint(self.engine.make([4], [4, 6, 9])))
+        self.assertFalse(self.engine.make([4], [4, 6, 9]).isdisjoint(family))
+
     def test_union(self):
         # Test the union of families of empty set.
         eue = self.engine.make([]) | self.engine.make([])
@@ -263,6 +418,74 @@ class TestDefaultEngine(unittest.TestCase):
             self.assertEqual(list(aib), [])
             self.assertEqual(aib, bia)
 
+    def test_union_all(self):
+        self.assertEqual(self.engine.union_all([]), self.engine.make_terminal(False))
+
+        families = [[{1, 3, 9}, {0, 2, 4}], [{1, 3, 9}, {5, 6, 7}], [set()], [{4}]]
+        rv = self.engine.union_all(self.engine.make(*family) for family in families)
+        self.assertEqual(
+            set(frozenset(el) for el in rv),
+            set(frozenset(el) for family in families for el in family)
+        )
+
+        family = self.engine.make({1, 3, 8})
+        self.assertEqual(self.engine.union_all([family]), family)
+        self.assertEqual(self.engine.union_all([family, family, family]), family)
+
+    def test_intersection_all(self):
+        with self.assertRaises(ValueError):
+            self.engine.intersection_all([])
+
+        families = [
+            [{1, 3, 9}, {0, 2, 4}, set()],
+            [{1, 3, 9}, {5, 6, 7}, set()],
+            [{1, 3, 9}, {0, 2, 4}, {5, 6, 7}, set()]
+        ]
+        rv = self.engine.intersection_all(self.engine.make(*family) for family in families)
+        self.assertEqual(
+            set(frozenset(el) for el in rv),
+            set(frozenset(el) for el in ({1, 3, 9}, set()))
+        )
+
+        families.append([{4}])
+        rv = self.engine.intersection_all(self.engine.make(*family) for family in families)
+        self.assertTrue(rv.is_zero())
+
+    def test_fixpoint(self):
+        def successors(parity):
+            # Returns a step that maps {i} to {i + 1}, for all i < 9 of the
+            # given parity (or all of them, if None).
+            def step(family):
+                return self.engine.make(*[
+                    {i + 1} for (i,) in family
+                    if (i < 9) and ((parity is None) or (i % 2 == parity))
+                ])
+            return step
+
+        expected = {frozenset([i]) for i in range(10)}
+        initial = self.engine.make({0})
+
+        infos = []
+        rv = self.engine.fixpoint(initial, successors(None), callback=infos.append)
+        self.assertEqual(set(rv), expected)
+        self.assertEqual([info.frontier_size for info in infos], [1] * 9 + [0])
+        self.assertEqual(infos[-1].visited_size, 10)
+        self.assertEqual(infos[-1].frontier_nodes, 1)
+
+        infos = []
+        rv = self.engine.fixpoint(
+            initial, [successors(0), successors(1)], callback=infos.append)
+        self.assertEqual(set(rv), expected)
+        self.assertEqual(len(infos), 10)
+
+        # Chaining should let each step expand the members discovered by the
+        # previous ones during the same iteration.
+        infos = []
+        rv = self.engine.fixpoint(
+            initial, [successors(0), successors(1)], chaining=True, callback=infos.append)
+        self.assertEqual(set(rv), expected)
+        self.assertEqual(len(infos), 6)
+
     def test_difference(self):
         # Test the difference between 2 families of empty set.
         ede = self.engine.make([]) - self.engine.make([])
@@ -309,3 +532,222 @@ class TestDefaultEngine(unittest.TestCase):
             set(frozenset(el) for el in (a ^ b)),
             set(frozenset(el) for el in [{1, 3, 9}, {0, 2, 4}, {1, 3, 0}, {5, 6, 7}])
         )
+
+    def test_dump(self):
+        a = self.engine.make({1, 2}, {1, 3}, {2}, {-1})
+        b = self.engine.make({1, 3}, {4, 500}, {})
+        buffer = io.BytesIO()
+        self.engine.dump([a, b, a & b], buffer)
+
+        # Loading the families in the engine that wrote them should give
+        # back the same nodes.
+        buffer.seek(0)
+        self.assertEqual(self.engine.load(buffer), [a, b, a & b])
+
+        # Loading them in another engine should preserve the shared nodes.
+        engine = DefaultEngine()
+        c, d, e = engine.load(io.BytesIO(buffer.getvalue()))
+        self.assertEqual(set(c), set(a))
+        self.assertEqual(set(d), set(b))
+        self.assertIs(c & d, e)
+
+        # Keys of any type should be supported.
+        engine = DefaultEngine()
+        for keys in (('a', 'b', 'c'), ((0, 'a'), (0, 'b'), (1, 'a')), (0.5, 1.5, 2.5)):
+            family = engine.make(keys[:2], keys[1:], {})
+            buffer = io.BytesIO()
+            engine.dump([family], buffer)
+            buffer.seek(0)
+            self.assertEqual(DefaultEngine().load(buffer)[0].key, family.key)
+            buffer.seek(0)
+            self.assertEqual(engine.load(buffer), [family])
+
+        with self.assertRaises(ValueError):
+            engine.load(io.BytesIO(b'not a family file'))
+        with self.assertRaises(ValueError):
+            engine.load(io.BytesIO(buffer.getvalue()[:-2]))
+
+    def test_deep_families(self):
+        # Operations shouldn't be limited by the recursion limit.
+        a = self.engine.make(range(5000), range(1, 5000, 2))
+        b = self.engine.make(range(0, 5000, 2), range(1, 5000, 2))
+        self.assertEqual(len(a | b), 3)
+        self.assertEqual(list(a & b), [set(range(1, 5000, 2))])
+        self.assertEqual(list(a - b), [set(range(5000))])
+        self.assertEqual(len(a ^ b), 2)
+        self.assertTrue(a & b < a)
+        self.assertFalse(a <= b)
+
+    def test_collect(self):
+        a = self.engine.make({1, 2}, {1, 3})
+        b = self.engine.make({4, 5})
+        self.engine.make({6, 7}, {6})
+        self.engine.make({1, 2}, {1, 4}) - b
+
+        # Unreferenced nodes (and the cache entries on them) should be freed.
+        nb_nodes = self.engine.node_count()
+        nb_entries = self.engine.cache_info()['difference'].currsize
+        self.assertGreater(self.engine.collect(), 0)
+        self.assertLess(self.engine.node_count(), nb_nodes)
+        self.assertLess(self.engine.cache_info()['difference'].currsize, nb_entries)
+        self.assertEqual(self.engine.collect(), 0)
+
+        # Referenced nodes should be kept, and remain canonical.
+        self.assertIs(self.engine.make({1, 3}, {1, 2}), a)
+        self.assertEqual(
+            set(frozenset(el) for el in a | b),
+            set(frozenset(el) for el in ({1, 2}, {1, 3}, {4, 5}))
+        )
+
+        # Only the nodes reachable from explicit roots should be kept.
+        self.assertGreater(self.engine.collect(roots=[a]), 0)
+        self.assertEqual(self.engine.node_count(), 5)
+        self.assertEqual(list(a - self.engine.make({1, 3})), [{1, 2}])
+
+        info = self.engine.gc_info()
+        self.assertEqual(info.collections, 3)
+        self.assertGreaterEqual(info.time, info.max_pause)
+
+    def test_collect_threshold(self):
+        engine = DefaultEngine(gc_threshold=32)
+        family = engine.make()
+        for i in range(64):
+            family = engine.make({i, i + 1, i + 2}) | (family - engine.make({i - 2, i - 1, i}))
+
+        self.assertGreater(engine.gc_info().collections, 0)
+        self.assertLessEqual(engine.node_count(), 64)
+        self.assertEqual(len(family), 2)
+
+    def test_reorder(self):
+        # Members that contain either both or none of i and i + 8 need an
+        # exponential number of nodes, unless those keys are adjacent.
+        members = [
+            {i for i in range(8) if (bits >> i) & 1} | {i + 8 for i in range(8) if (bits >> i) & 1}
+            for bits in range(256)
+        ]
+        for method in ('sifting', 'window'):
+            engine = DefaultEngine()
+            a = engine.make(*members)
+            b = engine.make({0, 8}, {3, 4})
+            engine.collect()
+            nb_nodes = engine.node_count()
+
+            self.assertLess(engine.reorder(method), nb_nodes)
+            self.assertEqual(engine.node_count(), engine.reorder())
+            self.assertEqual(len(a), 256)
+            self.assertEqual(set(a), set(frozenset(member) for member in members))
+            self.assertEqual(set(b), {frozenset({0, 8}), frozenset({3, 4})})
+
+            # Nodes should remain canonical, and operations should follow
+            # the new order.
+            self.assertEqual(engine.make(*members), a)
+            self.assertEqual(list(a & b), [{0, 8}])
+            self.assertEqual(len(a | engine.make({3, 4}, {20})), 258)
+            self.assertTrue(b - a <= b)
+            self.assertIn({3, 4}, b)
+            self.assertEqual(b[b.index({3, 4})], {3, 4})
+
+        engine = DefaultEngine()
+        a = engine.make({1, 2}, {2, 3})
+        self.assertEqual(engine.variable_order(), [1, 2, 3])
+        engine.reorder(order=[3, 2])
+        self.assertEqual(engine.variable_order(), [3, 2, 1])
+        self.assertEqual(a.key, 3)
+        self.assertEqual(set(a), {frozenset({1, 2}), frozenset({2, 3})})
+
+        # New keys should be placed after the others.
+        self.assertEqual(engine.make({0, 1}).key, 1)
+        self.assertEqual(engine.variable_order(), [3, 2, 1, 0])
+        self.assertEqual(engine.reorder_info().reorderings, 1)
+
+        with self.assertRaises(ValueError):
+            engine.reorder('random')
+
+    def test_reorder_threshold(self):
+        engine = DefaultEngine(reorder_threshold=64)
+        family = engine.make()
+        for bits in range(256):
+            family = family | engine.make(
+                {i for i in range(8) if (bits >> i) & 1} |
+                {i + 8 for i in range(8) if (bits >> i) & 1})
+
+        self.assertGreater(engine.reorder_info().reorderings, 0)
+        self.assertEqual(len(family), 256)
+        self.assertIn({0, 8, 7, 15}, family)
+
+    def test_stats(self):
+        a = self.engine.make({1, 2}, {1, 3})
+        b = self.engine.make({1, 2}, {4})
+        nb_nodes = self.engine.node_count()
+        self.assertEqual(len(a | b), 3)
+        self.assertEqual(len(a | b), 3)
+        self.assertTrue(a - b <= a)
+
+        stats = self.engine.stats()
+        self.assertEqual(stats.node_count, self.engine.node_count())
+        self.assertGreater(stats.node_count, nb_nodes)
+        self.assertGreaterEqual(stats.peak_node_count, stats.node_count)
+        self.assertEqual(stats.calls['union'], 2)
+        self.assertEqual(stats.calls['difference'], 1)
+        self.assertEqual(stats.calls['issubset'], 1)
+        self.assertGreaterEqual(stats.time['union'], 0)
+        self.assertGreater(stats.caches['union'].hits, 0)
+        self.assertGreater(stats.caches['union'].misses, 0)
+
+        self.engine.reset_stats()
+        stats = self.engine.stats()
+        self.assertEqual(stats.calls, {})
+        self.assertEqual(stats.time, {})
+        self.assertEqual(stats.peak_node_count, stats.node_count)
+        self.assertEqual(stats.caches['union'].hits, 0)
+        self.assertEqual(stats.caches['union'].misses, 0)
+
+    def test_hooks(self):
+        a = self.engine.make({1, 2}, {1, 3})
+        b = self.engine.make({1, 2}, {4})
+
+        events = []
+        with self.engine.hook('union', events.append):
+            c = a | b
+            a & b
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].operation, 'union')
+        self.assertEqual(events[0].operands, (a, b))
+        self.assertIs(events[0].result, c)
+        self.assertEqual(events[0].operand_sizes, (5, 5))
+        self.assertEqual(events[0].result_size, 6)
+        self.assertGreater(events[0].steps, 0)
+        self.assertGreaterEqual(events[0].time, 0)
+
+        # Hooks are removed on exit, and the hooks of all operations don't
+        # see the nested ones.
+        a | b
+        self.assertEqual(len(events), 1)
+        self.engine.add_hook(None, events.append)
+        self.engine.union_all([a, b, c])
+        self.engine.remove_hook(None, events.append)
+        self.assertEqual([event.operation for event in events], ['union', 'union_all'])
+        self.assertEqual(events[1].operand_sizes, ((5, 5, 6),))
+
+    def test_caches(self):
+        for policy in ('direct', 'lru', 'generational'):
+            engine = DefaultEngine(cache_policy=policy, cache_size=16)
+
+            # Chains of overlapping families trigger an exponential number of
+            # recursive calls, unless each of them is evaluated only once.
+            a = engine.make(*[range(i, 48) for i in range(0, 48, 2)])
+            b = engine.make(*[range(i, 48) for i in range(1, 48, 2)])
+            self.assertEqual(len(a | b), 48)
+            self.assertEqual(len((a | b) - b), 24)
+            self.assertTrue(a <= (a | b))
+            self.assertTrue(a.isdisjoint(b))
+
+            for operation, info in engine.cache_info().items():
+                self.assertLessEqual(info.currsize, 16)
+
+        engine = DefaultEngine(cache_sizes={'union': 4})
+        self.assertEqual(engine.cache_info()['union'].maxsize, 4)
+        self.assertIsNone(engine.cache_info()['intersection'].maxsize)
+
+        with self.assertRaises(ValueError):
+            DefaultEngine(cache_sizes={'product': 4})
@@ -0,0 +1,168 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import unittest
+
+from ydd.engines.default import DefaultEngine
+from ydd.homomorphisms import (
+    Composition, Constant, Fixpoint, Identity, Inductive, Union, compose, fixpoint, union)
+
+
+class SetsContaining(Inductive):
+
+    def __init__(self, element):
+        super().__init__(element)
+        self.element = element
+
+    def apply_one(self, engine):
+        return engine.make_terminal(False)
+
+    def apply_node(self, engine, node):
+        if node.key < self.element:
+            return engine.make_node(
+                node.key,
+                engine.apply(self, node.then_),
+                engine.apply(self, node.else_))
+        elif node.key == self.element:
+            return engine.make_node(node.key, node.then_, engine.make_terminal(False))
+        else:
+            return engine.make_terminal(False)
+
+
+class Increment(Inductive):
+    # Replaces the largest element `n` of each set by `n + 1`, up to `limit`.
+
+    def __init__(self, limit):
+        super().__init__(limit)
+        self.limit = limit
+
+    def apply_node(self, engine, node):
+        if node.then_.is_one():
+            if node.key >= self.limit:
+                rv = engine.make_terminal(False)
+            else:
+                rv = engine.make_node(node.key + 1, node.then_, engine.make_terminal(False))
+        else:
+            rv = engine.make_node(
+                node.key,
+                engine.apply(self, node.then_),
+                engine.make_terminal(False))
+        return rv | engine.apply(self, node.else_)
+
+
+class TestHomomorphisms(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = DefaultEngine()
+
+    def test_identity(self):
+        family = self.engine.make([1, 2], [3])
+        self.assertIs(self.engine.apply(Identity(), family), family)
+
+        zero = self.engine.make_terminal(False)
+        self.assertIs(self.engine.apply(Identity(), zero), zero)
+
+    def test_constant(self):
+        family = self.engine.make([1, 2], [3])
+        constant = self.engine.make([4])
+        self.assertIs(self.engine.apply(Constant(constant), family), constant)
+
+        # Homomorphisms should map the empty family to itself.
+        zero = self.engine.make_terminal(False)
+        self.assertIs(self.engine.apply(Constant(constant), zero), zero)
+
+    def test_inductive(self):
+        family = self.engine.make([1, 2], [1, 42], [42, 50], [43])
+        self.assertEqual(
+            set(self.engine.apply(SetsContaining(42), family)),
+            {frozenset([1, 42]), frozenset([42, 50])})
+        self.assertEqual(
+            set(self.engine.apply(SetsContaining(2), family)),
+            {frozenset([1, 2])})
+
+        family = self.engine.make([1, 2], [3])
+        self.assertEqual(
+            set(self.engine.apply(Increment(10), family)),
+            {frozenset([1, 3]), frozenset([4])})
+
+    def test_equality(self):
+        self.assertEqual(SetsContaining(42), SetsContaining(42))
+        self.assertNotEqual(SetsContaining(42), SetsContaining(43))
+        self.assertNotEqual(SetsContaining(1), Increment(1))
+        self.assertEqual(hash(SetsContaining(42)), hash(SetsContaining(42)))
+
+        self.assertEqual(
+            SetsContaining(1) | SetsContaining(2),
+            SetsContaining(2) | SetsContaining(1))
+        self.assertNotEqual(
+            SetsContaining(1) * SetsContaining(2),
+            SetsContaining(2) * SetsContaining(1))
+
+    def test_compose(self):
+        self.assertEqual(compose(), Identity())
+        self.assertEqual(compose(Identity(), Increment(1)), Increment(1))
+        self.assertIsInstance(Increment(1) * Increment(2), Composition)
+        self.assertEqual(
+            compose(Increment(1) * Increment(2), Increment(3)).operands,
+            (Increment(1), Increment(2), Increment(3)))
+
+        # Compositions should apply their operands from right to left.
+        family = self.engine.make([1], [5])
+        self.assertEqual(
+            set(self.engine.apply(SetsContaining(2) * Increment(10), family)),
+            {frozenset([2])})
+        self.assertEqual(
+            set(self.engine.apply(Increment(10) * SetsContaining(2), family)),
+            set())
+
+    def test_union(self):
+        with self.assertRaises(ValueError):
+            union()
+        self.assertEqual(union(Increment(1)), Increment(1))
+        self.assertEqual(Increment(1) | Increment(1), Increment(1))
+        self.assertIsInstance(Increment(1) | Increment(2), Union)
+        self.assertEqual(
+            len(union(Increment(1) | Increment(2), Increment(2) | Increment(3)).operands), 3)
+
+        family = self.engine.make([1, 2], [3])
+        self.assertEqual(
+            set(self.engine.apply(Identity() | Increment(10), family)),
+            {frozenset([1, 2]), frozenset([3]), frozenset([1, 3]), frozenset([4])})
+
+    def test_fixpoint(self):
+        self.assertEqual(fixpoint(Identity()), Identity())
+        self.assertIsInstance(fixpoint(Identity() | Increment(4)), Fixpoint)
+        self.assertEqual(
+            fixpoint(fixpoint(Identity() | Increment(4))),
+            fixpoint(Identity() | Increment(4)))
+
+        family = self.engine.make([1])
+        self.assertEqual(
+            set(self.engine.apply(fixpoint(Identity() | Increment(4)), family)),
+            {frozenset([i]) for i in range(1, 5)})
+
+    def test_engine_fixpoint(self):
+        family = self.engine.make([1])
+        self.assertEqual(
+            set(self.engine.fixpoint(family, Increment(4))),
+            {frozenset([i]) for i in range(1, 5)})
+
+    def test_caches(self):
+        engine = DefaultEngine(cache_size=16)
+
+        # Chains of overlapping families trigger an exponential number of
+        # recursive calls, unless each shared node is processed only once.
+        family = engine.make(*[range(i, 48) for i in range(48)])
+        rv = engine.apply(SetsContaining(40), family)
+        self.assertEqual(len(rv), 41)
+
+        # Equal homomorphisms should share the same computed table.
+        info = engine.cache_info()[SetsContaining(40)]
+        self.assertLessEqual(info.currsize, 16)
+        self.assertIs(engine.apply(SetsContaining(40), family), rv)
+        self.assertEqual(engine.cache_info()[SetsContaining(40)].hits, info.hits + 1)
+
+        # Computed tables of homomorphisms should be purged by collections.
+        del rv
+        engine.collect(roots=[family])
+        self.assertEqual(engine.cache_info()[SetsContaining(40)].currsize, 0)
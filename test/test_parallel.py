@@ -0,0 +1,55 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import random
+import unittest
+
+from concurrent.futures import ProcessPoolExecutor
+
+from ydd.engines.array import ArrayEngine
+from ydd.engines.default import DefaultEngine
+from ydd.parallel import OPERATIONS, parallel_apply
+
+
+class TestParallel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = ProcessPoolExecutor(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def families(self, engine):
+        rng = random.Random(0)
+        return [
+            engine.make(*[rng.sample(range(16), rng.randint(0, 6)) for _ in range(64)])
+            for _ in range(2)
+        ]
+
+    def test_parallel_apply(self):
+        for engine in (DefaultEngine(), ArrayEngine()):
+            a, b = self.families(engine)
+            for operation in OPERATIONS:
+                self.assertIs(
+                    parallel_apply(engine, operation, a, b, self.executor, threshold=0),
+                    getattr(engine, operation)(a, b))
+
+            # The workers should follow the variable order of the engine.
+            engine.reorder(order=list(range(15, -1, -1)))
+            self.assertIs(
+                parallel_apply(engine, 'union', a, b, self.executor, threshold=0), a | b)
+
+    def test_threshold(self):
+        engine = DefaultEngine()
+        a, b = self.families(engine)
+        calls = engine.stats().calls.get('union', 0)
+        self.assertIs(parallel_apply(engine, 'union', a, b, threshold=10 ** 6), a | b)
+        self.assertEqual(engine.stats().calls['union'], calls + 2)
+
+    def test_unknown_operation(self):
+        engine = DefaultEngine()
+        a, b = self.families(engine)
+        with self.assertRaises(ValueError):
+            parallel_apply(engine, 'issubset', a, b)
@@ -0,0 +1,31 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import unittest
+
+from ydd.serialization import read_value, read_varint, write_value, write_varint
+
+
+class TestSerialization(unittest.TestCase):
+
+    def test_varint(self):
+        for value in (0, 1, 127, 128, 300, 2 ** 64 + 1):
+            buffer = bytearray()
+            write_varint(buffer, value)
+            self.assertEqual(read_varint(buffer, 0), (value, len(buffer)))
+
+        # Values below 128 should take a single byte.
+        buffer = bytearray()
+        write_varint(buffer, 127)
+        self.assertEqual(len(buffer), 1)
+
+    def test_value(self):
+        for value in (0, 42, -1, -300, '', 'place', b'\x00\x01', (1, ('a', -2)), 0.5, frozenset()):
+            buffer = bytearray()
+            write_value(buffer, value)
+            self.assertEqual(read_value(buffer, 0), (value, len(buffer)))
+
+        with self.assertRaises(ValueError):
+            read_value(bytearray([42, 0]), 0)
+        with self.assertRaises(IndexError):
+            read_value(bytearray([2, 8, 0]), 0)
@@ -0,0 +1,72 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import io
+import os
+import tempfile
+import unittest
+
+from ydd.engines.default import DefaultEngine
+from ydd.snapshot import Snapshot
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = DefaultEngine()
+
+    def snapshot(self, family):
+        buffer = io.BytesIO()
+        Snapshot.write(family, buffer)
+        return Snapshot(buffer.getvalue())
+
+    def test_terminals(self):
+        snapshot = self.snapshot(self.engine.make())
+        self.assertEqual(len(snapshot), 0)
+        self.assertEqual(list(snapshot), [])
+        self.assertFalse(set() in snapshot)
+
+        snapshot = self.snapshot(self.engine.make(set()))
+        self.assertEqual(len(snapshot), 1)
+        self.assertEqual(list(snapshot), [set()])
+        self.assertTrue(set() in snapshot)
+        self.assertFalse({1} in snapshot)
+
+    def test_contains(self):
+        family = self.engine.make({1, 2}, {1, 3}, {4, 5}, {5}, set())
+        snapshot = self.snapshot(family)
+        for item in ({1, 2}, {1, 3}, {4, 5}, {5}, set()):
+            self.assertTrue(item in snapshot)
+        for item in ({1}, {0}, {0, 5}, {1, 5}, {1, 2, 3}, {'a'}):
+            self.assertFalse(item in snapshot)
+
+    def test_iter(self):
+        family = self.engine.make({1, 2}, {1, 3}, {4, 5}, {5}, set(), {0, 6})
+        snapshot = self.snapshot(family)
+        self.assertEqual(list(snapshot), list(family))
+        self.assertEqual(len(snapshot), 6)
+        self.assertEqual(snapshot.count(), 6)
+        self.assertEqual(snapshot.node_count(), self.engine.node_count() - 2)
+
+    def test_open(self):
+        family = self.engine.make(*[range(i, i + 8) for i in range(32)])
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            Snapshot.write(family, f)
+        try:
+            with Snapshot.open(f.name) as snapshot:
+                self.assertEqual(len(snapshot), 32)
+                self.assertTrue(set(range(3, 11)) in snapshot)
+                self.assertEqual(list(snapshot), list(family))
+        finally:
+            os.unlink(f.name)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            Snapshot(b'YDD')
+        with self.assertRaises(ValueError):
+            Snapshot(b'not a snapshot')
+
+        buffer = io.BytesIO()
+        Snapshot.write(self.engine.make({1, 2}), buffer)
+        with self.assertRaises(ValueError):
+            Snapshot(buffer.getvalue()[:20])
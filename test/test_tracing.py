@@ -0,0 +1,52 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import io
+import unittest
+
+from ydd.engines.array import ArrayEngine
+from ydd.engines.default import DefaultEngine
+from ydd.tracing import replay
+
+from .test_homomorphisms import Increment
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = DefaultEngine()
+
+    def record(self):
+        a = self.engine.make({1, 2}, {1, 3})
+        b = self.engine.make({1, 2}, {4})
+
+        trace = io.BytesIO()
+        with self.engine.record(trace):
+            c = a | b
+            d = self.engine.union_all([c, a & b, self.engine.make({5})])
+            self.engine.apply(Increment(8), d - b)
+            self.assertEqual(len(c ^ a), 1)
+            self.assertTrue(a.isdisjoint(b - a))
+
+        # Operations called outside of the scope aren't recorded.
+        a | b
+        return trace.getvalue()
+
+    def test_replay(self):
+        trace = self.record()
+        for engine in (DefaultEngine(), ArrayEngine()):
+            replayed = replay(engine, io.BytesIO(trace))
+            self.assertEqual(
+                [operation.operation for operation in replayed],
+                ['union', 'intersection', 'union_all', 'difference', 'apply',
+                 'symmetric_difference', 'count', 'difference', 'isdisjoint'])
+            for operation in replayed:
+                self.assertGreaterEqual(operation.recorded_time, 0)
+                self.assertGreaterEqual(operation.time, 0)
+                self.assertEqual(operation.steps, operation.recorded_steps)
+
+    def test_invalid_trace(self):
+        with self.assertRaises(ValueError):
+            replay(self.engine, io.BytesIO(b'YDD\x01'))
+        with self.assertRaises(ValueError):
+            replay(self.engine, io.BytesIO(self.record()[:-1]))
@@ -2,9 +2,55 @@
 # Licensed under the Apache License, Version 2.0.
 
 from abc import ABCMeta, abstractmethod, abstractproperty
+from collections import namedtuple
 from collections.abc import Hashable
-from functools import reduce
-from operator import or_
+from heapq import heapify, heappop, heappush
+from itertools import islice
+
+import operator
+import random
+
+from .. import serialization
+from ..homomorphisms import Homomorphism
+
+
+FixpointInfo = namedtuple(
+    'FixpointInfo',
+    ['iteration', 'frontier_size', 'frontier_nodes', 'visited_size', 'visited_nodes'])
+
+EngineStats = namedtuple(
+    'EngineStats', ['node_count', 'peak_node_count', 'calls', 'time', 'caches'])
+
+
+def _fold(family, zero, one, combine):
+    # Implementation note: This computes a value for each node of the
+    # given family bottom-up, from the values `zero` and `one` of the
+    # terminals, with `combine(key, then_value, else_value)`. Values are
+    # memoised, so that shared nodes are only visited once, and we use an
+    # explicit stack rather than recursing, so any depth can be handled.
+
+    memo = {}
+    stack = [family]
+    while stack:
+        node = stack[-1]
+        if node in memo:
+            stack.pop()
+        elif node.is_zero():
+            memo[node] = zero
+        elif node.is_one():
+            memo[node] = one
+        else:
+            then_ = node.then_
+            else_ = node.else_
+            if then_ not in memo:
+                stack.append(then_)
+            elif else_ not in memo:
+                stack.append(else_)
+            else:
+                memo[node] = combine(node.key, memo[then_], memo[else_])
+                stack.pop()
+
+    return memo[family]
 
 
 class AbstractEngine(metaclass=ABCMeta):
@@ -17,17 +63,302 @@ class AbstractEngine(metaclass=ABCMeta):
     def make_node(self, key, then_, else_):
         pass
 
+    def level(self, key):
+        """Return a value that orders the given key among the others, like
+        the variable order of this engine does.
+
+        Unless the engine supports reordering, keys are ordered by themselves.
+        """
+        return key
+
     def make(self, *containers):
-        if len(containers) == 0:
+        return self.make_from_sorted(containers)
+
+    def make_from_sorted(self, containers):
+        """Create the family of the sets in the given containers.
+
+        Containers are sorted and deduplicated once, after which the family
+        is built bottom-up in a single pass, without any union.
+        """
+        elements = sorted(
+            set(tuple(sorted(set(container), key=self.level)) for container in containers),
+            key=lambda sequence: tuple(map(self.level, sequence)))
+        return self._make_from_sequences(elements)
+
+    def make_from_stream(self, containers, chunk_size=65536, presorted=False):
+        """Create the family of the sets in the given containers, that may
+        be a generator too large to hold in memory.
+
+        Containers are consumed by chunks of `chunk_size`, each of which is
+        built with `make_from_sorted` and merged with the previous ones. If
+        `presorted` is set, containers should be given in lexicographic order
+        of their sorted elements (as ordered by `level`), and the family is
+        built in a single pass, holding only one container at a time.
+        """
+        if presorted:
+            return self._make_from_sequences(
+                tuple(sorted(set(container), key=self.level)) for container in containers)
+
+        containers = iter(containers)
+        rv = self.make_terminal(False)
+        while True:
+            chunk = list(islice(containers, chunk_size))
+            if not chunk:
+                return rv
+            rv = rv | self.make_from_sorted(chunk)
+
+    def _make_from_sequences(self, sequences):
+        # Implementation note: Sequences are seen as the paths of a trie, that
+        # we build in lexicographic order. We keep a frame for each prefix of
+        # the current sequence, that holds whether the prefix itself is a
+        # member of the family, and the diagrams of the families of suffixes
+        # we completed for each element that follows it. Once a sequence no
+        # longer shares a prefix, the family of its suffixes is complete, and
+        # is built as a chain of nodes along their "else" children.
+
+        zero = self.make_terminal(False)
+        one = self.make_terminal(True)
+
+        def build(frame):
+            rv = one if frame[0] else zero
+            for key, then_ in reversed(frame[1]):
+                rv = self.make_node(key, then_, rv)
+            return rv
+
+        def close(depth):
+            while len(frames) > depth + 1:
+                frame = frames.pop()
+                frames[-1][1].append((previous[len(frames) - 1], build(frame)))
+
+        frames = [[False, []]]
+        previous = None
+        previous_levels = None
+        for sequence in sequences:
+            levels = tuple(map(self.level, sequence))
+            if previous is None:
+                common = 0
+            elif not (previous_levels < levels):
+                # Keys may only define `<`.
+                if levels == previous_levels:
+                    continue
+                raise ValueError('containers are not in lexicographic order')
+            else:
+                common = 0
+                for a, b in zip(sequence, previous):
+                    if a != b:
+                        break
+                    common += 1
+
+            if previous is not None:
+                close(common)
+            for _ in range(common, len(sequence)):
+                frames.append([False, []])
+            frames[-1][0] = True
+            previous = sequence
+            previous_levels = levels
+
+        if previous is not None:
+            close(0)
+        return build(frames[0])
+
+    def count(self, family):
+        """Return the number of members of the given family.
+
+        Contrary to `len()`, the count isn't bounded by `sys.maxsize`.
+        """
+        return _fold(family, 0, 1, lambda key, then_, else_: then_ + else_)
+
+    def size_distribution(self, family):
+        """Return a list whose k-th element is the number of members of the
+        given family that have k elements.
+        """
+        def combine(key, then_, else_):
+            # Members on the "then" child have one more element.
+            rv = [0] * max(len(then_) + 1, len(else_))
+            for size, count in enumerate(else_):
+                rv[size] = count
+            for size, count in enumerate(then_):
+                rv[size + 1] += count
+            return rv
+
+        return _fold(family, [], [1], combine)
+
+    def size_bounds(self, family):
+        """Return the sizes of the smallest and largest members of the given
+        family, as a pair.
+        """
+        def combine(key, then_, else_):
+            # The "then" child of a node is never the zero terminal.
+            if else_ is None:
+                return (then_[0] + 1, then_[1] + 1)
+            return (min(then_[0] + 1, else_[0]), max(then_[1] + 1, else_[1]))
+
+        rv = _fold(family, None, (0, 0), combine)
+        if rv is None:
+            raise ValueError('size_bounds() of an empty family')
+        return rv
+
+    def sample(self, family, k, rng=None):
+        """Return `k` distinct members of the given family, chosen uniformly
+        at random with `rng` (the `random` module by default).
+        """
+        rng = rng or random
+        memo = {}
+        count = family._count_of(memo)
+        if not (0 <= k <= count):
+            raise ValueError('sample larger than family or is negative')
+
+        if 2 * k > count:
+            indices = rng.sample(range(count), k)
+        else:
+            # The family may be too large for `range`, so we draw indices one
+            # by one, which is efficient as long as collisions are unlikely.
+            indices = []
+            seen = set()
+            while len(indices) < k:
+                index = rng.randrange(count)
+                if index not in seen:
+                    seen.add(index)
+                    indices.append(index)
+
+        return [family._getitem(index, memo) for index in indices]
+
+    def apply(self, homomorphism, family):
+        """Return the image of the given family by the given homomorphism.
+
+        Results are memoised in a computed table of the engine, which is
+        shared by all the homomorphisms equal to the given one, so that
+        shared sub-diagrams are only processed once.
+        """
+        if family.is_zero():
+            return family
+        if not homomorphism.cached:
+            return homomorphism.image(self, family)
+
+        cache = self._homomorphism_cache(homomorphism)
+        rv = cache.get((family,))
+        if rv is None:
+            rv = homomorphism.image(self, family)
+            cache[(family,)] = rv
+        return rv
+
+    def _homomorphism_cache(self, homomorphism):
+        # Returns the computed table of the given homomorphism. Engines that
+        # manage their own computed tables should override this method, so
+        # that these tables are bounded and purged like the others.
+        try:
+            caches = self._homomorphism_caches
+        except AttributeError:
+            caches = self._homomorphism_caches = {}
+        return caches.setdefault(homomorphism, {})
+
+    def fixpoint(self, initial, steps, chaining=False, callback=None):
+        """Return all the members reachable from `initial` with `steps`.
+
+        `steps` is a function (or a homomorphism) that computes the
+        successors of a family, or a list of such functions. Only the
+        members discovered by the previous iteration are expanded, rather
+        than all the members found so far. If `chaining` is set, each step
+        also expands the members discovered by the previous steps of the
+        same iteration, which usually reduces the number of iterations.
+
+        If given, `callback` is called after each iteration with a
+        `FixpointInfo`, that reports the number of members and nodes of the
+        frontier (i.e. the members discovered by this iteration) and of the
+        members found so far.
+        """
+        if callable(steps) or isinstance(steps, Homomorphism):
+            steps = [steps]
+        steps = [
+            (lambda family, h=step: self.apply(h, family))
+            if isinstance(step, Homomorphism) else step
+            for step in steps
+        ]
+
+        visited = initial
+        frontier = initial
+        iteration = 0
+        while not frontier.is_zero():
+            discovered = []
+            for step in steps:
+                new = step(frontier) - visited
+                if new.is_zero():
+                    continue
+
+                visited = visited | new
+                discovered.append(new)
+                if chaining:
+                    frontier = frontier | new
+
+            frontier = self.union_all(discovered)
+            iteration += 1
+            if callback is not None:
+                callback(FixpointInfo(
+                    iteration=iteration,
+                    frontier_size=self.count(frontier),
+                    frontier_nodes=self._diagram_size(frontier),
+                    visited_size=self.count(visited),
+                    visited_nodes=self._diagram_size(visited)))
+
+        return visited
+
+    def _diagram_size(self, family):
+        # Returns the number of nodes of a family, terminals included.
+        seen = set()
+        stack = [family]
+        while stack:
+            node = stack.pop()
+            if node not in seen:
+                seen.add(node)
+                if not (node.is_zero() or node.is_one()):
+                    stack.append(node.then_)
+                    stack.append(node.else_)
+        return len(seen)
+
+    def union_all(self, families):
+        """Return the union of all the given families.
+
+        Families are merged two by two, always picking the smallest ones
+        first, so that the largest intermediate results are built last.
+        """
+        heap = [(len(family), i, family) for i, family in enumerate(families)]
+        if not heap:
             return self.make_terminal(False)
-        return reduce(or_, (self.make_from_container(it) for it in containers))
+
+        heapify(heap)
+        i = len(heap)
+        while len(heap) > 1:
+            _, _, left = heappop(heap)
+            _, _, right = heappop(heap)
+            rv = left | right
+            heappush(heap, (len(rv), i, rv))
+            i += 1
+        return heap[0][2]
+
+    def intersection_all(self, families):
+        """Return the intersection of all the given families.
+
+        Families are intersected from the smallest to the largest, so that
+        intermediate results are as small as possible, and we can stop as
+        soon as we get the empty family.
+        """
+        families = sorted(families, key=len)
+        if not families:
+            raise ValueError('intersection_all() of an empty iterable')
+
+        rv = families[0]
+        for family in families[1:]:
+            if rv.is_zero():
+                break
+            rv = rv & family
+        return rv
 
     def make_from_container(self, container):
         if len(container) == 0:
             return self.make_terminal(True)
 
         # Remove duplicates and sort the container.
-        elements = sorted(set(container), reverse=True)
+        elements = sorted(set(container), key=self.level, reverse=True)
 
         # Create the DD.
         rv = self.make_terminal(True)
@@ -36,9 +367,34 @@ class AbstractEngine(metaclass=ABCMeta):
             rv = self.make_node(el, rv, zero)
         return rv
 
+    def dump(self, roots, file, encode_key=None):
+        """Write the given families to a binary file.
+
+        Nodes shared by several families are written once, so the size of
+        the file is linear in the number of nodes rather than in the number
+        of members. Integer, string and bytes keys (or tuples of those) are
+        written as is, while other keys are pickled, unless `encode_key`
+        maps them to such values.
+        """
+        serialization.dump(self, roots, file, encode_key)
+
+    def load(self, file, decode_key=None):
+        """Read the families written by `dump` from a binary file, in time
+        linear in their number of nodes, and return them in a list.
+
+        The file may have been written by any engine, as long as its keys
+        (as returned by `decode_key`, if given) compare the same way in this
+        one. Keys that were pickled are unpickled, so only load files you
+        trust.
+        """
+        return serialization.load(self, file, decode_key)
+
 
 class AbstractRoot(Hashable, metaclass=ABCMeta):
 
+    # Declaring empty slots lets concrete roots opt out of `__dict__`.
+    __slots__ = ()
+
     @abstractproperty
     def key(self):
         pass
@@ -59,8 +415,128 @@ class AbstractRoot(Hashable, metaclass=ABCMeta):
     def is_one(self):
         pass
 
+    def _level(self, key):
+        # Returns a value that orders the given key like the engine of this
+        # family does. Roots whose engine supports reordering should
+        # override this method.
+        return key
+
     def isdisjoint(self, other):
-        return (self & other).is_zero()
+        # Implementation note: Two families are disjoint if and only if all
+        # the pairs of sub-diagrams that could lead to a common member are,
+        # so we don't have to build their intersection, and can stop as soon
+        # as we find a pair that shares a member.
+
+        seen = set()
+        stack = [(self, other)]
+        while stack:
+            left, right = stack.pop()
+            if left.is_zero() or right.is_zero():
+                continue
+            if left == right:
+                return False
+
+            if left.is_one() or (
+                    (not right.is_one()) and (self._level(right.key) < self._level(left.key))):
+                pairs = ((left, right.else_),)
+            elif right.is_one() or (self._level(left.key) < self._level(right.key)):
+                pairs = ((left.else_, right),)
+            else:
+                pairs = ((left.then_, right.then_), (left.else_, right.else_))
+
+            for pair in pairs:
+                if pair not in seen:
+                    seen.add(pair)
+                    stack.append(pair)
+
+        return True
+
+    def index(self, member):
+        elements = sorted(set(member), key=self._level, reverse=True)
+
+        # Members on the "else" child of a node come first, so we have to
+        # skip them whenever we take the "then" child.
+        rv = 0
+        memo = {}
+        node = self
+        while not (node.is_zero() or node.is_one()):
+            if (not elements) or (self._level(elements[-1]) > self._level(node.key)):
+                node = node.else_
+            elif elements[-1] == node.key:
+                rv += node.else_._count_of(memo)
+                elements.pop()
+                node = node.then_
+            else:
+                break
+
+        if elements or not node.is_one():
+            raise ValueError('%r is not in family' % (member,))
+        return rv
+
+    def __getitem__(self, index):
+        return self._getitem(index, {})
+
+    def _getitem(self, index, memo):
+        # The counts of the sub-diagrams are shared through `memo` by the
+        # successive accesses of a slice, or of a sample.
+        count = self._count_of(memo)
+        if isinstance(index, slice):
+            return [self._getitem(i, memo) for i in range(*index.indices(count))]
+
+        index = operator.index(index)
+        if index < 0:
+            index += count
+        if not (0 <= index < count):
+            raise IndexError('family index out of range')
+
+        # Members are indexed in the order they're produced by iteration.
+        rv = []
+        node = self
+        while not node.is_one():
+            else_count = node.else_._count_of(memo)
+            if index < else_count:
+                node = node.else_
+            else:
+                index -= else_count
+                rv.append(node.key)
+                node = node.then_
+        return frozenset(rv)
+
+    def _count_of(self, memo=None):
+        # Returns the number of members of this family. Roots whose engine
+        # caches the counts of the nodes should override this method, so
+        # that random accesses run in time proportional to the depth of
+        # the family. Counts too large for `len()` are computed from those
+        # of the children, and kept in `memo` (if given) for the next calls.
+        # Only the nodes whose count is too large are visited, since `len()`
+        # gives the count of the others.
+        try:
+            return len(self)
+        except OverflowError:
+            pass
+
+        if memo is None:
+            memo = {}
+        stack = [self]
+        while stack:
+            node = stack[-1]
+            if node in memo:
+                stack.pop()
+                continue
+
+            ready = True
+            for child in (node.then_, node.else_):
+                if child not in memo:
+                    try:
+                        memo[child] = len(child)
+                    except OverflowError:
+                        stack.append(child)
+                        ready = False
+            if ready:
+                memo[node] = memo[node.then_] + memo[node.else_]
+                stack.pop()
+
+        return memo[self]
 
     def _hash(self):
         # See the notes on hashability using collections.abc.Set.
@@ -79,18 +555,19 @@ class AbstractRoot(Hashable, metaclass=ABCMeta):
                 node = node.else_
             return node.is_one()
 
-        elements = sorted(item, reverse=True)
+        elements = sorted(item, key=self._level, reverse=True)
 
         while (not (node.is_zero() or node.is_one())) and elements:
             el = elements[-1]
-            if el > node.key:
+            if self._level(el) > self._level(node.key):
                 node = node.else_
             elif el == node.key:
                 node = node.then_
                 elements.pop()
             else:
-                node = node.else_
-                elements.pop()
+                # The keys of the nodes below are all greater than the
+                # element, so no member can contain it.
+                return False
 
         while not (node.is_zero() or node.is_one()):
             node = node.else_
@@ -115,7 +592,8 @@ class AbstractRoot(Hashable, metaclass=ABCMeta):
                     node = stack.pop()
                 except IndexError:
                     return
-                rv = list(filter(lambda e: e < node.key, rv)) + [node.key]
+                level = self._level(node.key)
+                rv = [e for e in rv if self._level(e) < level] + [node.key]
                 node = node.then_
             elif not node.else_.is_zero():
                 stack.append(node)
@@ -0,0 +1,249 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+from array import array
+from collections import Counter
+from operator import attrgetter
+from weakref import WeakValueDictionary
+
+from .abc import AbstractRoot
+from .default import DefaultEngine
+
+
+# The number of bits used to encode a node id in the unique table.
+_ID_BITS = 32
+
+
+class ArrayRoot(AbstractRoot):
+
+    # Roots are only thin handles on the node identified by `id`, whose key
+    # and children are stored in the arrays of their creator.
+    __slots__ = ('creator', 'id', '__weakref__')
+
+    def __init__(self, creator, id_):
+        self.creator = creator
+        self.id = id_
+
+    @property
+    def key(self):
+        return self.creator._keys[self.id]
+
+    @property
+    def then_(self):
+        if self.id < 2:
+            return None
+        return self.creator._root(self.creator._then[self.id])
+
+    @property
+    def else_(self):
+        if self.id < 2:
+            return None
+        return self.creator._root(self.creator._else[self.id])
+
+    def is_zero(self):
+        return self.id == 0
+
+    def is_one(self):
+        return self.id == 1
+
+    def __len__(self):
+        return self.creator.count(self)
+
+    def _count_of(self, memo=None):
+        # The counts of the nodes are kept in the computed tables of the
+        # engine, and can't overflow.
+        return self.creator.count(self)
+
+    def __lt__(self, other):
+        return (self is not other) and self.creator.issubset(self, other)
+
+    def __le__(self, other):
+        return self.creator.issubset(self, other)
+
+    def isdisjoint(self, other):
+        return self.creator.isdisjoint(self, other)
+
+    def __eq__(self, other):
+        return self is other
+
+    def __or__(self, other):
+        return self.creator.union(self, other)
+
+    def __and__(self, other):
+        return self.creator.intersection(self, other)
+
+    def __sub__(self, other):
+        return self.creator.difference(self, other)
+
+    def __xor__(self, other):
+        return self.creator.symmetric_difference(self, other)
+
+    def _level(self, key):
+        return self.creator.level(key)
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class ArrayEngine(DefaultEngine):
+    """A pure Python engine that stores its nodes in parallel arrays.
+
+    Nodes are identified by their index in the arrays `_keys`, `_then` and
+    `_else`, where indices 0 and 1 are reserved for the zero and one
+    terminals. Contrary to the `DefaultEngine`, no Python object is kept
+    alive per node: root handles are created on demand, and interned only
+    for as long as they are referenced, so that two live roots on the same
+    node are always the same object. As a result, the `use_weak_table`
+    option of the `DefaultEngine` has no effect.
+    """
+
+    def make_node(self, key, then_, else_):
+        # Apply the ZDD-reduction rule at the node creation, so we make sure
+        # to create canonical forms only.
+        if then_.id == 0:
+            return else_
+
+        # Look for the node in the unique table, or append it to the arrays.
+        try:
+            subtable = self._table[key]
+        except KeyError:
+            subtable = self._table[key] = {}
+
+        h = (then_.id << _ID_BITS) | else_.id
+        try:
+            id_ = subtable[h]
+        except KeyError:
+            # Reuse the id of a collected node if possible.
+            if self._free:
+                id_ = self._free.pop()
+                self._keys[id_] = key
+                self._then[id_] = then_.id
+                self._else[id_] = else_.id
+            else:
+                id_ = len(self._keys)
+                if id_ >> _ID_BITS:
+                    raise OverflowError('too many nodes in the engine')
+
+                self._keys.append(key)
+                self._then.append(then_.id)
+                self._else.append(else_.id)
+
+            subtable[h] = id_
+            rv = self._root(id_)
+            if self.node_count() > self._peak_node_count:
+                self._peak_node_count = self.node_count()
+            if (self._gc_next is not None) and (self.node_count() > self._gc_next):
+                self.collect()
+            if (self._reorder_next is not None) and (self.node_count() > self._reorder_next):
+                self._reorder_pending = True
+            return rv
+
+        return self._root(id_)
+
+    def node_count(self):
+        return len(self._keys) - len(self._free)
+
+    def _init_table(self, use_weak_table):
+        self._keys = [False, True]
+        self._then = array('q', [0, 0])
+        self._else = array('q', [0, 0])
+
+        # The unique table maps the key of every node to a subtable, that
+        # maps the ids of its children, packed into a single integer, to the
+        # index of the node. This is about half the size of a table indexed
+        # by (key, then, else) triples.
+        self._table = {}
+
+        # The ids of the collected nodes, that can be reused.
+        self._free = []
+
+        self._handles = WeakValueDictionary()
+        self.zero = self._root(0)
+        self.one = self._root(1)
+
+    _node_id = staticmethod(attrgetter('id'))
+
+    def _root(self, id_):
+        try:
+            return self._handles[id_]
+        except KeyError:
+            rv = ArrayRoot(self, id_)
+            self._handles[id_] = rv
+            return rv
+
+    def _root_objects(self):
+        return list(self._handles.values())
+
+    def _internal_references(self, objects):
+        # Handles don't refer to each other, so the only references held by
+        # the engine come from its computed tables.
+        rv = Counter()
+        for cache in self._all_caches():
+            for key, value in cache.items():
+                rv[id(value)] += 1
+                for operand in key:
+                    rv[id(operand)] += 1
+        return rv
+
+    def _mark(self, roots):
+        live = {0, 1}
+        stack = [root.id for root in roots]
+        while stack:
+            id_ = stack.pop()
+            if id_ not in live:
+                live.add(id_)
+                stack.append(self._then[id_])
+                stack.append(self._else[id_])
+        return live
+
+    def _sweep(self, live):
+        free = set(self._free)
+        freed = 0
+        for id_ in range(2, len(self._keys)):
+            if (id_ in live) or (id_ in free):
+                continue
+
+            key = self._keys[id_]
+            subtable = self._table[key]
+            del subtable[(self._then[id_] << _ID_BITS) | self._else[id_]]
+            if not subtable:
+                del self._table[key]
+            self._keys[id_] = None
+            self._free.append(id_)
+            freed += 1
+
+            # Invalidate the handles that weren't given as roots, so they
+            # can't be mistaken for the node that will reuse their id.
+            self._invalidate(id_)
+
+        return freed
+
+    def _invalidate(self, id_):
+        handle = self._handles.get(id_)
+        if handle is not None:
+            handle.id = None
+            del self._handles[id_]
+
+    def _nodes(self):
+        free = set(self._free)
+        return [self._root(id_) for id_ in range(2, len(self._keys)) if id_ not in free]
+
+    def _unlink(self, node):
+        key = self._keys[node.id]
+        subtable = self._table[key]
+        del subtable[(self._then[node.id] << _ID_BITS) | self._else[node.id]]
+        if not subtable:
+            del self._table[key]
+
+    def _relink(self, node, key, then_, else_):
+        self._keys[node.id] = key
+        self._then[node.id] = then_.id
+        self._else[node.id] = else_.id
+        self._table.setdefault(key, {})[(then_.id << _ID_BITS) | else_.id] = node.id
+
+    def _discard(self, node):
+        id_ = node.id
+        self._unlink(node)
+        self._keys[id_] = None
+        self._free.append(id_)
+        self._invalidate(id_)
@@ -0,0 +1,216 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+from collections import OrderedDict, namedtuple
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+
+class Cache(object):
+    """An unbounded computed table, that never evicts its entries.
+
+    All computed tables implement the same minimal mapping interface
+    (`get`, `__setitem__`, `__len__`, `items` and `clear`), and count their
+    hits, misses and evictions, which can be retrieved with `info`.
+    """
+
+    def __init__(self, maxsize=None):
+        if (maxsize is not None) and (maxsize < 1):
+            raise ValueError('cache size should be at least 1')
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._store = {}
+
+    def get(self, key, default=None):
+        try:
+            rv = self._store[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return rv
+
+    def __setitem__(self, key, value):
+        self._store[key] = value
+
+    def __len__(self):
+        return len(self._store)
+
+    def items(self):
+        return list(self._store.items())
+
+    def purge(self, predicate):
+        """Remove all entries for which `predicate(key, value)` holds."""
+        for key, value in self.items():
+            if predicate(key, value):
+                del self._store[key]
+
+    def clear(self):
+        self._store.clear()
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self))
+
+    def reset_info(self):
+        """Reset the counts of hits, misses and evictions."""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class DirectMappedCache(Cache):
+    """A lossy computed table, where each key can only be stored in one slot.
+
+    Storing an entry simply overwrites the one that occupied its slot, as
+    the computed tables of the C++ engines do.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self._keys = [None] * maxsize
+        self._values = [None] * maxsize
+        self._size = 0
+
+    def get(self, key, default=None):
+        i = hash(key) % self.maxsize
+        if self._keys[i] == key:
+            self.hits += 1
+            return self._values[i]
+        self.misses += 1
+        return default
+
+    def __setitem__(self, key, value):
+        i = hash(key) % self.maxsize
+        if self._keys[i] is None:
+            self._size += 1
+        elif self._keys[i] != key:
+            self.evictions += 1
+
+        self._keys[i] = key
+        self._values[i] = value
+
+    def __len__(self):
+        return self._size
+
+    def items(self):
+        return [
+            (key, value)
+            for key, value in zip(self._keys, self._values)
+            if key is not None
+        ]
+
+    def purge(self, predicate):
+        for i, key in enumerate(self._keys):
+            if (key is not None) and predicate(key, self._values[i]):
+                self._keys[i] = None
+                self._values[i] = None
+                self._size -= 1
+
+    def clear(self):
+        self._keys = [None] * self.maxsize
+        self._values = [None] * self.maxsize
+        self._size = 0
+
+
+class LRUCache(Cache):
+    """A computed table that evicts its least recently used entries."""
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self._store = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            rv = self._store[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._store.move_to_end(key)
+        self.hits += 1
+        return rv
+
+    def __setitem__(self, key, value):
+        self._store[key] = value
+        self._store.move_to_end(key)
+        if len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+            self.evictions += 1
+
+
+class GenerationalCache(Cache):
+    """A computed table that evicts its entries by whole generations.
+
+    Entries are stored in a young generation, that becomes the old one once
+    it's full, dropping the previous old generation at once. Entries found
+    in the old generation are promoted back to the young one, so that the
+    working set of long computations survives the collections.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self._generation_size = max(maxsize // 2, 1)
+        self._old = {}
+
+    def get(self, key, default=None):
+        try:
+            rv = self._store[key]
+        except KeyError:
+            try:
+                rv = self._old.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self[key] = rv
+        self.hits += 1
+        return rv
+
+    def __setitem__(self, key, value):
+        if (key not in self._store) and (len(self._store) >= self._generation_size):
+            self.evictions += len(self._old)
+            self._old = self._store
+            self._store = {}
+        self._store[key] = value
+
+    def __len__(self):
+        return len(self._store) + len(self._old)
+
+    def items(self):
+        return list(self._store.items()) + list(self._old.items())
+
+    def purge(self, predicate):
+        for generation in (self._store, self._old):
+            for key, value in list(generation.items()):
+                if predicate(key, value):
+                    del generation[key]
+
+    def clear(self):
+        self._store.clear()
+        self._old.clear()
+
+
+cache_policies = {
+    'direct': DirectMappedCache,
+    'lru': LRUCache,
+    'generational': GenerationalCache
+}
+
+
+def make_cache(policy='lru', maxsize=None):
+    """Create a computed table of the given policy and capacity.
+
+    If `maxsize` is None, an unbounded table is returned, regardless of the
+    eviction policy.
+    """
+    try:
+        cache_class = cache_policies[policy]
+    except KeyError:
+        raise ValueError('unknown cache policy: %r' % policy)
+
+    if maxsize is None:
+        return Cache()
+    return cache_class(maxsize)
@@ -0,0 +1,215 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import threading
+
+from contextlib import contextmanager
+from weakref import WeakSet
+
+from .cache import CacheInfo, make_cache
+from .default import DefaultEngine, Root
+
+
+class _Caches(dict):
+    # The computed tables of a thread. Dictionaries can't be referenced
+    # weakly, but their subclasses can, and are kept in a set by identity.
+
+    __hash__ = object.__hash__
+
+    def __eq__(self, other):
+        return self is other
+
+
+class ConcurrentEngine(DefaultEngine):
+    """A pure Python engine that can be shared by several threads.
+
+    The unique table is protected by `stripes` locks, each guarding the
+    nodes whose hash falls in its stripe, so that two threads can't create
+    the same node twice, while lookups of existing nodes don't lock at all.
+    Each thread gets its own computed tables, so they don't need any
+    synchronisation, at the price of recomputing the results found by the
+    other threads.
+
+    Garbage collections and reorderings need all the other threads to be
+    done with their operations. Those triggered by `gc_threshold` and
+    `reorder_threshold` are deferred until the end of the outermost
+    operation of the thread that triggered them, and wait for the
+    operations in progress in the other threads, while new ones wait for
+    them to be done. Calls to `collect` and `reorder` behave the same way,
+    and can't be made during an operation. Reorderings rewrite the nodes in
+    place, so other threads shouldn't traverse families (e.g. iterate over
+    their members) in the meantime.
+
+    Statistics (e.g. the number of calls of each operation) are updated
+    without synchronisation, and may thus be approximate on free-threaded
+    builds of Python.
+    """
+
+    def __init__(self, stripes=64, **kwargs):
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self._local = threading.local()
+        self._thread_caches = WeakSet()
+
+        # The number of threads running an operation, and the thread that
+        # has the exclusive use of the engine, if any.
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._owner = None
+        self._owner_depth = 0
+
+        self._collect_pending = False
+        super().__init__(**kwargs)
+
+    @property
+    def _depth(self):
+        return getattr(self._local, 'depth', 0)
+
+    @_depth.setter
+    def _depth(self, value):
+        self._local.depth = value
+
+    @property
+    def _cache(self):
+        try:
+            return self._local.cache
+        except AttributeError:
+            self._cache = _Caches(
+                (operation, make_cache(self._cache_policy, maxsize))
+                for operation, maxsize in self._cache_sizes.items())
+            return self._local.cache
+
+    @_cache.setter
+    def _cache(self, value):
+        # The tables given by the constructor become the ones of its thread,
+        # and serve as templates for the tables of the other threads.
+        if not isinstance(value, _Caches):
+            value = _Caches(value)
+            self._cache_sizes = {operation: cache.maxsize for operation, cache in value.items()}
+        self._local.cache = value
+        self._thread_caches.add(value)
+
+    def cache_info(self):
+        """Return the statistics of the computed table of each operation,
+        and of each homomorphism that was applied, summed over the tables of
+        all threads.
+        """
+        rv = {}
+        for caches in list(self._thread_caches):
+            for operation, cache in list(caches.items()):
+                info = cache.info()
+                if operation in rv:
+                    info = CacheInfo(*(
+                        a + b if field != 'maxsize' else a
+                        for field, a, b in zip(CacheInfo._fields, rv[operation], info)))
+                rv[operation] = info
+        return rv
+
+    def collect(self, roots=None):
+        if self._depth:
+            raise RuntimeError('the engine cannot be collected during an operation')
+        with self._exclusive():
+            self._collect_pending = False
+            return super().collect(roots)
+
+    def reorder(self, method='sifting', order=None):
+        if self._depth:
+            raise RuntimeError('the engine cannot be reordered during an operation')
+        with self._exclusive():
+            return super().reorder(method, order)
+
+    def make_node(self, key, then_, else_):
+        # Nodes created outside of an operation (e.g. by `make`) mustn't be
+        # created during a collection.
+        if not self._depth:
+            with self._shared():
+                return self._make_node(key, then_, else_)
+        return self._make_node(key, then_, else_)
+
+    def _make_node(self, key, then_, else_):
+        if then_ is self.zero:
+            return else_
+
+        # Existing nodes are found without locking, and new ones are created
+        # under the lock of their stripe, after checking that no other
+        # thread created them in the meantime.
+        h = (key, id(then_), id(else_))
+        try:
+            return self._table[h]
+        except KeyError:
+            pass
+
+        with self._stripes[hash(h) % len(self._stripes)]:
+            rv = self._table.get(h)
+            if rv is not None:
+                return rv
+            rv = self._table[h] = Root(key=key, then_=then_, else_=else_, creator=self)
+
+        size = len(self._table)
+        if size > self._peak_node_count:
+            self._peak_node_count = size
+        if (self._gc_next is not None) and (size > self._gc_next):
+            self._collect_pending = True
+        if (self._reorder_next is not None) and (size > self._reorder_next):
+            self._reorder_pending = True
+        return rv
+
+    def _call_outermost(self, operation, method, args, kwargs):
+        with self._shared():
+            rv = super()._call_outermost(operation, method, args, kwargs)
+
+        if self._collect_pending or self._reorder_pending:
+            with self._exclusive():
+                if self._collect_pending:
+                    self.collect()
+                if self._reorder_pending:
+                    self.reorder()
+        return rv
+
+    def _maintain(self):
+        # Collections and reorderings are done once the thread is out of its
+        # operation, by `_call_outermost`.
+        pass
+
+    def _all_caches(self):
+        return [cache for caches in list(self._thread_caches) for cache in list(caches.values())]
+
+    @contextmanager
+    def _shared(self):
+        # Waits for the thread that has the exclusive use of the engine, if
+        # any, and for the ones that wait for it, so they don't starve.
+        me = threading.get_ident()
+        with self._condition:
+            while (self._owner not in (None, me)) or (self._waiting and self._owner != me):
+                self._condition.wait()
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                if not self._active:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def _exclusive(self):
+        # Waits for the other threads to be done with their operations. The
+        # exclusive use of the engine is reentrant, so collections can be
+        # called during reorderings.
+        me = threading.get_ident()
+        with self._condition:
+            if self._owner != me:
+                self._waiting += 1
+                while (self._owner is not None) or self._active:
+                    self._condition.wait()
+                self._waiting -= 1
+                self._owner = me
+            self._owner_depth += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._owner_depth -= 1
+                if not self._owner_depth:
+                    self._owner = None
+                    self._condition.notify_all()
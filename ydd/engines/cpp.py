@@ -2,7 +2,8 @@
 # Licensed under the Apache License, Version 2.0.
 
 from ._cpp import *
-from .abc import AbstractEngine, AbstractRoot
+from .abc import AbstractEngine, AbstractRoot, EngineStats
+from .cache import CacheInfo
 
 
 IntEngine.__bases__ += (AbstractEngine,)
@@ -12,6 +13,29 @@ PNEngine.__bases__ += (AbstractEngine,)
 PNRoot.__bases__ += (AbstractRoot,)
 
 
+def engine_stats(self):
+    """Return the statistics of the engine, since its creation or the last
+    call to `reset_stats`.
+
+    Those are the number of nodes in the unique table and its peak, the
+    number of calls of each operation from Python and the time spent in each
+    of them (in seconds), and the statistics of the computed tables.
+    """
+    node_count, peak_node_count, calls, time, caches = self._stats()
+    return EngineStats(
+        node_count=node_count,
+        peak_node_count=peak_node_count,
+        calls=calls,
+        time=time,
+        caches={
+            operation: CacheInfo(hits, misses, evictions, size, used)
+            for operation, (hits, misses, evictions, size, used) in caches.items()
+        })
+
+IntEngine.stats = engine_stats
+PNEngine.stats = engine_stats
+
+
 def pn_place_str(self):
     return '%s:%i' % (self.id_, self.tokens)
 
@@ -22,3 +46,9 @@ def pn_place_repr(self):
     return 'Place<%s:%i>' % (self.id_, self.tokens)
 
 PNPlace.__repr__ = pn_place_repr
+
+
+def pn_place_reduce(self):
+    return (PNPlace, (self.id_, self.tokens))
+
+PNPlace.__reduce__ = pn_place_reduce
@@ -1,10 +1,56 @@
 # Copyright (c) 2015, Dimitri Racordon.
 # Licensed under the Apache License, Version 2.0.
 
+import sys
+import time
+
+from collections import Counter, namedtuple
+from contextlib import contextmanager
 from functools import wraps
 from weakref import WeakValueDictionary
 
-from .abc import AbstractEngine, AbstractRoot
+from ..homomorphisms import Homomorphism
+from ..tracing import TraceRecorder
+from .abc import AbstractEngine, AbstractRoot, EngineStats
+from .cache import make_cache
+from .reordering import KeyOrder, Reordering, ReorderInfo
+
+
+# Sentinel returned by the computed tables on a miss.
+_MISSING = object()
+
+# Tags of the tasks on the stack of the apply procedure.
+_EXPAND = object()
+_BUILD = object()
+
+
+GCInfo = namedtuple('GCInfo', ['collections', 'freed', 'time', 'max_pause'])
+
+OperationEvent = namedtuple(
+    'OperationEvent',
+    ['operation', 'operands', 'result', 'operand_sizes', 'result_size', 'steps', 'time'])
+
+
+def _operation(method):
+    # Operations count their calls, while the outermost ones are handled by
+    # `_call_outermost`, so that nested operations aren't timed or reported
+    # to the hooks twice.
+
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._calls[name] += 1
+        if not self._depth:
+            return self._call_outermost(name, method, args, kwargs)
+
+        self._depth += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._depth -= 1
+
+    return wrapper
 
 
 class Root(AbstractRoot):
@@ -35,38 +81,31 @@ class Root(AbstractRoot):
         return False
 
     def __len__(self):
-        return self.creator.len(self)
+        return self.creator.count(self)
 
-    def __lt__(self, other):
-        if other in (self.creator.one, self.creator.zero):
-            # We can assume that self is not a terminal node, since __lt__ is
-            # overridden in the terminal classes. Thus it has a "then" and
-            # child, implying it can't be contained within a terminal.
-            return False
+    def _count_of(self, memo=None):
+        # The counts of the nodes are kept in the computed tables of the
+        # engine, and can't overflow.
+        return self.creator.count(self)
 
-        if other.key > self.key:
-            return False
-        if other.key == self.key:
-            return (
-                (self is not other) and
-                ((self.then_ <= other.then_) and (self.else_ <= other.else_))
-            )
-        if other.key < self.key:
-            return self < other.else_
+    def __lt__(self, other):
+        return (self is not other) and self.creator.issubset(self, other)
 
     def __le__(self, other):
-        if other in (self.creator.one, self.creator.zero):
-            # We can assume that self is not a terminal node, since __le__ is
-            # overridden in the terminal classes. Thus it has a "then" and
-            # child, implying it can't be contained within a terminal.
-            return False
+        return self.creator.issubset(self, other)
 
-        if other.key > self.key:
-            return False
-        if other.key == self.key:
-            return (self is other) or ((self.then_ <= other.then_) and (self.else_ <= other.else_))
-        if other.key < self.key:
-            return self <= other.else_
+    # Comparisons with a terminal are reflected on the terminal, since its
+    # class is a subclass of `Root`. Hence we can't rely on the definitions
+    # of `AbstractRoot`, which would reflect them back.
+
+    def __gt__(self, other):
+        return (self is not other) and self.creator.issubset(other, self)
+
+    def __ge__(self, other):
+        return self.creator.issubset(other, self)
+
+    def isdisjoint(self, other):
+        return self.creator.isdisjoint(self, other)
 
     def __eq__(self, other):
         return self is other
@@ -83,8 +122,13 @@ class Root(AbstractRoot):
     def __xor__(self, other):
         return self.creator.symmetric_difference(self, other)
 
+    def _level(self, key):
+        return self.creator.level(key)
+
     def __hash__(self):
-        return hash((self.key, id(self.then_), id(self.else_)))
+        # Nodes are unique, and may be rewritten in place when the engine is
+        # reordered, so they're hashed by identity.
+        return id(self)
 
 
 class OneTerminal(Root):
@@ -92,22 +136,6 @@ class OneTerminal(Root):
     def is_one(self):
         return True
 
-    def __lt__(self, other):
-        if other.is_zero() or other.is_one():
-            return False
-        return self < other.else_
-
-    def __le__(self, other):
-        if other.is_zero() or other.is_one():
-            return self is other
-        return self <= other.else_
-
-    def __ge__(self, other):
-        return self is other
-
-    def __gt__(self, other):
-        return other is self.creator.zero
-
 
 class ZeroTerminal(Root):
 
@@ -117,58 +145,248 @@ class ZeroTerminal(Root):
     def __contains__(self, el):
         return False
 
-    def __lt__(self, other):
-        return self is not other
-
-    def __le__(self, other):
-        return True
-
-    def __ge__(self, other):
-        return self is other
-
-    def __gt__(self, other):
-        return False
-
 
 class DefaultEngine(AbstractEngine):
 
-    def __init__(self, use_weak_table=False):
-        self.zero = ZeroTerminal(key=False, creator=self)
-        self.one = OneTerminal(key=True, creator=self)
-
-        self._table = {
-            self._hash_node(self.zero): self.zero,
-            self._hash_node(self.one): self.one
-        }
-
-        if use_weak_table:
-            self._table = WeakValueDictionary(self._table)
+    def __init__(
+            self, use_weak_table=False, cache_policy='lru', cache_size=None, cache_sizes=None,
+            gc_threshold=None, reorder_threshold=None):
+        self._init_table(use_weak_table)
+        self._levels = KeyOrder()
+
+        # Collect the unused nodes automatically whenever the unique table
+        # grows past `gc_threshold` nodes, if set.
+        self.gc_threshold = gc_threshold
+        self._gc_next = gc_threshold
+        self._gc_info = GCInfo(0, 0, 0.0, 0.0)
+
+        # Likewise, sift the variables whenever the unique table grows past
+        # `reorder_threshold` nodes, if set, once the operation in progress
+        # is done.
+        self.reorder_threshold = reorder_threshold
+        self._reorder_next = reorder_threshold
+        self._reorder_pending = False
+        self._reorder_info = ReorderInfo(0, 0, 0, 0.0)
+        self._depth = 0
+
+        self._calls = Counter()
+        self._time = Counter()
+        self._peak_node_count = self.node_count()
+
+        # The callbacks of each operation, or of all operations for None.
+        self._hooks = {}
+
+        # Create the computed tables of the operations. The capacity of each
+        # table is given by `cache_sizes`, falling back to `cache_size`. A
+        # capacity of None yields an unbounded table.
+        cache_sizes = cache_sizes or {}
+        for operation in cache_sizes:
+            if operation not in self.cached_operations:
+                raise ValueError('unknown cached operation: %r' % operation)
 
         self._cache = {
-            'len': {},
-            'union': {},
-            'intersection': {},
-            'difference': {},
-            'symmetric_difference': {}
+            operation: make_cache(cache_policy, cache_sizes.get(operation, cache_size))
+            for operation in self.cached_operations
         }
 
-    def cached(keygen=None):
-        def decorate(fn):
-            @wraps(fn)
-            def decorated(self, *args):
-                cache = self._cache[fn.__name__]
-                if keygen is None:
-                    cache_key = tuple([id(arg) for arg in args])
-                else:
-                    cache_key = tuple(keygen(*args))
-                try:
-                    return cache[cache_key]
-                except KeyError:
-                    rv = fn(self, *args)
-                cache[cache_key] = fn(self, *args)
-                return rv
-            return decorated
-        return decorate
+        # Homomorphisms get their computed tables lazily, with the default
+        # capacity.
+        self._cache_policy = cache_policy
+        self._cache_size = cache_size
+
+    cached_operations = (
+        'count', 'union', 'intersection', 'difference', 'symmetric_difference',
+        'union_all', 'intersection_all', 'issubset', 'isdisjoint')
+
+    def cache_info(self):
+        """Return the statistics of the computed table of each operation,
+        and of each homomorphism that was applied.
+        """
+        return {operation: cache.info() for operation, cache in self._cache.items()}
+
+    def clear_caches(self):
+        for cache in self._all_caches():
+            cache.clear()
+
+    def stats(self):
+        """Return the statistics of the engine, since its creation or the
+        last call to `reset_stats`.
+
+        Those are the number of nodes in the unique table and its peak, the
+        number of calls of each operation (nested or not), the time spent in
+        each of them (in seconds, not counting nested operations twice), and
+        the statistics of the computed tables, as returned by `cache_info`.
+        """
+        return EngineStats(
+            node_count=self.node_count(),
+            peak_node_count=self._peak_node_count,
+            calls=dict(self._calls),
+            time=dict(self._time),
+            caches=self.cache_info())
+
+    def reset_stats(self):
+        """Reset the statistics of the engine. The peak number of nodes is
+        reset to the current one.
+        """
+        self._calls.clear()
+        self._time.clear()
+        self._peak_node_count = self.node_count()
+        for cache in self._all_caches():
+            cache.reset_info()
+
+    def node_count(self):
+        """Return the number of nodes in the unique table."""
+        return len(self._table)
+
+    def collect(self, roots=None):
+        """Remove the nodes that aren't reachable anymore from the engine.
+
+        Nodes are reachable if they're reachable from one of the given
+        `roots`, in which case any other root still held by the caller is
+        invalidated. If `roots` is None, the roots are all the nodes still
+        referenced outside of the engine (i.e. outside of its unique table,
+        other nodes and computed tables). Computed table entries that refer
+        to unreachable nodes are purged as well.
+
+        Returns the number of nodes that were removed.
+        """
+        start = time.perf_counter()
+
+        if roots is None:
+            roots = self._external_roots()
+        live = self._mark(roots)
+
+        # Purge the computed tables before sweeping the unique table, so the
+        # entries that refer to unreachable nodes don't keep them alive.
+        def is_dead(key, value):
+            if isinstance(value, AbstractRoot) and (self._node_id(value) not in live):
+                return True
+            return any(self._node_id(operand) not in live for operand in key)
+
+        for cache in self._all_caches():
+            cache.purge(is_dead)
+        freed = self._sweep(live)
+
+        if self.gc_threshold is not None:
+            self._gc_next = max(self.gc_threshold, 2 * self.node_count())
+
+        pause = time.perf_counter() - start
+        self._gc_info = GCInfo(
+            collections=self._gc_info.collections + 1,
+            freed=self._gc_info.freed + freed,
+            time=self._gc_info.time + pause,
+            max_pause=max(self._gc_info.max_pause, pause))
+        return freed
+
+    def gc_info(self):
+        """Return the cumulated statistics of the garbage collections."""
+        return self._gc_info
+
+    def add_hook(self, operation, callback):
+        """Call `callback` after each outermost call of the given operation
+        (e.g. `'union'` or `'apply'`), or of any operation if `operation` is
+        None.
+
+        The callback receives an `OperationEvent`, that holds the operation,
+        its operands and result, their sizes (in number of nodes), the number
+        of results the operation computed rather than finding them in the
+        computed tables, and the time it took (in seconds). Computing the
+        sizes takes time, so hooks are meant for profiling.
+        """
+        self._hooks.setdefault(operation, []).append(callback)
+
+    def remove_hook(self, operation, callback):
+        self._hooks[operation].remove(callback)
+        if not self._hooks[operation]:
+            del self._hooks[operation]
+
+    @contextmanager
+    def hook(self, operation, callback):
+        """Return a context manager that adds the given hook on entry, and
+        removes it on exit.
+        """
+        self.add_hook(operation, callback)
+        try:
+            yield
+        finally:
+            self.remove_hook(operation, callback)
+
+    @contextmanager
+    def record(self, file, encode_key=None):
+        """Return a context manager that records the outermost operations
+        called in its scope to the given binary file, so they can be
+        replayed on another engine with `ydd.tracing.replay`.
+        """
+        with self.hook(None, TraceRecorder(self, file, encode_key)):
+            yield
+
+    def level(self, key):
+        return self._levels[key]
+
+    def variable_order(self):
+        """Return the keys of the nodes in the unique table, from the top of
+        the diagrams to their bottom.
+        """
+        return sorted({node.key for node in self._nodes()}, key=self._levels.__getitem__)
+
+    def reorder(self, method='sifting', order=None):
+        """Reorder the variables of the diagrams, so as to reduce their size.
+
+        `method` is either `'sifting'`, that moves each variable to the
+        position that minimises the number of nodes, or `'window'`, that
+        tries all the permutations of 3 consecutive variables. If `order` is
+        given, the variables are put in this order instead, followed by the
+        ones it doesn't mention.
+
+        Nodes are rewritten in place, so that all the roots still held
+        outside of the engine keep on representing the same families. The
+        other nodes are collected, and the computed tables are cleared. Keys
+        that appear for the first time afterwards are placed after all the
+        others.
+
+        Returns the number of nodes in the unique table.
+        """
+        if (order is None) and (method not in ('sifting', 'window')):
+            raise ValueError('unknown reordering method: %r' % method)
+        if self._depth:
+            raise RuntimeError('the engine cannot be reordered during an operation')
+
+        start = time.perf_counter()
+
+        # Reordering doesn't create garbage faster than it removes it, so
+        # we don't need the collections triggered by the node creations.
+        self.clear_caches()
+        roots = self._external_roots()
+        self.collect(roots)
+        gc_next, self._gc_next = self._gc_next, None
+
+        try:
+            reordering = Reordering(self, roots, order or ())
+            size = reordering.size
+            if order is not None:
+                for position, key in enumerate(order):
+                    reordering.move(key, position)
+            elif method == 'sifting':
+                reordering.sift()
+            else:
+                reordering.window()
+        finally:
+            self._gc_next = gc_next
+
+        self._reorder_pending = False
+        if self.reorder_threshold is not None:
+            self._reorder_next = max(self.reorder_threshold, 2 * self.node_count())
+
+        self._reorder_info = ReorderInfo(
+            reorderings=self._reorder_info.reorderings + 1,
+            swaps=self._reorder_info.swaps + reordering.swaps,
+            saved=self._reorder_info.saved + size - reordering.size,
+            time=self._reorder_info.time + time.perf_counter() - start)
+        return self.node_count()
+
+    def reorder_info(self):
+        """Return the cumulated statistics of the reorderings."""
+        return self._reorder_info
 
     def make_terminal(self, terminal):
         if terminal:
@@ -182,242 +400,540 @@ class DefaultEngine(AbstractEngine):
         if then_ is self.zero:
             return else_
 
-        # Create a temporary node.
-        rv = Root(key=key, then_=then_, else_=else_, creator=self)
-
-        # Try to return the node from the unique table.
-        h = self._hash_node(rv)
+        # Try to return the node from the unique table, and only create it
+        # if it isn't there.
+        h = (key, id(then_), id(else_))
         try:
             return self._table[h]
         except KeyError:
-            self._table[h] = rv
+            rv = self._table[h] = Root(key=key, then_=then_, else_=else_, creator=self)
+            if len(self._table) > self._peak_node_count:
+                self._peak_node_count = len(self._table)
+            if (self._gc_next is not None) and (len(self._table) > self._gc_next):
+                self.collect()
+            if (self._reorder_next is not None) and (len(self._table) > self._reorder_next):
+                self._reorder_pending = True
             return rv
 
-    @cached(keygen=lambda l, r: [l, r] if (id(l) < id(r)) else [r, l])
+    @_operation
     def union(self, left, right):
-        if right is self.one:
-            # If the right operand is the one terminal, then we return the
-            # left operand, making sure its "else-most" terminal is also one.
-            return self._update_else_most_terminal(left, self.one)
+        return self._apply('union', self._union_terminal_case, True, left, right)
 
-        if right is self.zero:
-            # If the right operand is the zero terminal, then we simply return
-            # the left operand unchanged, as no new path should be merged.
-            return left
+    @_operation
+    def intersection(self, left, right):
+        return self._apply('intersection', self._intersection_terminal_case, True, left, right)
 
-        if left is self.one:
-            # If the left operand is the one terminal, then we return the
-            # right operand, making sure its "else-most" terminal is also one.
-            return self._update_else_most_terminal(right, self.one)
+    @_operation
+    def difference(self, left, right):
+        return self._apply('difference', self._difference_terminal_case, False, left, right)
 
-        if left is self.zero:
-            # If the left operand is the zero terminal, then we simply return
-            # the right operand unchanged.
-            return right
+    @_operation
+    def symmetric_difference(self, left, right):
+        return self._apply(
+            'symmetric_difference', self._symmetric_difference_terminal_case, True, left, right)
+
+    @_operation
+    def union_all(self, families):
+        return self._apply_all(
+            'union_all', self._union_all_terminal_case, self._union_all_decompose, families)
+
+    @_operation
+    def intersection_all(self, families):
+        families = tuple(families)
+        if not families:
+            raise ValueError('intersection_all() of an empty iterable')
+
+        return self._apply_all(
+            'intersection_all', self._intersection_all_terminal_case,
+            self._intersection_all_decompose, families)
+
+    @_operation
+    def apply(self, homomorphism, family):
+        return super().apply(homomorphism, family)
+
+    @_operation
+    def issubset(self, left, right):
+        """Return whether every member of `left` is a member of `right`."""
+        return self._check('issubset', self._issubset_decompose, False, left, right)
+
+    @_operation
+    def isdisjoint(self, left, right):
+        """Return whether `left` and `right` have no member in common.
+
+        Contrary to testing whether their intersection is empty, this
+        doesn't create any node, and stops on the first common member.
+        """
+        return self._check('isdisjoint', self._isdisjoint_decompose, True, left, right)
+
+    @_operation
+    def count(self, ydd):
+        cache = self._cache['count']
+
+        results = []
+        stack = [(_EXPAND, ydd)]
+        while stack:
+            tag, node = stack.pop()
+            if tag is _BUILD:
+                rv = results.pop() + results.pop()
+                cache[(node,)] = rv
+            elif node is self.zero:
+                rv = 0
+            elif node is self.one:
+                rv = 1
+            else:
+                rv = cache.get((node,), _MISSING)
+                if rv is _MISSING:
+                    stack.append((_BUILD, node))
+                    stack.append((_EXPAND, node.else_))
+                    stack.append((_EXPAND, node.then_))
+                    continue
+            results.append(rv)
+
+        return results.pop()
+
+    # Kept for backward compatibility.
+    len = count
+
+    def _apply(self, operation, terminal_case, commutative, left, right):
+        # Implementation note: All binary operations are computed by the same
+        # procedure, that decomposes both operands on their smallest starting
+        # key, and creates a node whose children are the results of the
+        # operation on the "then" and "else" children of the operands, until
+        # `terminal_case` can tell the result directly. An operand that
+        # doesn't start with the smallest key is its own "else" child, while
+        # its "then" child is the zero terminal. The one terminal is
+        # considered to start with a key greater than any other.
+        #
+        # Rather than recursing, we use an explicit stack of tasks, that are
+        # either pairs of operands to expand, or nodes to build once the
+        # results for the children have been computed.
+
+        cache = self._cache[operation]
+        node_id = self._node_id
+        level = self._levels.__getitem__
+        zero = self.zero
+        one = self.one
+
+        results = []
+        stack = [(_EXPAND, left, right)]
+        while stack:
+            tag, left, right = stack.pop()
+            if tag is _BUILD:
+                # The results for the "then" and "else" children are on top
+                # of the results stack, and `left` holds the cache key.
+                else_ = results.pop()
+                rv = self.make_node(right, results.pop(), else_)
+                cache[left] = rv
+                results.append(rv)
+                continue
+
+            rv = terminal_case(left, right)
+            if rv is None:
+                # Operands are part of the cache key, so that they're kept
+                # alive as long as the entry is, and their ids can't be
+                # recycled to produce stale hits.
+                if commutative and (node_id(right) < node_id(left)):
+                    left, right = right, left
+                args = (left, right)
+
+                rv = cache.get(args, _MISSING)
+                if rv is _MISSING:
+                    if (left is one) or (
+                            (right is not one) and (level(right.key) < level(left.key))):
+                        stack.append((_BUILD, args, right.key))
+                        stack.append((_EXPAND, left, right.else_))
+                        stack.append((_EXPAND, zero, right.then_))
+                    elif (right is one) or (level(left.key) < level(right.key)):
+                        stack.append((_BUILD, args, left.key))
+                        stack.append((_EXPAND, left.else_, right))
+                        stack.append((_EXPAND, left.then_, zero))
+                    else:
+                        stack.append((_BUILD, args, left.key))
+                        stack.append((_EXPAND, left.else_, right.else_))
+                        stack.append((_EXPAND, left.then_, right.then_))
+                    continue
+
+            results.append(rv)
+
+        return results.pop()
+
+    def _check(self, operation, decompose, commutative, left, right):
+        # Implementation note: The predicates we check hold for a pair of
+        # diagrams if and only if they hold for all the pairs of sub-diagrams
+        # `decompose` reduces it to, so we can stop on the first pair that
+        # fails, and skip the pairs that were already pushed on the stack.
+        # `decompose` returns True or False if the predicate trivially holds
+        # or fails for the given pair. If the predicate holds, it holds for
+        # all the pairs we visited, which are stored in the computed table.
+
+        cache = self._cache[operation]
+        node_id = self._node_id
+
+        def normalize(pair):
+            if commutative and (node_id(pair[0]) > node_id(pair[1])):
+                return (pair[1], pair[0])
+            return pair
+
+        visited = []
+        seen = set()
+        stack = [normalize((left, right))]
+        while stack:
+            pair = stack.pop()
+            rv = decompose(*pair)
+            if rv is True:
+                continue
+            if rv is False:
+                break
+
+            cached = cache.get(pair, _MISSING)
+            if cached is True:
+                continue
+            if cached is False:
+                rv = False
+                break
+
+            visited.append(pair)
+            for sub_pair in rv:
+                sub_pair = normalize(sub_pair)
+                sub_pair_id = (node_id(sub_pair[0]), node_id(sub_pair[1]))
+                if sub_pair_id not in seen:
+                    seen.add(sub_pair_id)
+                    stack.append(sub_pair)
 
-        if right.key > left.key:
-            # If the right operand starts with a greater key, it implies that
-            # it doesn't have an accepting path where the left's starting key
-            # appears. As a result, we should continue only on the "else"
-            # child of the left operand.
-            return self.make_node(
-                key=left.key,
-                then_=left.then_,
-                else_=self.union(left.else_, right)
-            )
-
-        if right.key == left.key:
-            # If the left operand start with the same key as the right one,
-            # then we should continue on the both their children.
-            return self.make_node(
-                key=left.key,
-                then_=self.union(left.then_, right.then_),
-                else_=self.union(left.else_, right.else_)
-            )
-
-        if right.key < left.key:
-            # If the left operand starts with a greater key, it implies that
-            # it doesn't have an accepting path where the right's starting key
-            # appears. As a result, we should return a new node that puts the
-            # the "then" child of the right operand on its own "then" child,
-            # and continue on its "else" child.
-            return self.make_node(
-                key=right.key,
-                then_=right.then_,
-                else_=self.union(left, right.else_)
-            )
-
-    @cached(keygen=lambda l, r: [l, r] if (id(l) < id(r)) else [r, l])
-    def intersection(self, left, right):
-        if (right is self.zero) or (left is self.zero):
-            # If either the left or right operand is the zero terminal, then
-            # we can discard all the paths from the other operand.
+        else:
+            for pair in visited:
+                cache[pair] = True
+            return True
+
+        # The first visited pair, if any, is the one we were given.
+        if visited:
+            cache[visited[0]] = False
+        return False
+
+    def _issubset_decompose(self, left, right):
+        if (left is self.zero) or (left is right):
+            return True
+
+        if (right is self.zero) or (right is self.one):
+            # The left operand is neither the zero terminal nor identical to
+            # the right one, hence it has a member the right operand doesn't
+            # have.
+            return False
+
+        if (left is not self.one) and (self._levels[left.key] < self._levels[right.key]):
+            # The left operand has members with its starting key, which can't
+            # appear in any member of the right operand.
+            return False
+
+        if (left is not self.one) and (left.key == right.key):
+            return ((left.then_, right.then_), (left.else_, right.else_))
+
+        # The members of the right operand that start with its key can't be
+        # members of the left operand.
+        return ((left, right.else_),)
+
+    def _isdisjoint_decompose(self, left, right):
+        if (left is self.zero) or (right is self.zero):
+            return True
+        if left is right:
+            return False
+
+        # Members with the smallest key of both operands can only be found in
+        # the operand that starts with it.
+        level = self._levels.__getitem__
+        if (left is self.one) or ((right is not self.one) and (level(right.key) < level(left.key))):
+            return ((left, right.else_),)
+        if (right is self.one) or (level(left.key) < level(right.key)):
+            return ((left.else_, right),)
+        return ((left.then_, right.then_), (left.else_, right.else_))
+
+    def _apply_all(self, operation, terminal_case, decompose, operands):
+        # Implementation note: N-ary operations are computed like the binary
+        # ones, except that all operands are merged at once, rather than
+        # building the intermediate results of pairwise operations. The
+        # operands of each task are normalized by `terminal_case`, which
+        # either returns the result, or a tuple of distinct operands sorted
+        # by node id, that we use as cache key. Those are then decomposed in
+        # a key and the operands of the "then" and "else" children.
+
+        cache = self._cache[operation]
+
+        results = []
+        stack = [(_EXPAND, operands, None)]
+        while stack:
+            tag, operands, key = stack.pop()
+            if tag is _BUILD:
+                else_ = results.pop()
+                rv = self.make_node(key, results.pop(), else_)
+                cache[operands] = rv
+                results.append(rv)
+                continue
+
+            rv = terminal_case(operands)
+            if isinstance(rv, tuple):
+                operands = rv
+                rv = cache.get(operands, _MISSING)
+                if rv is _MISSING:
+                    key, then_operands, else_operands = decompose(operands)
+                    stack.append((_BUILD, operands, key))
+                    stack.append((_EXPAND, else_operands, None))
+                    stack.append((_EXPAND, then_operands, None))
+                    continue
+
+            results.append(rv)
+
+        return results.pop()
+
+    def _call_outermost(self, operation, method, args, kwargs):
+        hooks = self._hooks and (self._hooks.get(operation, []) + self._hooks.get(None, []))
+        if hooks:
+            # Iterables of operands are consumed by the operation, so we have
+            # to keep them for the hooks.
+            args = tuple(
+                arg if isinstance(arg, (AbstractRoot, Homomorphism)) else tuple(arg)
+                for arg in args)
+            misses = self._cache_misses()
+
+        start = time.perf_counter()
+        self._depth += 1
+        try:
+            rv = method(self, *args, **kwargs)
+        finally:
+            self._depth -= 1
+            elapsed = time.perf_counter() - start
+            self._time[operation] += elapsed
+
+        if hooks:
+            event = OperationEvent(
+                operation=operation,
+                operands=args,
+                result=rv,
+                operand_sizes=tuple(self._operand_size(arg) for arg in args),
+                result_size=self._operand_size(rv),
+                steps=self._cache_misses() - misses,
+                time=elapsed)
+
+            # Operations called by the hooks aren't reported.
+            self._depth += 1
+            try:
+                for hook in hooks:
+                    hook(event)
+            finally:
+                self._depth -= 1
+
+        self._maintain()
+        return rv
+
+    def _maintain(self):
+        # The automatic reordering of the variables is deferred until the
+        # end of the outermost operation, since the operands and intermediate
+        # results of the operations in progress depend on the current order.
+        if self._reorder_pending:
+            self.reorder()
+
+    def _cache_misses(self):
+        return sum(cache.misses for cache in self._cache.values())
+
+    def _operand_size(self, operand):
+        if isinstance(operand, AbstractRoot):
+            return self._diagram_size(operand)
+        if isinstance(operand, tuple):
+            return tuple(self._operand_size(item) for item in operand)
+        return None
+
+    def _sorted_operands(self, operands):
+        unique = {self._node_id(operand): operand for operand in operands}
+        return tuple(unique[node_id] for node_id in sorted(unique))
+
+    def _union_all_terminal_case(self, operands):
+        operands = self._sorted_operands(
+            operand for operand in operands if operand is not self.zero)
+        if len(operands) == 0:
+            return self.zero
+        if len(operands) == 1:
+            return operands[0]
+        if len(operands) == 2:
+            return self.union(*operands)
+        return operands
+
+    def _union_all_decompose(self, operands):
+        # The one terminal is considered to start with a key greater than
+        # any other. Since operands are distinct, there's at least two that
+        # aren't terminal.
+        key = min(
+            (operand.key for operand in operands if operand is not self.one),
+            key=self._levels.__getitem__)
+        then_operands = []
+        else_operands = []
+        for operand in operands:
+            if (operand is not self.one) and (operand.key == key):
+                then_operands.append(operand.then_)
+                else_operands.append(operand.else_)
+            else:
+                else_operands.append(operand)
+        return key, then_operands, else_operands
+
+    def _intersection_all_terminal_case(self, operands):
+        operands = self._sorted_operands(operands)
+        if any(operand is self.zero for operand in operands):
             return self.zero
+        if len(operands) == 1:
+            return operands[0]
+        if len(operands) == 2:
+            return self.intersection(*operands)
+
+        if any(operand is self.one for operand in operands):
+            # The result is the family of the empty set if all operands have
+            # it, that is if their "else-most" terminal is the one terminal.
+            for operand in operands:
+                while (operand is not self.zero) and (operand is not self.one):
+                    operand = operand.else_
+                if operand is self.zero:
+                    return self.zero
+            return self.one
 
-        if right is self.one:
-            # If the right operand is the one terminal, then we can discard
-            # all paths from the left one, except its "else-most" terminal,
-            # as it corresponds to the absence of all remaining keys.
-            node = left
-            while node not in (self.one, self.zero):
-                node = node.else_
-            return node
-
-        if left is self.one:
-            # If the left operand is the one terminal, then we can discard
-            # all paths from the right one, except its "else-most" terminal,
-            # as it corresponds to the absence of all remaining keys.
-            node = right
-            while node not in (self.one, self.zero):
-                node = node.else_
-            return node
-
-        if right.key > left.key:
-            # If the right operand starts with a greater key, it implies that
-            # it doesn't have an accepting path where the left's starting key
-            # appears. As a result, we can discard the "then" child of the
-            # left operand and continue on its "else" child.
-            return self.intersection(left.else_, right)
-
-        if right.key == left.key:
-            # If the left operand start with the same key as the right one,
-            # then we should continue on the both their children.
-            return self.make_node(
-                key=left.key,
-                then_=self.intersection(left.then_, right.then_),
-                else_=self.intersection(left.else_, right.else_)
-            )
-
-        if right.key < left.key:
-            # If the left operand starts with a greater key, it implies that
-            # it doesn't have an accepting path where the right's starting key
-            # appears. As a result, we can discard the "then" child of the
-            # right operand and continue on its "else" child.
-            return self.intersection(left, right.else_)
-
-    @cached()
-    def difference(self, left, right):
+        return operands
+
+    def _intersection_all_decompose(self, operands):
+        # If all operands start with the same key, we continue on both their
+        # children. Otherwise, the members with the smallest key can't be in
+        # the operands that don't start with it, so the "then" child of the
+        # result is empty, and we continue on the "else" children only.
+        key = min((operand.key for operand in operands), key=self._levels.__getitem__)
+        if all(operand.key == key for operand in operands):
+            return (
+                key,
+                [operand.then_ for operand in operands],
+                [operand.else_ for operand in operands])
+
+        return (
+            key,
+            [self.zero],
+            [operand.else_ if operand.key == key else operand for operand in operands])
+
+    def _union_terminal_case(self, left, right):
+        if (left is self.zero) or (left is right):
+            return right
         if right is self.zero:
-            # If the right operand is the zero terminal, then we simply return
-            # the left operand unchanged.
             return left
 
-        if right is self.one:
-            # If the right operand is the one terminal, then we can keep all
-            # paths from the left one, except its "else-most" terminal that
-            # should be zero, in order to exclude the right operand.
-            return self._update_else_most_terminal(left, self.zero)
-
-        if left is self.zero:
-            # If the left operand is the zero terminal, we simply return it.
+    def _intersection_terminal_case(self, left, right):
+        if (left is self.zero) or (right is self.zero):
+            return self.zero
+        if left is right:
             return left
 
-        if left is self.one:
-            # If the left operand is the one terminal, then we return it as-is
-            # only if the "else-most" terminal of the right operand is zero.
-            node = right
-            while node not in (self.one, self.zero):
-                node = node.else_
-            return self.one if node is self.zero else self.zero
-
-        if right.key > left.key:
-            # If the right operand starts with a greater key, it implies that
-            # it doesn't have an accepting path where the left's starting key
-            # appears. As a result, we can continue only on the "else" child
-            # of the left operand only.
-            return self.make_node(
-                key=left.key,
-                then_=left.then_,
-                else_=self.difference(left.else_, right)
-            )
-
-        if right.key == left.key:
-            # If the left operand start with the same key as the right one,
-            # then we should continue on the both their children.
-            return self.make_node(
-                key=left.key,
-                then_=self.difference(left.then_, right.then_),
-                else_=self.difference(left.else_, right.else_)
-            )
-
-        if right.key < left.key:
-            # If the left operand starts with a greater key, it implies that
-            # it doesn't have an accepting path where the right's starting key
-            # appears. As a result, we don't care about any path on the "then"
-            # child of the right operand and can continue on its "else" child.
-            return self.difference(left, right.else_)
-
-    @cached(keygen=lambda l, r: [l, r] if (id(l) < id(r)) else [r, l])
-    def symmetric_difference(self, left, right):
+    def _difference_terminal_case(self, left, right):
+        if (left is self.zero) or (left is right):
+            return self.zero
         if right is self.zero:
-            # If the right operand is the zero terminal, then we simply return
-            # the left operand unchanged.
             return left
 
-        if right is self.one:
-            # If the right operand is the one terminal, then we can keep all
-            # paths from the left one, except its "else-most" terminal that
-            # should be zero, in order to exclude the right operand.
-            return self._update_else_most_terminal(left, self.zero)
-
+    def _symmetric_difference_terminal_case(self, left, right):
         if left is self.zero:
-            # If the left operand is the zero terminal, then we simply return
-            # the right operand unchanged.
             return right
+        if right is self.zero:
+            return left
+        if left is right:
+            return self.zero
+
+    def _all_caches(self):
+        # Returns the computed tables of the engine.
+        return list(self._cache.values())
 
-        if left is self.one:
-            # If the left operand is the one terminal, then we can keep all
-            # paths from the right one, except its "else-most" terminal that
-            # should be zero, in order to exclude the left operand.
-            return self._update_else_most_terminal(right, self.zero)
-
-        if right.key > left.key:
-            # If the right operand starts with a greater key, it implies that
-            # it doesn't have an accepting path where the left's starting key
-            # appears. As a result, we can continue only on the "else" child
-            # of the left operand only.
-            return self.make_node(
-                key=left.key,
-                then_=left.then_,
-                else_=self.symmetric_difference(left.else_, right)
-            )
-
-        if right.key == left.key:
-            # If the left operand start with the same key as the right one,
-            # then we should continue on the both their children.
-            return self.make_node(
-                key=left.key,
-                then_=self.symmetric_difference(left.then_, right.then_),
-                else_=self.symmetric_difference(left.else_, right.else_)
-            )
-
-        if right.key < left.key:
-            # If the left operand starts with a greater key, it implies that
-            # it doesn't have an accepting path where the right's starting key
-            # appears. As a result, we can keep then "then" child of the right
-            # operand unchanged, and continue on its "else" child.
-            return self.make_node(
-                key=right.key,
-                then_=right.then_,
-                else_=self.difference(left, right.else_)
-            )
-            return self.difference(left, right.else_)
-
-    @cached()
-    def len(self, ydd):
-        if ydd is self.zero:
-            return 0
-        if ydd is self.one:
-            return 1
-        return self.len(ydd.else_) + self.len(ydd.then_)
+    def _homomorphism_cache(self, homomorphism):
+        try:
+            return self._cache[homomorphism]
+        except KeyError:
+            rv = self._cache[homomorphism] = make_cache(self._cache_policy, self._cache_size)
+            return rv
+
+    def _init_table(self, use_weak_table):
+        self.zero = ZeroTerminal(key=False, creator=self)
+        self.one = OneTerminal(key=True, creator=self)
+
+        self._table = {
+            self._hash_node(self.zero): self.zero,
+            self._hash_node(self.one): self.one
+        }
+
+        if use_weak_table:
+            self._table = WeakValueDictionary(self._table)
+
+    # Returns an integer that identifies a node for as long as it lives in
+    # the unique table. Roots are unique objects, so their id will do.
+    _node_id = staticmethod(id)
+
+    def _external_roots(self):
+        # Nodes referenced from outside of the engine are found by comparing
+        # their reference count with the number of references the engine
+        # holds on them. We measure the references held by the list and the
+        # call to `getrefcount` on a sentinel, rather than assuming them.
+        objects = self._root_objects()
+        internal = self._internal_references(objects)
+
+        objects.append(object())
+        refcounts = [sys.getrefcount(obj) for obj in objects]
+        overhead = refcounts.pop()
+        objects.pop()
+
+        return [
+            obj
+            for obj, refcount in zip(objects, refcounts)
+            if refcount - overhead > internal[id(obj)]
+        ]
+
+    def _root_objects(self):
+        # Returns the objects that may be referenced outside of the engine.
+        return list(self._table.values())
+
+    def _internal_references(self, objects):
+        rv = Counter()
+        if not isinstance(self._table, WeakValueDictionary):
+            for node in objects:
+                rv[id(node)] += 1
+        for node in objects:
+            rv[id(node._then)] += 1
+            rv[id(node._else)] += 1
+
+        for cache in self._all_caches():
+            for key, value in cache.items():
+                rv[id(value)] += 1
+                for operand in key:
+                    rv[id(operand)] += 1
+        return rv
+
+    def _mark(self, roots):
+        live = {self._node_id(self.zero), self._node_id(self.one)}
+        stack = list(roots)
+        while stack:
+            node = stack.pop()
+            if self._node_id(node) not in live:
+                live.add(self._node_id(node))
+                stack.append(node.then_)
+                stack.append(node.else_)
+        return live
+
+    def _sweep(self, live):
+        dead = [h for h, node in self._table.items() if id(node) not in live]
+        for h in dead:
+            del self._table[h]
+        return len(dead)
+
+    def _nodes(self):
+        # Returns the non-terminal nodes of the unique table.
+        return [node for node in self._table.values() if node.then_ is not None]
+
+    def _unlink(self, node):
+        del self._table[self._hash_node(node)]
+
+    def _relink(self, node, key, then_, else_):
+        node._key = key
+        node._then = then_
+        node._else = else_
+        self._table[self._hash_node(node)] = node
+
+    _discard = _unlink
 
     def _hash_node(self, node):
         return (node.key, id(node.then_), id(node.else_))
-
-    def _update_else_most_terminal(self, ydd, child):
-        if ydd in (self.one, self.zero):
-            return child
-        elif ydd.else_ in (self.one, self.zero):
-            return self.make_node(key=ydd.key, then_=ydd.then_, else_=child)
-        else:
-            return self._update_else_most_terminal(ydd.else_, child)
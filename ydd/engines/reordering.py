@@ -0,0 +1,221 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+from collections import Counter, namedtuple
+
+
+ReorderInfo = namedtuple('ReorderInfo', ['reorderings', 'swaps', 'saved', 'time'])
+
+
+class KeyOrder(dict):
+    """A mapping from keys to their level in the variable order of an engine.
+
+    Levels are values that compare like the positions of their keys in the
+    order. Until an engine is reordered, keys are ordered by themselves,
+    hence are their own levels. Afterwards, levels are consecutive integers,
+    and keys the order doesn't know yet are placed after all the others.
+    """
+
+    def __init__(self, keys=None):
+        super().__init__()
+        self.natural = keys is None
+        for key in keys or ():
+            self[key] = len(self)
+
+    def __missing__(self, key):
+        rv = self[key] = key if self.natural else len(self)
+        return rv
+
+
+class Reordering(object):
+    """A reordering of the variables of an engine, in progress.
+
+    Variables are reordered by swapping adjacent levels, rewriting the nodes
+    of the upper level in place, so that the nodes of the engine keep on
+    representing the same families, and the roots held by the caller remain
+    valid. The number of references to each node is maintained, so that the
+    nodes that are no longer referenced are discarded as soon as possible,
+    and `size` is the number of nodes reachable from the given roots.
+
+    Engines should implement `_nodes`, that returns the nodes of their unique
+    table, `_unlink` and `_relink`, that remove a node from the unique table
+    and put it back with new fields, and `_discard`, that removes a node for
+    good.
+    """
+
+    def __init__(self, engine, roots, keys=()):
+        self.engine = engine
+        self.zero = engine.zero
+        self.one = engine.one
+        self.node_id = engine._node_id
+
+        self.levels = {key: {} for key in keys}
+        self.references = Counter()
+        for node in engine._nodes():
+            self.levels.setdefault(node.key, {})[self.node_id(node)] = node
+            self._reference(node.then_)
+            self._reference(node.else_)
+        for root in roots:
+            self._reference(root)
+
+        self.order = sorted(self.levels, key=engine._levels.__getitem__)
+        self.size = sum(len(level) for level in self.levels.values())
+        self.swaps = 0
+
+        engine._levels = KeyOrder(self.order)
+
+    def swap(self, position):
+        """Swap the variables at the given position and the next one."""
+        upper = self.order[position]
+        lower = self.order[position + 1]
+        upper_nodes = self.levels[upper]
+        lower_nodes = self.levels[lower]
+
+        # Only the nodes of the upper level that have a child on the lower
+        # level have to be rewritten. They're removed from the unique table
+        # first, so they can't be mistaken for the nodes we create.
+        moved = [
+            node for node in upper_nodes.values()
+            if (self.node_id(node.then_) in lower_nodes)
+            or (self.node_id(node.else_) in lower_nodes)
+        ]
+        for node in moved:
+            del upper_nodes[self.node_id(node)]
+            self.engine._unlink(node)
+
+        for node in moved:
+            then_then, then_else = self._cofactors(node.then_, lower_nodes)
+            else_then, else_else = self._cofactors(node.else_, lower_nodes)
+
+            then_ = self._make(upper, then_then, else_then)
+            else_ = self._make(upper, then_else, else_else)
+            self._reference(then_)
+            self._reference(else_)
+
+            old_then = node.then_
+            old_else = node.else_
+            self.engine._relink(node, lower, then_, else_)
+            lower_nodes[self.node_id(node)] = node
+            self._dereference(old_then)
+            self._dereference(old_else)
+
+        self.order[position] = lower
+        self.order[position + 1] = upper
+        self.engine._levels[lower] = position
+        self.engine._levels[upper] = position + 1
+        self.swaps += 1
+
+    def move(self, key, position):
+        """Move the given variable to the given position."""
+        current = self.order.index(key)
+        while current < position:
+            self.swap(current)
+            current += 1
+        while current > position:
+            self.swap(current - 1)
+            current -= 1
+
+    def sift(self, max_growth=1.2):
+        """Move each variable to the position that minimises the size of the
+        diagrams, the others being fixed.
+
+        Variables are sifted from the largest level to the smallest. Each of
+        them is moved towards the closest end of the order first, then to the
+        other one, giving up on a direction as soon as the size grows past
+        `max_growth` times the size before sifting the variable.
+        """
+        keys = sorted(self.order, key=lambda key: len(self.levels[key]), reverse=True)
+        for key in keys:
+            limit = self.size * max_growth
+            position = self.order.index(key)
+            best_size = self.size
+            best_position = position
+
+            if position < len(self.order) // 2:
+                ends = (0, len(self.order) - 1)
+            else:
+                ends = (len(self.order) - 1, 0)
+            for end in ends:
+                step = 1 if end > position else -1
+                while position != end:
+                    self.swap(min(position, position + step))
+                    position += step
+                    if self.size < best_size:
+                        best_size = self.size
+                        best_position = position
+                    elif self.size > limit:
+                        break
+
+            self.move(key, best_position)
+
+    def window(self):
+        """Try every permutation of each window of 3 consecutive variables,
+        keeping the smallest, until the size doesn't decrease anymore.
+        """
+        width = min(3, len(self.order))
+        improved = width > 1
+        while improved:
+            improved = False
+            for position in range(len(self.order) - width + 1):
+                # Alternating the swaps of the first and last pairs of the
+                # window goes through all its permutations, and back to the
+                # initial one with the last swap.
+                if width == 3:
+                    swaps = (position, position + 1) * 3
+                else:
+                    swaps = (position, position)
+
+                sizes = [self.size]
+                for swap in swaps[:-1]:
+                    self.swap(swap)
+                    sizes.append(self.size)
+
+                best = sizes.index(min(sizes))
+                if best != len(sizes) - 1:
+                    self.swap(swaps[-1])
+                    for swap in swaps[:best]:
+                        self.swap(swap)
+                if best != 0:
+                    improved = True
+
+    def _cofactors(self, node, lower_nodes):
+        # Returns the "then" and "else" children of the given node with
+        # respect to the variable of the lower level, whether or not the
+        # node starts with it.
+        if self.node_id(node) in lower_nodes:
+            return node.then_, node.else_
+        return self.zero, node
+
+    def _make(self, key, then_, else_):
+        if then_ is self.zero:
+            return else_
+
+        rv = self.engine.make_node(key, then_, else_)
+        level = self.levels[key]
+        if self.node_id(rv) not in level:
+            level[self.node_id(rv)] = rv
+            self.size += 1
+            self._reference(then_)
+            self._reference(else_)
+        return rv
+
+    def _reference(self, node):
+        if (node is not self.zero) and (node is not self.one):
+            self.references[self.node_id(node)] += 1
+
+    def _dereference(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if (node is self.zero) or (node is self.one):
+                continue
+
+            node_id = self.node_id(node)
+            self.references[node_id] -= 1
+            if self.references[node_id] == 0:
+                del self.references[node_id]
+                del self.levels[node.key][node_id]
+                self.size -= 1
+                stack.append(node.then_)
+                stack.append(node.else_)
+                self.engine._discard(node)
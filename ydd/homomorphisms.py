@@ -0,0 +1,194 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+from abc import ABCMeta, abstractmethod
+
+
+class Homomorphism(metaclass=ABCMeta):
+    """A function on families of sets, that maps the empty family to itself.
+
+    Homomorphisms are applied with `engine.apply(homomorphism, family)`,
+    which memoises their results in a computed table owned by the engine.
+    They are compared by value: instances of the same class that were built
+    with equal arguments are equal, and share the same computed table.
+
+    Homomorphisms can be combined with `|` (their union) and `*` (their
+    composition, where `(f * g)` applies `g` first).
+    """
+
+    # Whether the results of the homomorphism should be memoised. Trivial
+    # homomorphisms aren't worth the lookup.
+    cached = True
+
+    def __init__(self, *args):
+        self.args = args
+
+    @abstractmethod
+    def image(self, engine, family):
+        """Return the image of the given family, which isn't empty.
+
+        Subclasses should apply other homomorphisms (including themselves)
+        with `engine.apply`, rather than calling this method directly, so
+        their results get memoised.
+        """
+
+    def __or__(self, other):
+        return union(self, other)
+
+    def __mul__(self, other):
+        return compose(self, other)
+
+    def __eq__(self, other):
+        return (type(self) is type(other)) and (self.args == other.args)
+
+    def __hash__(self):
+        # Homomorphisms are looked up in the engine at each application, and
+        # their arguments may be large, so their hash is computed only once.
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((type(self), self.args))
+            return self._hash
+
+    def __getstate__(self):
+        # Hashes differ between processes, so the cached one isn't pickled.
+        state = self.__dict__.copy()
+        state.pop('_hash', None)
+        return state
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(map(repr, self.args)))
+
+
+class Identity(Homomorphism):
+
+    cached = False
+
+    def image(self, engine, family):
+        return family
+
+
+class Constant(Homomorphism):
+    """A homomorphism that maps any non-empty family to the given one."""
+
+    cached = False
+
+    def __init__(self, family):
+        super().__init__(family)
+        self.family = family
+
+    def image(self, engine, family):
+        return self.family
+
+
+class Inductive(Homomorphism):
+    """A homomorphism defined by induction on the structure of families.
+
+    Subclasses implement `apply_node`, which computes the image of a family
+    from its root node, usually by applying homomorphisms to its children,
+    and may override `apply_one`, which computes the image of the family of
+    the empty set. Subclasses should pass the arguments they're built with
+    to the constructor of this class, so they're compared by value.
+    """
+
+    def image(self, engine, family):
+        if family.is_one():
+            return self.apply_one(engine)
+        return self.apply_node(engine, family)
+
+    def apply_one(self, engine):
+        return engine.make_terminal(True)
+
+    @abstractmethod
+    def apply_node(self, engine, node):
+        pass
+
+
+class Composition(Homomorphism):
+
+    def __init__(self, *operands):
+        super().__init__(*operands)
+        self.operands = operands
+
+    def image(self, engine, family):
+        for operand in reversed(self.operands):
+            family = engine.apply(operand, family)
+            if family.is_zero():
+                break
+        return family
+
+
+class Union(Homomorphism):
+
+    def __init__(self, *operands):
+        # The union is commutative, so the order of the operands shouldn't
+        # matter when comparing homomorphisms.
+        super().__init__(frozenset(operands))
+        self.operands = tuple(operands)
+
+    def image(self, engine, family):
+        return engine.union_all([engine.apply(operand, family) for operand in self.operands])
+
+
+class Fixpoint(Homomorphism):
+    """A homomorphism that applies its operand until the result is stable.
+
+    The operand is typically the union of the identity with some other
+    homomorphism, so that the successive results form an increasing
+    sequence; otherwise the fixpoint might not exist.
+    """
+
+    def __init__(self, operand):
+        super().__init__(operand)
+        self.operand = operand
+
+    def image(self, engine, family):
+        while True:
+            rv = engine.apply(self.operand, family)
+            if rv == family:
+                return rv
+            family = rv
+
+
+def compose(*homomorphisms):
+    """Return the composition of the given homomorphisms, which applies them
+    from right to left.
+    """
+    operands = []
+    for homomorphism in homomorphisms:
+        if isinstance(homomorphism, Composition):
+            operands.extend(homomorphism.operands)
+        elif not isinstance(homomorphism, Identity):
+            operands.append(homomorphism)
+
+    if not operands:
+        return Identity()
+    if len(operands) == 1:
+        return operands[0]
+    return Composition(*operands)
+
+
+def union(*homomorphisms):
+    """Return the union of the given homomorphisms."""
+    operands = []
+    for homomorphism in homomorphisms:
+        if isinstance(homomorphism, Union):
+            candidates = homomorphism.operands
+        else:
+            candidates = (homomorphism,)
+        for candidate in candidates:
+            if candidate not in operands:
+                operands.append(candidate)
+
+    if not operands:
+        raise ValueError('union() of no homomorphism')
+    if len(operands) == 1:
+        return operands[0]
+    return Union(*operands)
+
+
+def fixpoint(homomorphism):
+    """Return the fixpoint of the given homomorphism."""
+    if isinstance(homomorphism, (Identity, Fixpoint)):
+        return homomorphism
+    return Fixpoint(homomorphism)
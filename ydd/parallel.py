@@ -0,0 +1,139 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import io
+import operator
+
+from concurrent.futures import ProcessPoolExecutor
+
+from .serialization import sort_nodes
+
+
+# The operations are computed with the operators of the roots, which are
+# defined by the roots of all engines.
+OPERATIONS = {
+    'union': operator.or_,
+    'intersection': operator.and_,
+    'difference': operator.sub,
+    'symmetric_difference': operator.xor,
+}
+
+
+def parallel_apply(
+        engine, operation, left, right, executor=None, max_workers=None,
+        threshold=100000, depth=4):
+    """Return the result of the given binary operation on `left` and `right`
+    (e.g. `parallel_apply(engine, 'union', a, b)`), computed in several
+    processes.
+
+    The operands are split on their top `depth` keys into up to `2**depth`
+    pairs of cofactors, whose results are computed independently by the
+    workers of `executor` (or of a `ProcessPoolExecutor` of `max_workers`
+    processes, created for the call), then put back together in `engine`.
+    Operands and results are transferred in the format of `engine.dump`, so
+    their keys should be written as is, or pickled. The cofactors usually
+    share most of their nodes, so they are written once, and each worker
+    reads them all.
+
+    Spawning the workers and transferring the diagrams costs much more than
+    small operations, so operands of less than `threshold` nodes altogether
+    are handled by the engine directly. The workers use fresh engines of the
+    same class as `engine`, so they don't benefit from its computed tables.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError('unknown operation: %r' % operation)
+    if engine._diagram_size(left) + engine._diagram_size(right) < threshold:
+        return OPERATIONS[operation](left, right)
+
+    # Split the operands, keeping the pairs of cofactors that aren't trivial
+    # as tasks for the workers.
+    tasks = {}
+    tree = _split(engine, operation, left, right, depth, tasks)
+    if not tasks:
+        return _build(engine, tree, {})
+
+    pairs = list(tasks)
+    operands = [operand for pair in pairs for operand in pair]
+    data = io.BytesIO()
+    engine.dump(operands, data)
+    data = data.getvalue()
+
+    # The workers start with a natural variable order, so we send them the
+    # order of the engine if it was changed.
+    nodes, _ = sort_nodes(operands)
+    order = sorted({node.key for node in nodes}, key=engine.level)
+    if all(engine.level(key) == key for key in order):
+        order = None
+
+    def submit(pool):
+        futures = [
+            pool.submit(_compute, type(engine), operation, data, order, index)
+            for index in range(len(pairs))
+        ]
+        return {
+            pair: engine.load(io.BytesIO(future.result()))[0]
+            for pair, future in zip(pairs, futures)
+        }
+
+    if executor is None:
+        with ProcessPoolExecutor(max_workers) as pool:
+            results = submit(pool)
+    else:
+        results = submit(executor)
+
+    return _build(engine, tree, results)
+
+
+def _split(engine, operation, left, right, depth, tasks):
+    # Returns a tree whose inner nodes are triples (key, then, else), and
+    # whose leaves are either pairs of operands sent to the workers, or the
+    # result of the operation on operands that aren't worth sending.
+    if left.is_zero() or left.is_one() or right.is_zero() or right.is_one():
+        return OPERATIONS[operation](left, right)
+    if depth == 0:
+        tasks[(left, right)] = None
+        return (left, right)
+
+    # Members of the result that contain the top key are obtained from the
+    # members of the operands that contain it, and likewise for those that
+    # don't, since all the operations are defined member-wise.
+    key = min(left.key, right.key, key=engine.level)
+    left_then, left_else = _cofactors(engine, left, key)
+    right_then, right_else = _cofactors(engine, right, key)
+    return (
+        key,
+        _split(engine, operation, left_then, right_then, depth - 1, tasks),
+        _split(engine, operation, left_else, right_else, depth - 1, tasks))
+
+
+def _cofactors(engine, family, key):
+    if family.key == key:
+        return family.then_, family.else_
+    return engine.make_terminal(False), family
+
+
+def _build(engine, tree, results):
+    if not isinstance(tree, tuple):
+        return tree
+    if len(tree) == 2:
+        return results[tree]
+
+    key, then_, else_ = tree
+    return engine.make_node(key, _build(engine, then_, results), _build(engine, else_, results))
+
+
+def _compute(engine_class, operation, data, order, index):
+    # Runs in the workers, that send the result back in the same format.
+    engine = engine_class()
+    if order is not None:
+        engine.reorder(order=order)
+
+    operands = engine.load(io.BytesIO(data))
+    result = OPERATIONS[operation](operands[2 * index], operands[2 * index + 1])
+
+    rv = io.BytesIO()
+    engine.dump([result], rv)
+
+    # The roots of the C++ engines can't outlive them.
+    del operands, result
+    return rv.getvalue()
@@ -0,0 +1,219 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import pickle
+
+
+# Implementation note: A file starts with `MAGIC`, followed by the table of
+# the keys of the diagrams, their nodes and their roots, where all integers
+# are written as varints (7 bits per byte, least significant group first).
+#
+#   keys:  count, then each key as a tagged value (see `write_value`),
+#          sorted by the variable order of the engine that wrote them
+#   nodes: count, then each node as the index of its key in the table and
+#          references to its "then" and "else" children
+#   roots: count, then a reference to each root
+#
+# Nodes are written children first, so they can be read in a single pass.
+# A reference is 0 or 1 for the terminals, and d + 1 for the node written
+# d positions before the current one (i.e. the number of nodes written so
+# far, for roots), so that the children written right before their parent
+# take a single byte.
+
+MAGIC = b'YDD\x01'
+
+# Tags of the values in the key table.
+_UINT = 0
+_NEGATIVE_INT = 1
+_STR = 2
+_BYTES = 3
+_TUPLE = 4
+_PICKLE = 5
+
+
+def write_varint(buffer, value):
+    while value > 0x7f:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data, offset):
+    """Return the varint at the given offset of `data`, and the offset that
+    follows it.
+    """
+    rv = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        rv |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return rv, offset
+        shift += 7
+
+
+def write_value(buffer, value):
+    """Write a tagged value to the given buffer.
+
+    Integers, strings, bytes and tuples of those are written as is, while
+    other values are pickled.
+    """
+    if (type(value) is int) and (value >= 0):
+        buffer.append(_UINT)
+        write_varint(buffer, value)
+    elif type(value) is int:
+        buffer.append(_NEGATIVE_INT)
+        write_varint(buffer, -value - 1)
+    elif type(value) is str:
+        data = value.encode('utf-8')
+        buffer.append(_STR)
+        write_varint(buffer, len(data))
+        buffer.extend(data)
+    elif type(value) is bytes:
+        buffer.append(_BYTES)
+        write_varint(buffer, len(value))
+        buffer.extend(value)
+    elif type(value) is tuple:
+        buffer.append(_TUPLE)
+        write_varint(buffer, len(value))
+        for item in value:
+            write_value(buffer, item)
+    else:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        buffer.append(_PICKLE)
+        write_varint(buffer, len(data))
+        buffer.extend(data)
+
+
+def read_value(data, offset):
+    """Return the tagged value at the given offset of `data`, and the offset
+    that follows it.
+    """
+    tag = data[offset]
+    rv, offset = read_varint(data, offset + 1)
+    if tag == _UINT:
+        return rv, offset
+    if tag == _NEGATIVE_INT:
+        return -rv - 1, offset
+    if tag == _TUPLE:
+        items = []
+        for _ in range(rv):
+            item, offset = read_value(data, offset)
+            items.append(item)
+        return tuple(items), offset
+
+    end = offset + rv
+    if end > len(data):
+        raise IndexError('value out of range')
+    if tag == _STR:
+        return str(data[offset:end], 'utf-8'), end
+    if tag == _BYTES:
+        return bytes(data[offset:end]), end
+    if tag == _PICKLE:
+        return pickle.loads(data[offset:end]), end
+    raise ValueError('unknown value tag: %r' % tag)
+
+
+def sort_nodes(roots):
+    """Return the nodes reachable from the given roots, children first, and
+    a dictionary that maps them to their position in this list plus 2, and
+    the zero and one terminals to 0 and 1.
+    """
+    # Nodes are sorted with an explicit stack, so any depth can be handled.
+    indices = {}
+    nodes = []
+    for root in roots:
+        stack = [root]
+        while stack:
+            node = stack[-1]
+            if node in indices:
+                stack.pop()
+            elif node.is_zero():
+                indices[node] = 0
+            elif node.is_one():
+                indices[node] = 1
+            else:
+                then_ = node.then_
+                else_ = node.else_
+                if then_ not in indices:
+                    stack.append(then_)
+                elif else_ not in indices:
+                    stack.append(else_)
+                else:
+                    stack.pop()
+                    indices[node] = len(nodes) + 2
+                    nodes.append(node)
+
+    return nodes, indices
+
+
+def dump(engine, roots, file, encode_key=None):
+    roots = list(roots)
+    nodes, indices = sort_nodes(roots)
+    keys = sorted({node.key for node in nodes}, key=engine.level)
+    key_indices = {key: i for i, key in enumerate(keys)}
+
+    def write_reference(index, position):
+        write_varint(buffer, index if index < 2 else position - index + 1)
+
+    buffer = bytearray(MAGIC)
+    write_varint(buffer, len(keys))
+    for key in keys:
+        write_value(buffer, key if encode_key is None else encode_key(key))
+
+    write_varint(buffer, len(nodes))
+    for position, node in enumerate(nodes, 2):
+        write_varint(buffer, key_indices[node.key])
+        write_reference(indices[node.then_], position)
+        write_reference(indices[node.else_], position)
+
+    write_varint(buffer, len(roots))
+    for root in roots:
+        write_reference(indices[root], len(nodes) + 2)
+
+    file.write(buffer)
+
+
+def load(engine, file, decode_key=None):
+    data = file.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('not a family file')
+
+    nodes = [engine.make_terminal(False), engine.make_terminal(True)]
+
+    def read_reference(offset, position):
+        reference, offset = read_varint(data, offset)
+        if reference < 2:
+            return nodes[reference], offset
+        if not (2 <= position - reference + 1 < position):
+            raise ValueError('invalid node reference')
+        return nodes[position - reference + 1], offset
+
+    try:
+        count, offset = read_varint(data, len(MAGIC))
+        keys = []
+        for _ in range(count):
+            key, offset = read_value(data, offset)
+            keys.append(key if decode_key is None else decode_key(key))
+
+        levels = [engine.level(key) for key in keys]
+        if any(not (a < b) for a, b in zip(levels, levels[1:])):
+            raise ValueError('keys are not in the variable order of the engine')
+
+        count, offset = read_varint(data, offset)
+        for position in range(2, count + 2):
+            key, offset = read_varint(data, offset)
+            then_, offset = read_reference(offset, position)
+            else_, offset = read_reference(offset, position)
+            nodes.append(engine.make_node(keys[key], then_, else_))
+
+        count, offset = read_varint(data, offset)
+        rv = []
+        for _ in range(count):
+            root, offset = read_reference(offset, len(nodes))
+            rv.append(root)
+    except IndexError:
+        raise ValueError('truncated family file')
+
+    return rv
@@ -0,0 +1,192 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import mmap
+import struct
+import sys
+
+from array import array
+
+from .serialization import read_value, read_varint, sort_nodes, write_value, write_varint
+
+
+# Implementation note: A snapshot starts with a header that holds `MAGIC`,
+# the number of nodes and the index of the root, followed by the nodes and
+# the table of their keys. Nodes are written children first, as triples of
+# 32-bit little-endian integers: the index of their key in the table, and
+# the indices of their "then" and "else" children, where 0 and 1 stand for
+# the zero and one terminals, and i + 2 for the i-th node. Keys are written
+# like in the files of `ydd.serialization`, sorted by the variable order of
+# the engine of the family, so that comparing their indices is the same as
+# comparing their levels.
+
+MAGIC = b'YDDS'
+
+_HEADER = struct.Struct('<4sII')
+_NODE = struct.Struct('<III')
+
+
+class Snapshot(object):
+    """A read-only family of sets, stored in a flat array of nodes.
+
+    Snapshots are written by `Snapshot.write` from a family of any engine,
+    and read from a bytes-like object, or from a file mapped in memory with
+    `Snapshot.open`. Nodes are read in place, so opening a snapshot only
+    decodes its key table, and the processes that map the same file share
+    its pages.
+
+    Snapshots support membership tests, counting and iteration, with the
+    same semantics (and order of iteration) as the families they were
+    written from.
+    """
+
+    def __init__(self, buffer, decode_key=None):
+        self._view = memoryview(buffer)
+        self._mapping = None
+
+        if len(self._view) < _HEADER.size:
+            raise ValueError('truncated snapshot')
+        magic, count, self._root = _HEADER.unpack_from(self._view)
+        if magic != MAGIC:
+            raise ValueError('not a snapshot')
+        end = _HEADER.size + count * _NODE.size
+        if end > len(self._view):
+            raise ValueError('truncated snapshot')
+
+        nodes = self._view[_HEADER.size:end]
+        if sys.byteorder == 'little':
+            self._nodes = nodes.cast('I')
+        else:
+            self._nodes = array('I', nodes)
+            self._nodes.byteswap()
+
+        try:
+            count, offset = read_varint(self._view, end)
+            self.keys = []
+            for _ in range(count):
+                key, offset = read_value(self._view, offset)
+                self.keys.append(key if decode_key is None else decode_key(key))
+        except IndexError:
+            raise ValueError('truncated snapshot')
+
+        self._key_indices = {key: i for i, key in enumerate(self.keys)}
+        self._counts = None
+
+    @classmethod
+    def open(cls, path, decode_key=None):
+        """Map the snapshot stored in the given file in memory."""
+        with open(path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        rv = cls(mapping, decode_key)
+        rv._mapping = mapping
+        return rv
+
+    @staticmethod
+    def write(family, file, encode_key=None):
+        """Write a snapshot of the given family to a binary file."""
+        nodes, indices = sort_nodes([family])
+        if len(nodes) + 2 > 0xffffffff:
+            raise OverflowError('too many nodes in the family')
+
+        keys = sorted({node.key for node in nodes}, key=family._level)
+        key_indices = {key: i for i, key in enumerate(keys)}
+
+        buffer = bytearray(_HEADER.pack(MAGIC, len(nodes), indices[family]))
+        for node in nodes:
+            buffer.extend(_NODE.pack(
+                key_indices[node.key], indices[node.then_], indices[node.else_]))
+
+        write_varint(buffer, len(keys))
+        for key in keys:
+            write_value(buffer, key if encode_key is None else encode_key(key))
+
+        file.write(buffer)
+
+    def close(self):
+        """Release the buffer of the snapshot, and unmap its file if it was
+        opened with `Snapshot.open`.
+        """
+        if isinstance(self._nodes, memoryview):
+            self._nodes.release()
+        self._view.release()
+        if self._mapping is not None:
+            self._mapping.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def node_count(self):
+        """Return the number of nodes of the snapshot, terminals excluded."""
+        return len(self._nodes) // 3
+
+    def count(self):
+        """Return the number of members of the family."""
+        # Children are stored before their parents, so the counts of all
+        # nodes are computed in a single pass, the first time they're needed.
+        if self._counts is None:
+            nodes = self._nodes
+            counts = [0, 1]
+            for i in range(0, len(nodes), 3):
+                counts.append(counts[nodes[i + 1]] + counts[nodes[i + 2]])
+            self._counts = counts
+        return self._counts[self._root]
+
+    def __len__(self):
+        return self.count()
+
+    def __contains__(self, item):
+        try:
+            elements = sorted((self._key_indices[el] for el in set(item)), reverse=True)
+        except KeyError:
+            # No member contains a key that doesn't appear in the family.
+            return False
+
+        nodes = self._nodes
+        node = self._root
+        while node > 1:
+            i = 3 * (node - 2)
+            if elements and (elements[-1] == nodes[i]):
+                node = nodes[i + 1]
+                elements.pop()
+            elif elements and (elements[-1] < nodes[i]):
+                return False
+            else:
+                node = nodes[i + 2]
+
+        return (node == 1) and not elements
+
+    def __iter__(self):
+        # See the implementation notes of `AbstractRoot.__iter__`. We keep
+        # track of the indices of the keys, which compare like their levels.
+
+        keys = self.keys
+        nodes = self._nodes
+
+        rv = []
+        stack = []
+        node = self._root
+
+        while node != 0:
+            if node == 1:
+                yield frozenset(keys[key] for key in rv)
+                try:
+                    node = stack.pop()
+                except IndexError:
+                    return
+                i = 3 * (node - 2)
+                rv = [key for key in rv if key < nodes[i]] + [nodes[i]]
+                node = nodes[i + 1]
+            else:
+                i = 3 * (node - 2)
+                if nodes[i + 2] != 0:
+                    stack.append(node)
+                    node = nodes[i + 2]
+                else:
+                    rv.append(nodes[i])
+                    node = nodes[i + 1]
+
+    def __repr__(self):
+        return '<Snapshot of %i node(s)>' % self.node_count()
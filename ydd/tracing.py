@@ -0,0 +1,176 @@
+# Copyright (c) 2015, Dimitri Racordon.
+# Licensed under the Apache License, Version 2.0.
+
+import io
+import pickle
+import time
+
+from collections import namedtuple
+from weakref import WeakKeyDictionary
+
+from .serialization import read_value, write_value
+
+
+# Implementation note: A trace starts with `MAGIC`, followed by a sequence of
+# records, written as tagged tuples (see `ydd.serialization.write_value`):
+#
+#   ('family', id, data)  a family operand, written with `engine.dump` the
+#                         first time it appears in the trace
+#   ('call', operation, operands, result, time, steps)
+#                         an outermost operation, where `result` is the id
+#                         given to the family it returned (or None), and
+#                         `time` is in nanoseconds
+#
+# Operands are written as ('family', id), ('homomorphism', pickled data),
+# ('tuple', operands) or ('value', value). Results are given an id without
+# being written, so the operations that use them can be replayed in turn.
+
+MAGIC = b'YDDT\x01'
+
+
+ReplayedOperation = namedtuple(
+    'ReplayedOperation', ['operation', 'recorded_time', 'time', 'recorded_steps', 'steps'])
+
+
+class TraceRecorder(object):
+    """A hook that records the operations of an engine to a binary file.
+
+    Recorders are usually installed with `engine.record(file)`, which
+    reports all the outermost operations of the engine to them. Families
+    are written with `engine.dump`, so their keys should be written as is,
+    unless `encode_key` maps them to values that are, while homomorphisms
+    are pickled.
+    """
+
+    def __init__(self, engine, file, encode_key=None):
+        self.engine = engine
+        self.file = file
+        self.encode_key = encode_key
+
+        # The ids of the families that appeared in the trace, for as long as
+        # they are alive.
+        self._ids = WeakKeyDictionary()
+        self._next_id = 0
+
+        file.write(MAGIC)
+
+    def __call__(self, event):
+        operands = tuple(self._operand(operand) for operand in event.operands)
+        if self._is_family(event.result):
+            result = self._ids[event.result] = self._new_id()
+        else:
+            result = None
+
+        self._write((
+            'call', event.operation, operands, result,
+            int(event.time * 1e9), event.steps))
+
+    def _operand(self, operand):
+        if self._is_family(operand):
+            try:
+                return ('family', self._ids[operand])
+            except KeyError:
+                id_ = self._ids[operand] = self._new_id()
+                data = io.BytesIO()
+                self.engine.dump([operand], data, self.encode_key)
+                self._write(('family', id_, data.getvalue()))
+                return ('family', id_)
+
+        if isinstance(operand, tuple):
+            return ('tuple', tuple(self._operand(item) for item in operand))
+        if hasattr(operand, 'image'):
+            return ('homomorphism', pickle.dumps(operand, protocol=pickle.HIGHEST_PROTOCOL))
+        return ('value', operand)
+
+    def _is_family(self, value):
+        return hasattr(value, 'is_zero')
+
+    def _new_id(self):
+        self._next_id += 1
+        return self._next_id - 1
+
+    def _write(self, record):
+        buffer = bytearray()
+        write_value(buffer, record)
+        self.file.write(buffer)
+
+
+def _replay_apply(engine, homomorphism, family):
+    return engine.apply(homomorphism, family)
+
+
+# The operations of the roots are replayed with their operators, which are
+# defined by the roots of all engines.
+_OPERATIONS = {
+    'union': lambda engine, left, right: left | right,
+    'intersection': lambda engine, left, right: left & right,
+    'difference': lambda engine, left, right: left - right,
+    'symmetric_difference': lambda engine, left, right: left ^ right,
+    'issubset': lambda engine, left, right: left <= right,
+    'isdisjoint': lambda engine, left, right: left.isdisjoint(right),
+    'union_all': lambda engine, families: engine.union_all(families),
+    'intersection_all': lambda engine, families: engine.intersection_all(families),
+    'count': lambda engine, family: engine.count(family),
+    'apply': _replay_apply,
+}
+
+
+def _cache_misses(engine):
+    return sum(info.misses for info in engine.stats().caches.values())
+
+
+def replay(engine, file, decode_key=None):
+    """Replay the operations recorded in a binary file on the given engine,
+    and return a list of `ReplayedOperation`, that compare the time (in
+    seconds) and the number of steps of each operation with the recorded
+    ones.
+
+    The engine may be of any kind, as long as the keys of the recorded
+    families (as returned by `decode_key`, if given) compare the same way in
+    it. Homomorphisms are unpickled, so only replay traces you trust.
+    """
+    data = file.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('not a trace file')
+
+    families = {}
+
+    def operand(value):
+        tag, value = value
+        if tag == 'family':
+            return families[value]
+        if tag == 'tuple':
+            return tuple(operand(item) for item in value)
+        if tag == 'homomorphism':
+            return pickle.loads(value)
+        return value
+
+    rv = []
+    offset = len(MAGIC)
+    try:
+        while offset < len(data):
+            record, offset = read_value(data, offset)
+            if record[0] == 'family':
+                _, id_, dumped = record
+                families[id_] = engine.load(io.BytesIO(dumped), decode_key)[0]
+                continue
+
+            _, operation, operands, result, recorded_time, recorded_steps = record
+            operands = [operand(value) for value in operands]
+            misses = _cache_misses(engine)
+            start = time.perf_counter()
+            value = _OPERATIONS[operation](engine, *operands)
+            elapsed = time.perf_counter() - start
+
+            if result is not None:
+                families[result] = value
+            rv.append(ReplayedOperation(
+                operation=operation,
+                recorded_time=recorded_time / 1e9,
+                time=elapsed,
+                recorded_steps=recorded_steps,
+                steps=_cache_misses(engine) - misses))
+    except IndexError:
+        raise ValueError('truncated trace file')
+
+    return rv